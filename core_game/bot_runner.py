@@ -0,0 +1,256 @@
+""" Hosting many bots on the tables of one process, on one asyncio event loop.
+
+A policy is attached to a seat of a table. When a bot's player is to move, the runner builds its
+table view (get_table_view, with the player's personal data and allowed moves), and passes all the
+pending decisions of a policy, across all tables, to one call of policy.decide(decisions).
+The replies are submitted through the table (process_requests, so the round moves on like a live table).
+
+A policy that doesn't reply within the deadline, or replies with a rejected move, checks if it can and
+folds otherwise, like a player whose time ran out.
+"""
+
+import asyncio
+import inspect
+import random
+import time
+from typing import NamedTuple
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRoundStage
+    from holdem_table import HoldemTable
+else:
+    from .holdem_round import HoldemRoundStage
+    from .holdem_table import HoldemTable
+
+BETTING_STAGES = (HoldemRoundStage.PREFLOP, HoldemRoundStage.FLOP, HoldemRoundStage.TURN, HoldemRoundStage.RIVER)
+
+class BotDecision(NamedTuple):
+    table_id: str
+    user_id: str
+    sit: int
+    view: dict # table_view_update of the bot's player
+
+class CheckCallPolicy:
+    """ A passive house bot, checks or calls every time. """
+    def decide(self, decisions: list[BotDecision]) -> list[dict]:
+        replies = []
+        for decision in decisions:
+            allowed_moves = decision.view['data']['personal_data']['allowed_moves']
+            if 'check' in allowed_moves['moves']:
+                replies.append({'action': 'check', 'call_amount': 0, 'raise_amount': 0})
+            else:
+                replies.append({'action': 'call', 'call_amount': allowed_moves['call_amount'], 'raise_amount': 0})
+        return replies
+
+class RandomPolicy:
+    """ Plays a random allowed move, raising the minimum when it raises. """
+    def __init__(self, seed: int = None):
+        self.random = random.Random(seed)
+
+    def decide(self, decisions: list[BotDecision]) -> list[dict]:
+        replies = []
+        for decision in decisions:
+            allowed_moves = decision.view['data']['personal_data']['allowed_moves']
+            action = self.random.choice(allowed_moves['moves'])
+            reply = {'action': action, 'call_amount': 0, 'raise_amount': 0}
+            if action in ('call', 'raise'):
+                reply['call_amount'] = allowed_moves['call_amount']
+            if action == 'raise':
+                reply['raise_amount'] = allowed_moves['min_raise_amount']
+            replies.append(reply)
+        return replies
+
+def get_fallback_move(allowed_moves: dict) -> dict:
+    action = 'check' if 'check' in allowed_moves['moves'] else 'fold'
+    return {'action': action, 'call_amount': 0, 'raise_amount': 0}
+
+class BotRunner:
+    """ Runs the bots attached to seats of tables.
+
+    A policy is any object with a decide(decisions: list[BotDecision]) method, returning one reply per decision
+    ({'action', 'call_amount', 'raise_amount'}, or None to fall back), either directly or as a coroutine.
+    deadline is in seconds per decision. A synchronous policy can't be interrupted, its late replies are discarded.
+    If auto_start_rounds, a new round is started on a table with an ended round (and at least two players).
+    The runner checks a table when notify() is called for it (e.g. after a human's move), and after every bot move.
+    """
+    def __init__(self, deadline: float = 1.0, auto_start_rounds: bool = False):
+        self.deadline = deadline
+        self.auto_start_rounds = auto_start_rounds
+        self.tables: dict[str:HoldemTable] = {}
+        self.bots: dict[tuple:object] = {} # of the form {(table_id, user_id): policy}
+        self.decided: dict[str:tuple] = {} # of the form {table_id: state key of the last decision}
+        self.changed_tables: set[str] = set()
+        self.wakeup: asyncio.Event = None
+        self.running = False
+
+        self.decisions = 0
+        self.timeouts = 0
+        self.fallbacks = 0 # invalid or rejected replies
+        self.policy_calls = 0
+        self.policy_errors = 0
+        self.decision_time = 0.0 # seconds spent waiting for policies
+        self.started_at: float = None
+
+    def add_table(self, table: HoldemTable):
+        self.tables[table.table_id] = table
+        self.notify(table.table_id)
+
+    def remove_table(self, table_id: str):
+        self.tables.pop(table_id, None)
+        self.decided.pop(table_id, None)
+        self.changed_tables.discard(table_id)
+        for key in [key for key in self.bots if key[0] == table_id]:
+            del self.bots[key]
+
+    def attach(self, table_id: str, user_id: str, policy):
+        """ Attaches a policy to the seat of user_id, who should already sit at the table. """
+        self.bots[(table_id, user_id)] = policy
+        self.notify(table_id)
+
+    def detach(self, table_id: str, user_id: str):
+        self.bots.pop((table_id, user_id), None)
+
+    def seat_bot(self, table_id: str, user_id: str, sit: int, chips: int, policy) -> dict:
+        """ Sits a bot at a table with a join request, and attaches its policy. Returns the sit response. """
+        request = {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': table_id, 'type': 'join', 'sit': sit, 'chips': chips}}
+        response = self.tables[table_id].request_handler(request)
+        if response['success']:
+            self.attach(table_id, user_id, policy)
+        return response
+
+    def notify(self, table_id: str):
+        """ Tells the runner a table changed, so a bot may have to move. """
+        self.changed_tables.add(table_id)
+        if self.wakeup != None:
+            self.wakeup.set()
+
+    def collect_decisions(self) -> dict:
+        """ Returns the pending decisions of the changed tables, of the form {id(policy): (policy, [BotDecision, ...])}. """
+        pending = {}
+        changed_tables, self.changed_tables = self.changed_tables, set()
+        for table_id in changed_tables:
+            table = self.tables.get(table_id)
+            if table == None:
+                continue
+            round = table.round
+            if self.auto_start_rounds and (round == None or round.stage == HoldemRoundStage.ENDED) and len(table.players) >= 2:
+                table.start_new_round()
+                if table.round != None and table.round.stage == HoldemRoundStage.NOT_STARTED:
+                    table.round.start()
+                    self.decided.pop(table_id, None)
+                round = table.round
+            if round == None or round.stage not in BETTING_STAGES or round.to_move == None:
+                continue
+
+            player = table.get_player_by_sit(round.to_move.sit)
+            policy = self.bots.get((table_id, player.id)) if player != None else None
+            if policy == None:
+                continue
+            # with reuse_round the round object is the same every hand, so the hand is keyed by the table's count.
+            state_key = (table.rounds_started, id(round), round.stage, len(round.log), player.sit)
+            if self.decided.get(table_id) == state_key:
+                continue # already decided, the round didn't move on
+            self.decided[table_id] = state_key
+            decision = BotDecision(table_id, player.id, player.sit, table.get_table_view(player))
+            pending.setdefault(id(policy), (policy, []))[1].append(decision)
+        return pending
+
+    async def _decide(self, policy, decisions: list[BotDecision]) -> list:
+        """ Returns the replies of policy to decisions, None for every decision if it missed the deadline. """
+        self.policy_calls += 1
+        started = time.perf_counter()
+        try:
+            replies = policy.decide(decisions)
+            if inspect.isawaitable(replies):
+                replies = await asyncio.wait_for(replies, self.deadline)
+            elif time.perf_counter() - started > self.deadline:
+                replies = None
+        except asyncio.TimeoutError:
+            replies = None
+        except Exception:
+            # a broken policy must not stop the other bots.
+            self.policy_errors += 1
+            replies = []
+        finally:
+            self.decision_time += time.perf_counter() - started
+
+        if replies == None:
+            self.timeouts += len(decisions)
+            return [None] * len(decisions)
+        replies = list(replies)
+        if len(replies) != len(decisions):
+            return [None] * len(decisions)
+        return replies
+
+    def submit(self, decision: BotDecision, reply: dict) -> dict:
+        """ Submits a bot's reply to its table, falling back to check or fold if it is invalid or rejected. """
+        table = self.tables.get(decision.table_id)
+        if table == None:
+            return None
+        allowed_moves = decision.view['data']['personal_data']['allowed_moves']
+        response = {'success': False}
+        if isinstance(reply, dict) and reply.get('action') in allowed_moves['moves']:
+            data = {'sit': decision.sit, 'action': reply['action'], 'call_amount': reply.get('call_amount', 0), 'raise_amount': reply.get('raise_amount', 0)}
+            response = table.process_requests([{'type': 'move_request', 'data': data}], advance_round=True)[0]
+        if not response['success']:
+            self.fallbacks += 1
+            data = dict(get_fallback_move(allowed_moves), sit=decision.sit)
+            response = table.process_requests([{'type': 'move_request', 'data': data}], advance_round=True)[0]
+        self.decisions += 1
+        self.notify(decision.table_id)
+        return response
+
+    async def step(self) -> int:
+        """ Collects the pending decisions, asks all the policies at once and submits the replies. Returns the number of decisions. """
+        pending = self.collect_decisions()
+        if not pending:
+            return 0
+        if self.started_at == None:
+            self.started_at = time.perf_counter()
+        batches = list(pending.values())
+        all_replies = await asyncio.gather(*(self._decide(policy, decisions) for policy, decisions in batches))
+        count = 0
+        for (policy, decisions), replies in zip(batches, all_replies):
+            for decision, reply in zip(decisions, replies):
+                self.submit(decision, reply)
+                count += 1
+        return count
+
+    async def run(self, max_decisions: int = None):
+        """ Runs until stop() is called, or max_decisions were made. Waits for notify() when no bot has to move. """
+        self.wakeup = asyncio.Event()
+        self.running = True
+        while self.running and (max_decisions == None or self.decisions < max_decisions):
+            if not self.changed_tables:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            await self.step()
+            await asyncio.sleep(0) # let the rest of the loop (e.g. network handlers) run between steps
+        self.running = False
+
+    async def run_until_idle(self, max_decisions: int = None) -> int:
+        """ Steps until no bot has to move, returns the number of decisions made. """
+        count = 0
+        while self.changed_tables and (max_decisions == None or count < max_decisions):
+            count += await self.step()
+        return count
+
+    def stop(self):
+        self.running = False
+        if self.wakeup != None:
+            self.wakeup.set()
+
+    def get_stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at if self.started_at != None else 0.0
+        return {
+            'tables': len(self.tables),
+            'bots': len(self.bots),
+            'decisions': self.decisions,
+            'policy_calls': self.policy_calls,
+            'timeouts': self.timeouts,
+            'fallbacks': self.fallbacks,
+            'policy_errors': self.policy_errors,
+            'decisions_per_second': self.decisions / elapsed if elapsed > 0 else 0.0,
+            'mean_decision_batch': self.decisions / self.policy_calls if self.policy_calls else 0.0,
+        }
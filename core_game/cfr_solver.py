@@ -0,0 +1,451 @@
+""" Heads-up counterfactual regret minimization over an abstracted HoldemRound game.
+
+The betting tree is built by playing the abstract actions on real HoldemRound objects, so it follows the
+engine's rules (get_allowed_moves, min and max raises, blinds and antes). At every decision the abstract
+actions are fold (only when facing a bet), check or call, and raises of SolverConfig.raise_sizes times the
+pot (clamped to the allowed raises) plus all in, at most max_raises raises per street. Moves forced by
+the engine (an all in player can only check) are played without a decision node.
+
+Cards are abstracted into buckets per street, by equity against a random hand: preflop by the equity of
+each of the 169 starting hands, postflop by sampling bucket_samples opponent hands and runouts. The buckets
+of both players and the showdown result of a pool of deals are computed once, when the solver is created.
+
+Regrets and strategy sums live in two flat numpy arrays. Every decision node owns a block of
+(buckets of its street) x (its actions) rows, so an infoset is a row of its node's block. An iteration
+samples batch_size deals from the pool and walks the tree once, with the reach probabilities and utilities
+of all the deals in numpy arrays (chance sampled CFR+ with linear averaging, both players updated together).
+
+With a path, a run continues from its last checkpoint in that directory: the deal pool, the arrays and a
+meta.json of the config, the number of iterations and the slot of the arrays. Training updates the arrays
+in memory, and a checkpoint copies them to the .npy files of the other slot (memory mapped) and flushes them
+before meta.json is replaced, so the files meta.json points to are never written and a crash loses at most
+the iterations since the last checkpoint.
+
+Usage:
+    solver = CFRSolver(SolverConfig(stack=200, small_blind=1), path='solver_run')
+    solver.train(1000, checkpoint_interval=100)
+    runner.seat_bot(table_id, 'house_1', 1, 200, SolverPolicy(solver, runner.tables))
+"""
+
+import contextlib
+import io
+import json
+import os
+import pickle
+import random
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+import numpy as np
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRound, HoldemRoundConfig, HoldemRoundPlayer, HoldemRoundStage
+    from range_equity import CARD_INDEX, evaluate_many
+else:
+    from .holdem_round import HoldemRound, HoldemRoundConfig, HoldemRoundPlayer, HoldemRoundStage
+    from .range_equity import CARD_INDEX, evaluate_many
+
+STREETS = ('preflop', 'flop', 'turn', 'river')
+BOARD_SIZES = (0, 3, 4, 5)
+DECISION, FOLD, SHOWDOWN = 0, 1, 2
+
+@dataclass(slots=True)
+class SolverConfig:
+    stack: int # chips of both players at the start of a hand
+    small_blind: int
+    ante: int = 0
+    raise_sizes: tuple = (0.5, 1.0) # raises as a share of the pot after calling, all in is always added
+    max_raises: int = 2 # raises per street
+    buckets: tuple = (8, 8, 8, 8) # card buckets per street
+    deals: int = 5000 # size of the deal pool
+    bucket_samples: int = 32 # opponent hands and runouts sampled per postflop bucket
+    batch_size: int = 1000 # deals per iteration
+    seed: int = 0
+
+""" Card abstraction """
+
+def get_hand_class(card1: int, card2: int) -> int:
+    """ Returns the starting hand class (0 to 168) of two card indices: pairs on the diagonal of a 13x13 grid,
+    suited hands above it and offsuit hands below it.
+    """
+    rank1, rank2 = card1 // 4, card2 // 4
+    high, low = max(rank1, rank2), min(rank1, rank2)
+    if card1 % 4 == card2 % 4:
+        return high * 13 + low
+    return low * 13 + high
+
+def _sample_unseen(dead: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    """ Returns `count` random card indices per row, none of them in the row's dead cards. """
+    keys = rng.random((len(dead), 52))
+    np.put_along_axis(keys, dead, 2.0, axis=1)
+    return np.argpartition(keys, count, axis=1)[:, :count] if count < 52 else np.argsort(keys, axis=1)
+
+def get_equities(hole_cards: np.ndarray, boards: np.ndarray, samples: int, rng: np.random.Generator) -> np.ndarray:
+    """ Estimates the equity of every hand (n, 2) on its board (n, 0 to 5) against a random hand, over
+    `samples` random opponent hands and runouts each.
+    """
+    n, board_size = len(hole_cards), boards.shape[1]
+    dead = np.repeat(np.concatenate([hole_cards, boards], axis=1), samples, axis=0)
+    unseen = _sample_unseen(dead, 7 - board_size, rng) # opponent's 2 cards, then the runout
+    full_boards = np.concatenate([dead[:, 2:], unseen[:, 2:]], axis=1)
+    hero = evaluate_many(np.concatenate([dead[:, :2], full_boards], axis=1))
+    villain = evaluate_many(np.concatenate([unseen[:, :2], full_boards], axis=1))
+    won = (hero < villain) + 0.5 * (hero == villain)
+    return won.reshape(n, samples).mean(axis=1)
+
+@lru_cache(maxsize=8)
+def get_preflop_equities(samples: int = 1000, seed: int = 0) -> np.ndarray:
+    """ Equity of every starting hand class against a random hand. """
+    representatives = np.zeros((169, 2), dtype=np.int64)
+    for card1 in range(52):
+        for card2 in range(card1 + 1, 52):
+            representatives[get_hand_class(card1, card2)] = (card1, card2)
+    return get_equities(representatives, np.zeros((169, 0), dtype=np.int64), samples, np.random.default_rng(seed))
+
+@lru_cache(maxsize=8)
+def get_preflop_buckets(num_buckets: int) -> np.ndarray:
+    """ Bucket of every starting hand class, by quantiles of their equities. """
+    order = np.argsort(get_preflop_equities(), kind='stable')
+    buckets = np.empty(169, dtype=np.int64)
+    buckets[order] = np.arange(169) * num_buckets // 169
+    return buckets
+
+def get_buckets(config: SolverConfig, hole_cards: np.ndarray, community_cards: np.ndarray, street: int, rng: np.random.Generator) -> np.ndarray:
+    """ Buckets of hands (n, 2) on the first BOARD_SIZES[street] cards of their boards. """
+    num_buckets = config.buckets[street]
+    if street == 0:
+        classes = [get_hand_class(card1, card2) for card1, card2 in hole_cards.tolist()]
+        return get_preflop_buckets(num_buckets)[classes]
+    equities = get_equities(hole_cards, community_cards[:, :BOARD_SIZES[street]], config.bucket_samples, rng)
+    return np.minimum((equities * num_buckets).astype(np.int64), num_buckets - 1)
+
+def make_deals(config: SolverConfig) -> dict:
+    """ Returns the deal pool: cards (n, 9) (2 hole cards of each player and the board), buckets (n, 2, 4) of
+    both players on every street, and results (n,), 1 if player 0 wins the showdown, -1 if player 1 does.
+    """
+    rng = np.random.default_rng(config.seed)
+    cards = np.argsort(rng.random((config.deals, 52)), axis=1)[:, :9]
+    board = cards[:, 4:]
+    buckets = np.zeros((config.deals, 2, 4), dtype=np.int16)
+    for player in (0, 1):
+        hole_cards = cards[:, 2 * player:2 * player + 2]
+        for street in range(4):
+            buckets[:, player, street] = get_buckets(config, hole_cards, board, street, rng)
+    ranks = [evaluate_many(np.concatenate([cards[:, 2 * player:2 * player + 2], board], axis=1)) for player in (0, 1)]
+    results = np.sign(ranks[1] - ranks[0]).astype(np.int8)
+    return {'cards': cards.astype(np.int8), 'buckets': buckets, 'results': results}
+
+""" Betting tree """
+
+class BettingTree:
+    """ The abstract betting tree, as flat arrays indexed by node. Node 0 is the root.
+    Player 0 is the small blind (sit 1), player 1 the big blind (sit 2).
+    """
+    def __init__(self, nodes: list[dict]):
+        self.kind = np.array([node['kind'] for node in nodes], dtype=np.int8)
+        self.player = np.array([node['player'] for node in nodes], dtype=np.int8) # to act, or the folder
+        self.street = np.array([node['street'] for node in nodes], dtype=np.int8)
+        self.invested = np.array([node['invested'] for node in nodes], dtype=np.int64) # (n, 2) chips put in the pot
+        self.num_actions = np.array([len(node['children']) for node in nodes], dtype=np.int64)
+        self.first_child = np.zeros(len(nodes), dtype=np.int64)
+        self.first_child[1:] = np.cumsum(self.num_actions)[:-1]
+        self.children = np.array([child for node in nodes for child in node['children']], dtype=np.int64)
+        self.actions: list[tuple] = [action for node in nodes for action in node['actions']] # (action, call_amount, raise_amount) per edge
+
+        # the block of every decision node in the regret and strategy arrays.
+        self.offset = np.zeros(len(nodes), dtype=np.int64)
+        size = 0
+        for index, node in enumerate(nodes):
+            if node['kind'] == DECISION:
+                self.offset[index] = size
+                size += node['buckets'] * len(node['children'])
+        self.size = size
+
+    def __len__(self):
+        return len(self.kind)
+
+    def get_children(self, node: int) -> np.ndarray:
+        return self.children[self.first_child[node]:self.first_child[node] + self.num_actions[node]]
+
+    def get_actions(self, node: int) -> list[tuple]:
+        return self.actions[self.first_child[node]:self.first_child[node] + self.num_actions[node]]
+
+def get_pot(round: HoldemRound) -> int:
+    return sum(round.get_player_total_bet(player) for player in round.players)
+
+def get_abstract_actions(config: SolverConfig, round: HoldemRound) -> list[tuple]:
+    """ The abstract actions (action, call_amount, raise_amount) of the player to move. """
+    allowed_moves = round.get_allowed_moves(round.to_move)
+    moves, call_amount = allowed_moves['moves'], allowed_moves['call_amount']
+    actions = []
+    if 'fold' in moves and 'check' not in moves:
+        actions.append(('fold', 0, 0))
+    if 'check' in moves:
+        actions.append(('check', 0, 0))
+    elif 'call' in moves:
+        actions.append(('call', call_amount, 0))
+    raises = sum(1 for event in round.log if event.stage == round.stage.value and event.action == 'raise')
+    if 'raise' in moves and raises < config.max_raises:
+        low, high = allowed_moves['min_raise_amount'], allowed_moves['max_raise_amount']
+        pot = get_pot(round) + call_amount
+        amounts = sorted({min(max(int(size * pot + 0.5), low), high) for size in config.raise_sizes} | {high})
+        actions += [('raise', call_amount, amount) for amount in amounts]
+    return actions
+
+def apply_abstract_action(round: HoldemRound, action: tuple):
+    response = round.process_game_request({'sit': round.to_move.sit, 'action': action[0], 'call_amount': action[1], 'raise_amount': action[2]})
+    assert response['success'], action
+    round.start_next_move()
+
+def build_tree(config: SolverConfig) -> BettingTree:
+    players = [HoldemRoundPlayer(1, config.stack), HoldemRoundPlayer(2, config.stack)]
+    round = HoldemRound(HoldemRoundConfig(config.small_blind, config.ante), players, players[0])
+    nodes = []
+
+    def add_node(round: HoldemRound) -> int:
+        # moves forced by the engine are played without a node.
+        while round.stage not in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+            actions = get_abstract_actions(config, round)
+            if len(actions) > 1:
+                break
+            apply_abstract_action(round, actions[0])
+
+        index = len(nodes)
+        invested = [round.starting_chips[p.sit] - p.chips for p in round.players]
+        node = {'kind': DECISION, 'player': 0, 'street': 0, 'invested': invested, 'children': [], 'actions': [], 'buckets': 0}
+        nodes.append(node)
+        if round.stage == HoldemRoundStage.NO_SHOWDOWN:
+            node['kind'] = FOLD
+            node['player'] = [p.folded for p in round.players].index(True)
+            return index
+        if round.stage == HoldemRoundStage.SHOWDOWN:
+            node['kind'] = SHOWDOWN
+            return index
+
+        node['player'] = round.players.index(round.to_move)
+        node['street'] = STREETS.index(round.stage.value)
+        node['buckets'] = config.buckets[node['street']]
+        for action in get_abstract_actions(config, round):
+            child = pickle.loads(pickle.dumps(round, pickle.HIGHEST_PROTOCOL))
+            apply_abstract_action(child, action)
+            node['actions'].append(action)
+            node['children'].append(add_node(child))
+        return index
+
+    # the engine prints its stage changes and rejected moves.
+    with contextlib.redirect_stdout(io.StringIO()):
+        round.start()
+        add_node(round)
+    return BettingTree(nodes)
+
+""" Solver """
+
+class CFRSolver:
+    def __init__(self, config: SolverConfig, path: str = None):
+        self.config = config
+        self.path = path
+        self.tree = build_tree(config)
+        self.iterations = 0
+        self.slot = 0 # of the last checkpoint's arrays, the next checkpoint writes the other one
+        self.regrets = np.zeros(self.tree.size)
+        self.strategy_sums = np.zeros(self.tree.size)
+
+        if path == None:
+            self.deals = make_deals(config)
+            return
+
+        os.makedirs(path, exist_ok=True)
+        meta = self.read_meta()
+        resume = meta != None
+        if resume:
+            if meta['config'] != json.loads(json.dumps(asdict(config))) or meta['size'] != self.tree.size:
+                raise ValueError(f'{path} holds a run of another config')
+            self.iterations = meta['iterations']
+            self.slot = meta['slot']
+            with np.load(os.path.join(path, 'deals.npz')) as deals:
+                self.deals = {key: deals[key] for key in deals.files}
+            self.regrets[:] = np.load(self.get_array_path('regrets', self.slot))
+            self.strategy_sums[:] = np.load(self.get_array_path('strategy_sums', self.slot))
+        else:
+            self.deals = make_deals(config)
+            np.savez(os.path.join(path, 'deals.npz'), **self.deals)
+            self.checkpoint()
+
+    def read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get_array_path(self, name: str, slot: int) -> str:
+        return os.path.join(self.path, f'{name}_{slot}.npy')
+
+    def checkpoint(self):
+        """ Copies the arrays to the files of the other slot and flushes them, then switches meta.json to that slot. """
+        if self.path == None:
+            return
+        slot = 1 - self.slot
+        for name, array in (('regrets', self.regrets), ('strategy_sums', self.strategy_sums)):
+            mapped = np.lib.format.open_memmap(self.get_array_path(name, slot), 'w+', np.float64, array.shape)
+            mapped[:] = array
+            mapped.flush()
+            del mapped
+        meta = {'config': asdict(self.config), 'size': self.tree.size, 'iterations': self.iterations, 'slot': slot}
+        temp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(self.path, 'meta.json'))
+        self.slot = slot
+
+    def train(self, iterations: int, checkpoint_interval: int = None):
+        for _ in range(iterations):
+            self.iterate()
+            if checkpoint_interval and self.iterations % checkpoint_interval == 0:
+                self.checkpoint()
+        self.checkpoint()
+
+    def iterate(self):
+        """ One CFR+ iteration over a batch of deals sampled from the pool. """
+        self.iterations += 1
+        rng = np.random.default_rng([self.config.seed, self.iterations])
+        batch = rng.integers(0, len(self.deals['results']), min(self.config.batch_size, len(self.deals['results'])))
+        buckets = self.deals['buckets'][batch].astype(np.int64) # (batch, player, street)
+        results = self.deals['results'][batch].astype(np.float64)
+        reach = np.ones((2, len(batch)))
+        self._walk(0, reach, buckets, results)
+        np.maximum(self.regrets, 0, out=self.regrets)
+
+    def _walk(self, node: int, reach: np.ndarray, buckets: np.ndarray, results: np.ndarray) -> np.ndarray:
+        """ Returns the utilities of player 0 at node for every deal, and updates the node's subtree. """
+        tree = self.tree
+        kind = tree.kind[node]
+        if kind == FOLD:
+            folder = tree.player[node]
+            return np.full(len(results), float(tree.invested[node, 1] if folder == 1 else -tree.invested[node, 0]))
+        if kind == SHOWDOWN:
+            return results * float(tree.invested[node].min())
+
+        player, num_actions = tree.player[node], tree.num_actions[node]
+        num_buckets = self.config.buckets[tree.street[node]]
+        start = tree.offset[node]
+        regrets = self.regrets[start:start + num_buckets * num_actions].reshape(num_buckets, num_actions)
+        strategy_sums = self.strategy_sums[start:start + num_buckets * num_actions].reshape(num_buckets, num_actions)
+        bucket = buckets[:, player, tree.street[node]]
+
+        strategy = get_strategy(regrets)[bucket] # (deals, actions)
+        utilities = np.empty((len(results), num_actions))
+        for action, child in enumerate(tree.get_children(node)):
+            child_reach = reach.copy()
+            child_reach[player] *= strategy[:, action]
+            utilities[:, action] = self._walk(child, child_reach, buckets, results)
+        node_utilities = np.einsum('ij,ij->i', strategy, utilities)
+
+        sign = 1.0 if player == 0 else -1.0
+        regret_deltas = sign * (utilities - node_utilities[:, None]) * reach[1 - player][:, None]
+        strategy_deltas = self.iterations * reach[player][:, None] * strategy
+        for action in range(num_actions):
+            regrets[:, action] += np.bincount(bucket, regret_deltas[:, action], num_buckets)
+            strategy_sums[:, action] += np.bincount(bucket, strategy_deltas[:, action], num_buckets)
+        return node_utilities
+
+    def get_average_strategy(self, node: int, bucket: int) -> np.ndarray:
+        num_actions = self.tree.num_actions[node]
+        start = self.tree.offset[node] + bucket * num_actions
+        sums = np.asarray(self.strategy_sums[start:start + num_actions])
+        total = sums.sum()
+        return sums / total if total > 0 else np.full(num_actions, 1.0 / num_actions)
+
+    """ Playing """
+
+    def find_node(self, round: HoldemRound) -> int:
+        """ Returns the decision node of the player to move in a heads-up round, following its log and mapping
+        every raise to the closest abstract raise. Returns None if the round leaves the tree.
+        """
+        if len(round.players) != 2 or round.to_move == None:
+            return None
+        scale = self.config.small_blind / round.config.small_blind
+        # player 0 of the tree is the small blind, who is first to move preflop.
+        player_index = {p.sit: int(p is not round.first_to_move) for p in round.players}
+        node = 0
+        for event in round.log:
+            if event.action in ('sb', 'bb'):
+                continue
+            if self.tree.kind[node] != DECISION:
+                return None
+            if STREETS[self.tree.street[node]] != event.stage or self.tree.player[node] != player_index[event.sit]:
+                continue # a move forced by the engine
+            candidates = [
+                (abs(action[2] - event.raise_amount * scale), child)
+                for action, child in zip(self.tree.get_actions(node), self.tree.get_children(node))
+                if action[0] == event.action
+            ]
+            if not candidates:
+                return None
+            node = min(candidates)[1]
+        if self.tree.kind[node] != DECISION or self.tree.player[node] != player_index[round.to_move.sit]:
+            return None
+        if STREETS[self.tree.street[node]] != round.stage.value:
+            return None
+        return node
+
+    def get_bucket(self, round: HoldemRound, player: HoldemRoundPlayer, rng: np.random.Generator = None) -> int:
+        street = STREETS.index(round.stage.value)
+        hole_cards = np.array([[CARD_INDEX[card] for card in player.cards]], dtype=np.int64)
+        board = np.array([[CARD_INDEX[card] for card in round.community_cards]], dtype=np.int64)
+        return int(get_buckets(self.config, hole_cards, board, street, rng or np.random.default_rng())[0])
+
+    def get_move(self, round: HoldemRound, rng: random.Random = None) -> dict:
+        """ Samples a move of the player to move from the average strategy, scaled to the round's blinds and
+        clamped to its allowed raises. Returns None if the round leaves the tree.
+        """
+        player = round.to_move
+        allowed_moves = round.get_allowed_moves(player)
+        if allowed_moves['moves'] == ['check']:
+            # forced moves have no node in the tree.
+            return {'sit': player.sit, 'action': 'check', 'call_amount': 0, 'raise_amount': 0}
+        node = self.find_node(round)
+        if node == None:
+            return None
+        strategy = self.get_average_strategy(node, self.get_bucket(round, player))
+        action = (rng or random).choices(self.tree.get_actions(node), weights=strategy.tolist())[0]
+
+        if action[0] not in allowed_moves['moves']:
+            return None
+        move = {'sit': player.sit, 'action': action[0], 'call_amount': 0, 'raise_amount': 0}
+        if action[0] in ('call', 'raise'):
+            move['call_amount'] = allowed_moves['call_amount']
+        if action[0] == 'raise':
+            amount = int(action[2] * round.config.small_blind / self.config.small_blind + 0.5)
+            move['raise_amount'] = min(max(amount, allowed_moves['min_raise_amount']), allowed_moves['max_raise_amount'])
+        return move
+
+def get_strategy(regrets: np.ndarray) -> np.ndarray:
+    """ Regret matching over the rows of regrets, uniform where no regret is positive. """
+    positive = np.maximum(regrets, 0)
+    totals = positive.sum(axis=1, keepdims=True)
+    uniform = np.full_like(positive, 1.0 / regrets.shape[1])
+    return np.divide(positive, totals, out=uniform, where=totals > 0)
+
+class SolverPolicy:
+    """ A bot_runner policy playing a solver's strategy, at heads-up tables. tables is of the form {table_id: HoldemTable}.
+    A decision the tree doesn't cover gets None, so the runner checks or folds.
+    """
+    def __init__(self, solver: CFRSolver, tables: dict, seed: int = None):
+        self.solver = solver
+        self.tables = tables
+        self.random = random.Random(seed)
+
+    def decide(self, decisions: list) -> list:
+        replies = []
+        for decision in decisions:
+            table = self.tables.get(decision.table_id)
+            round = table.round if table != None else None
+            if round == None or round.to_move == None or round.to_move.sit != decision.sit:
+                replies.append(None)
+                continue
+            move = self.solver.get_move(round, self.random)
+            replies.append({key: move[key] for key in ('action', 'call_amount', 'raise_amount')} if move != None else None)
+        return replies
@@ -0,0 +1,258 @@
+""" A double entry ledger of the chips of the players, from their wallets to the tables and back.
+
+Every chip movement is a transfer between two accounts, so the sum of all balances is always 0:
+
+    'cashier'               - chips deposited to and withdrawn from the wallets (negative)
+    'wallet:{user_id}'      - chips of a player that are not at a table
+    'seat:{table_id}:{user_id}' - chips of a player at a table
+    'pot:{table_id}'        - chips bet in a round, until the pots are settled
+    'rake'                  - rake taken from the pots
+
+Balances are kept in memory. Transfers are written to a SQLite database (if a path is given) in batches
+by a background thread, like the TableStore journal, so recording a round doesn't wait for the disk.
+A failed batch is retried; if it still fails, it and the transfers after it are kept in unwritten, and
+posting raises LedgerError from then on, so the balances never get ahead of the database unnoticed.
+
+After every round the ledger is reconciled with the table: the pot must be empty, and the seat of every
+player must hold the chips of the player's round player. A mismatch raises ReconciliationError if strict,
+and is kept in discrepancies otherwise.
+
+Usage:
+    ledger = ChipLedger('ledger.db')
+    ledger.deposit('user_1', 1000)
+    table = HoldemTable('table_1', config, ledger=ledger)
+    ... # join requests are rejected if the wallet can't afford the buy in, rounds are settled by the table
+    ledger.close()
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRound, HoldemRoundStage
+else:
+    from .holdem_round import HoldemRound, HoldemRoundStage
+
+CASHIER = 'cashier'
+RAKE = 'rake'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    id INTEGER PRIMARY KEY,
+    table_id TEXT,
+    hand INTEGER,
+    kind TEXT NOT NULL,
+    from_account TEXT NOT NULL,
+    to_account TEXT NOT NULL,
+    amount INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transfers_table_hand ON transfers (table_id, hand);
+"""
+
+def wallet_account(user_id: str) -> str:
+    return f'wallet:{user_id}'
+
+def seat_account(table_id: str, user_id: str) -> str:
+    return f'seat:{table_id}:{user_id}'
+
+def pot_account(table_id: str) -> str:
+    return f'pot:{table_id}'
+
+class Transfer(NamedTuple):
+    table_id: str # None for wallet transfers
+    hand: int # number of the round at the table, None outside of rounds
+    kind: str # deposit, withdraw, buy_in, cash_out, bet, rake or award
+    from_account: str
+    to_account: str
+    amount: int
+
+class LedgerError(Exception):
+    pass
+
+class ReconciliationError(LedgerError):
+    pass
+
+class ChipLedger:
+    def __init__(self, path: str = None, batch_size: int = 1000, strict: bool = True, retries: int = 3):
+        self.path = path
+        self.batch_size = batch_size
+        self.strict = strict
+        self.retries = retries # of a failed batch, before the ledger stops writing
+        self.unwritten: list[Transfer] = [] # transfers that were not committed, after a write failed
+        self.balances: dict[str:int] = {} # of the form {account: balance}
+        self.hands: dict[str:int] = {} # of the form {table_id: number of the last recorded round}
+        self.discrepancies: list[str] = []
+        self.error: Exception = None
+        self.queue: queue.Queue = None
+        self.writer: threading.Thread = None
+
+        if path == None:
+            return
+        connection = self.connect()
+        connection.executescript(SCHEMA)
+        for account, amount in connection.execute("SELECT to_account, sum(amount) FROM transfers GROUP BY to_account"):
+            self.balances[account] = self.balances.get(account, 0) + amount
+        for account, amount in connection.execute("SELECT from_account, sum(amount) FROM transfers GROUP BY from_account"):
+            self.balances[account] = self.balances.get(account, 0) - amount
+        for table_id, hand in connection.execute("SELECT table_id, max(hand) FROM transfers WHERE hand IS NOT NULL GROUP BY table_id"):
+            self.hands[table_id] = hand
+        connection.close()
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name='ChipLedgerWriter', daemon=True)
+        self.writer.start()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _write_loop(self):
+        connection = self.connect()
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            running = None not in batch
+            transfers = [transfer for item in batch if item is not None for transfer in item]
+            if self.error is None:
+                self._write(connection, transfers)
+            else:
+                # nothing is written after a failed batch, so the transfers stay in order.
+                self.unwritten.extend(transfers)
+            for _ in batch:
+                self.queue.task_done()
+        connection.close()
+
+    def _write(self, connection: sqlite3.Connection, transfers: list[Transfer]):
+        """ Commits transfers in one transaction, retried with a backoff. If all attempts fail, transfers are
+        kept in self.unwritten and self.error is set.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO transfers (table_id, hand, kind, from_account, to_account, amount) VALUES (?, ?, ?, ?, ?, ?)",
+                        transfers,
+                    )
+                return
+            except Exception as e:
+                error = e
+                if attempt < self.retries:
+                    time.sleep(0.01 * 2**attempt)
+        self.unwritten.extend(transfers)
+        self.error = error
+
+    def post(self, transfers: list[Transfer]):
+        """ Applies transfers to the balances and queues them for writing, as one batch. """
+        if self.error is not None:
+            raise LedgerError(f'the ledger failed to write, {len(self.unwritten)} transfers are not stored') from self.error
+        for transfer in transfers:
+            if transfer.amount < 0:
+                raise LedgerError(f'negative transfer {transfer}')
+        for transfer in transfers:
+            self.balances[transfer.from_account] = self.balances.get(transfer.from_account, 0) - transfer.amount
+            self.balances[transfer.to_account] = self.balances.get(transfer.to_account, 0) + transfer.amount
+        if self.queue != None and transfers:
+            self.queue.put(transfers)
+
+    def get_balance(self, account: str) -> int:
+        return self.balances.get(account, 0)
+
+    def get_wallet(self, user_id: str) -> int:
+        return self.get_balance(wallet_account(user_id))
+
+    """ Wallets """
+
+    def deposit(self, user_id: str, amount: int):
+        self.post([Transfer(None, None, 'deposit', CASHIER, wallet_account(user_id), amount)])
+
+    def withdraw(self, user_id: str, amount: int):
+        if self.get_wallet(user_id) < amount:
+            raise LedgerError(f'{user_id} has {self.get_wallet(user_id)} chips in the wallet, can not withdraw {amount}')
+        self.post([Transfer(None, None, 'withdraw', wallet_account(user_id), CASHIER, amount)])
+
+    """ Tables """
+
+    def can_buy_in(self, user_id: str, chips: int) -> bool:
+        return self.get_wallet(user_id) >= chips
+
+    def record_buy_in(self, table_id: str, user_id: str, chips: int):
+        if not self.can_buy_in(user_id, chips):
+            raise LedgerError(f'{user_id} can not buy in for {chips}')
+        self.post([Transfer(table_id, None, 'buy_in', wallet_account(user_id), seat_account(table_id, user_id), chips)])
+
+    def record_cash_out(self, table_id: str, user_id: str, chips: int):
+        """ Moves a leaving player's chips back to the wallet, the seat must hold exactly chips. """
+        seat = seat_account(table_id, user_id)
+        if self.get_balance(seat) != chips:
+            self.report(f'{seat} holds {self.get_balance(seat)} chips, {chips} were cashed out')
+        self.post([Transfer(table_id, None, 'cash_out', seat, wallet_account(user_id), chips)])
+
+    def record_round(self, table_id: str, round: HoldemRound, player_ids: dict[int:str]):
+        """ Records the bets, rake and awards of an ended round, and reconciles the seats with it.
+        player_ids is of the form {sit: user_id} of the round's players.
+        The transfers are posted before reconciling, a ReconciliationError means they were recorded.
+        """
+        assert round.stage == HoldemRoundStage.ENDED
+        hand = self.hands.get(table_id, 0) + 1
+        self.hands[table_id] = hand
+        pot = pot_account(table_id)
+
+        transfers = []
+        for player in round.players:
+            bet = round.get_player_total_bet(player)
+            if bet > 0:
+                transfers.append(Transfer(table_id, hand, 'bet', seat_account(table_id, player_ids[player.sit]), pot, bet))
+        if round.rake > 0:
+            transfers.append(Transfer(table_id, hand, 'rake', pot, RAKE, round.rake))
+        for sit, award in round.awards.items():
+            if award > 0:
+                transfers.append(Transfer(table_id, hand, 'award', pot, seat_account(table_id, player_ids[sit]), award))
+        self.post(transfers)
+
+        if self.get_balance(pot) != 0:
+            self.report(f'{pot} holds {self.get_balance(pot)} chips after hand {hand}')
+        for player in round.players:
+            seat = seat_account(table_id, player_ids[player.sit])
+            if self.get_balance(seat) != player.chips:
+                self.report(f'{seat} holds {self.get_balance(seat)} chips after hand {hand}, the player has {player.chips}')
+
+    def report(self, discrepancy: str):
+        self.discrepancies.append(discrepancy)
+        if self.strict:
+            raise ReconciliationError(discrepancy)
+
+    def flush(self):
+        """ Blocks until all queued transfers are committed. """
+        if self.queue != None:
+            self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.writer != None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.error is not None:
+            raise self.error
+
+    def get_transfers(self, table_id: str = None) -> list[Transfer]:
+        """ Returns the committed transfers, of a table if table_id is given. """
+        self.flush()
+        connection = self.connect()
+        query = "SELECT table_id, hand, kind, from_account, to_account, amount FROM transfers"
+        rows = connection.execute(query + " WHERE table_id = ? ORDER BY id", (table_id,)) if table_id != None else connection.execute(query + " ORDER BY id")
+        transfers = [Transfer(*row) for row in rows]
+        connection.close()
+        return transfers
@@ -0,0 +1,160 @@
+""" Lazily loaded, shared hand evaluator.
+
+The deuces evaluator is imported and its lookup tables are built on the first call to get_evaluator(),
+not when core_game is imported. The lookup tables are cached in a binary file (HOLDEM_LOOKUP_TABLE_PATH,
+by default in the user's cache directory) which later processes memory map instead of rebuilding the
+tables. The file holds a header (magic, number of flush and of unsuited entries) and, per table, its
+sorted prime products followed by their ranks, all int64. Ranks are looked up with a binary search in the
+mapped file, so every process on the machine shares the same pages instead of holding its own dicts.
+Calling preload() before forking worker processes lets them share the loaded evaluator.
+"""
+
+import mmap
+import os
+import tempfile
+from array import array
+from bisect import bisect_left
+
+FILE_MAGIC = 0x484F4C4445554332 # 'HOLDEUC2'
+HEADER_SIZE = 3
+
+def _default_lookup_table_path() -> str:
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    if not os.path.isdir(os.path.dirname(cache_dir)):
+        cache_dir = tempfile.gettempdir()
+    return os.path.join(cache_dir, 'holdem_core', 'lookup_table_v2.bin')
+
+LOOKUP_TABLE_PATH = os.environ.get('HOLDEM_LOOKUP_TABLE_PATH') or _default_lookup_table_path()
+
+_evaluator = None
+_card_ints: dict[str:int] = None
+
+def _import_hand_ranker():
+    if __name__ == '__main__':
+        from deuces import deuces as hand_ranker
+    else:
+        from .deuces import deuces as hand_ranker
+    return hand_ranker
+
+class MappedLookup:
+    """ A read only {prime product: rank} table over sorted keys and ranks in a memory mapped file. """
+    __slots__ = ('keys', 'ranks')
+
+    def __init__(self, keys: memoryview, ranks: memoryview):
+        self.keys = keys
+        self.ranks = ranks
+
+    def __getitem__(self, key: int) -> int:
+        index = bisect_left(self.keys, key)
+        try:
+            if self.keys[index] == key:
+                return self.ranks[index]
+        except IndexError:
+            pass
+        raise KeyError(key)
+
+    def __contains__(self, key: int) -> bool:
+        index = bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def items(self):
+        return zip(self.keys, self.ranks)
+
+class MappedLookupTable:
+    """ Has the flush_lookup and unsuited_lookup of a deuces LookupTable, read from a lookup table file. """
+    def __init__(self, mapped: mmap.mmap, flush_lookup: MappedLookup, unsuited_lookup: MappedLookup):
+        self.mapped = mapped # kept open as long as the lookups are used
+        self.flush_lookup = flush_lookup
+        self.unsuited_lookup = unsuited_lookup
+
+def build_lookup_table_file(path: str = LOOKUP_TABLE_PATH):
+    """ Builds the deuces lookup tables, saves them to path and returns them. """
+    hand_ranker = _import_hand_ranker()
+
+    table = hand_ranker.LookupTable()
+    flush, unsuited = sorted(table.flush_lookup.items()), sorted(table.unsuited_lookup.items())
+    rows = array('q', (FILE_MAGIC, len(flush), len(unsuited)))
+    for lookup in (flush, unsuited):
+        rows.extend(key for key, rank in lookup)
+        rows.extend(rank for key, rank in lookup)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        rows.tofile(f)
+    os.replace(tmp_path, path)
+    return table
+
+def load_lookup_table(path: str = LOOKUP_TABLE_PATH) -> MappedLookupTable:
+    """ Memory maps a lookup table file, nothing is copied out of it. """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 8 * HEADER_SIZE or size % 8:
+            raise ValueError(f'corrupt lookup table file {path}')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    values = memoryview(mapped).cast('q')
+    magic, num_flush, num_unsuited = values[:HEADER_SIZE]
+    if magic != FILE_MAGIC or size != 8 * (HEADER_SIZE + 2 * (num_flush + num_unsuited)):
+        values.release()
+        mapped.close()
+        raise ValueError(f'corrupt lookup table file {path}')
+
+    lookups = []
+    offset = HEADER_SIZE
+    for count in (num_flush, num_unsuited):
+        lookups.append(MappedLookup(values[offset:offset + count], values[offset + count:offset + 2 * count]))
+        offset += 2 * count
+    return MappedLookupTable(mapped, *lookups)
+
+def _make_evaluator(path: str):
+    hand_ranker = _import_hand_ranker()
+    try:
+        table = load_lookup_table(path)
+    except (OSError, ValueError):
+        try:
+            build_lookup_table_file(path)
+            table = load_lookup_table(path)
+        except (OSError, ValueError):
+            # read only location, build the tables in memory only.
+            return hand_ranker.Evaluator()
+
+    evaluator = hand_ranker.Evaluator.__new__(hand_ranker.Evaluator)
+    evaluator.table = table
+    evaluator.hand_size_map = {5: evaluator._five, 6: evaluator._six, 7: evaluator._seven}
+    return evaluator
+
+def get_evaluator():
+    """ Returns the process wide deuces Evaluator, creating it on first use. """
+    global _evaluator, _card_ints
+    if _evaluator is None:
+        hand_ranker = _import_hand_ranker()
+        if __name__ == '__main__':
+            from holdem_round import CardDeck
+        else:
+            from .holdem_round import CardDeck
+        _card_ints = {card: hand_ranker.Card.new(card) for card in CardDeck.full_deck}
+        _evaluator = _make_evaluator(LOOKUP_TABLE_PATH)
+    return _evaluator
+
+def to_card_ints(cards: list[str]) -> list[int]:
+    """ Converts cards like 'Ah' to the evaluator's integer representation. """
+    if _card_ints is None:
+        get_evaluator()
+    return [_card_ints[card] for card in cards]
+
+def evaluate(cards: list[str], community_cards: list[str]) -> int:
+    """ Returns the rank of the best hand made of cards and community_cards. Lower is better. """
+    return get_evaluator().evaluate(to_card_ints(cards), to_card_ints(community_cards))
+
+def get_hand_rank_name(rank: int) -> str:
+    evaluator = get_evaluator()
+    return evaluator.class_to_string(evaluator.get_rank_class(rank))
+
+def preload():
+    """ Loads the evaluator now, e.g. in a parent process before forking workers. """
+    get_evaluator()
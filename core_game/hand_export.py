@@ -0,0 +1,165 @@
+""" Columnar export of completed Holdem rounds (hands), for vectorized analytics.
+
+Two tables are written, in chunks of chunk_size hands:
+    actions - one row per log entry (blinds included) of every hand.
+    hands - one row per hand.
+
+Chunks are written as .npz files (one array per column), or as Arrow IPC files if pyarrow is installed
+and format='arrow' is used.
+"""
+
+import os
+from array import array
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+if __name__ == '__main__':
+    from holdem_round import CardDeck, HoldemRound, HoldemRoundStage
+else:
+    from .holdem_round import CardDeck, HoldemRound, HoldemRoundStage
+
+STAGE_CODES = {stage.value: code for code, stage in enumerate(HoldemRoundStage)}
+ACTION_CODES = {'sb': 0, 'bb': 1, 'check': 2, 'call': 3, 'raise': 4, 'fold': 5}
+BOARD_SIZES = {'preflop': 0, 'flop': 3, 'turn': 4, 'river': 5}
+
+CARD_INDEX = {r+s: i for i, (r, s) in enumerate((r, s) for r in CardDeck.ranks for s in CardDeck.suites)}
+
+# column name: array typecode
+ACTION_COLUMNS = {
+    'hand_id': 'q',
+    'action_index': 'h',
+    'stage': 'b',
+    'sit': 'b',
+    'action': 'b',
+    'call_amount': 'q',
+    'raise_amount': 'q',
+    'pot': 'q', # pot size after the action
+    'board_mask': 'Q', # bit CARD_INDEX[card] is set for every community card seen at the action's stage
+}
+
+HAND_COLUMNS = {
+    'hand_id': 'q',
+    'num_players': 'b',
+    'small_blind': 'q',
+    'ante': 'q',
+    'num_actions': 'h',
+    'showdown': 'b',
+    'pot': 'q',
+    'board_mask': 'Q',
+    'winners_mask': 'H', # bit sit is set for every sit that won a pot
+}
+
+def cards_mask(cards: list[str]) -> int:
+    mask = 0
+    for card in cards:
+        mask |= 1 << CARD_INDEX[card]
+    return mask
+
+class HandHistoryColumnWriter:
+    """ Streams completed rounds into chunked column files in directory.
+
+    Only the current chunk is held in memory, in compact typed arrays.
+    Usage:
+        with HandHistoryColumnWriter('out') as writer:
+            for round in rounds:
+                writer.add_round(round)
+    """
+    def __init__(self, directory: str, chunk_size: int = 100_000, format: str = 'npz'):
+        assert format in ('npz', 'arrow')
+        if format == 'arrow' and pyarrow is None:
+            raise ImportError("format='arrow' requires pyarrow")
+
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.format = format
+        self.chunk_number = 0
+        self.next_hand_id = 0
+        os.makedirs(directory, exist_ok=True)
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self.actions = {name: array(typecode) for name, typecode in ACTION_COLUMNS.items()}
+        self.hands = {name: array(typecode) for name, typecode in HAND_COLUMNS.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        """ Number of hands buffered in the current chunk. """
+        return len(self.hands['hand_id'])
+
+    def add_round(self, round: HoldemRound, hand_id: int = None) -> int:
+        """ Appends an ended round to the current chunk and returns its hand id. """
+        assert round.stage == HoldemRoundStage.ENDED
+        if hand_id is None:
+            hand_id = self.next_hand_id
+        self.next_hand_id = hand_id + 1
+
+        board_masks = {stage: cards_mask(round.community_cards[:size]) for stage, size in BOARD_SIZES.items()}
+        pot = 0
+        for action_index, event in enumerate(round.log):
+            if event.action != 'fold':
+                pot += event.call_amount + event.raise_amount
+            row = (
+                hand_id, action_index, STAGE_CODES[event.stage], event.sit, ACTION_CODES[event.action],
+                event.call_amount, event.raise_amount, pot, board_masks[event.stage],
+            )
+            for column, value in zip(self.actions.values(), row):
+                column.append(value)
+
+        winners_mask = 0
+        for sits in round.winners.values():
+            for sit in sits:
+                winners_mask |= 1 << sit
+        row = (
+            hand_id, len(round.players), round.config.small_blind, round.config.ante, len(round.log),
+            len(round.community_cards) == 5 and len([p for p in round.players if not p.folded]) > 1,
+            pot, cards_mask(round.community_cards), winners_mask,
+        )
+        for column, value in zip(self.hands.values(), row):
+            column.append(value)
+
+        if len(self) >= self.chunk_size:
+            self.flush()
+        return hand_id
+
+    def _write_table(self, name: str, columns: dict):
+        arrays = {column: np.frombuffer(values, dtype=values.typecode) for column, values in columns.items()}
+        path = os.path.join(self.directory, f'{name}_{self.chunk_number:06d}')
+        if self.format == 'npz':
+            np.savez(path + '.npz', **arrays)
+            return
+        table = pyarrow.table(arrays)
+        with pyarrow.ipc.new_file(path + '.arrow', table.schema) as writer:
+            writer.write_table(table)
+
+    def flush(self):
+        """ Writes the current chunk to disk and starts a new one. """
+        if len(self) == 0:
+            return
+        self._write_table('actions', self.actions)
+        self._write_table('hands', self.hands)
+        self.chunk_number += 1
+        self._reset_buffers()
+
+    def close(self):
+        self.flush()
+
+def load_columns(directory: str, table: str = 'actions') -> dict[str:np.ndarray]:
+    """ Loads and concatenates all .npz chunks of table ('actions' or 'hands') in directory. """
+    assert table in ('actions', 'hands')
+    paths = sorted(f for f in os.listdir(directory) if f.startswith(table + '_') and f.endswith('.npz'))
+    chunks = [np.load(os.path.join(directory, path)) for path in paths]
+    columns = ACTION_COLUMNS if table == 'actions' else HAND_COLUMNS
+    if not chunks:
+        return {column: np.array([], dtype=typecode) for column, typecode in columns.items()}
+    return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in columns}
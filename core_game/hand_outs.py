@@ -0,0 +1,190 @@
+""" Outs and draws of the live players of a round, on the flop and the turn.
+
+An out of a player is a next card after which the player leads alone (or, for split_outs, shares the lead)
+while it does not lead alone now. Dealt cards of all players, folded ones included, are not outs.
+
+Every street's result keeps the rank of every live player with every possible next card, so the
+result of the next street is computed from it: the players' current ranks are looked up instead of
+evaluated, and a next card is only evaluated in the 5 card hands that contain it, on lookup keys
+(prime products and suits) of the current cards computed once per street.
+Draws are found with rank and suit bitmasks.
+"""
+
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+if __name__ == '__main__':
+    import hand_evaluator
+    from holdem_round import CardDeck, HoldemRound
+else:
+    from . import hand_evaluator
+    from .holdem_round import CardDeck, HoldemRound
+
+RANK_BITS = {rank: 1 << i for i, rank in enumerate(CardDeck.ranks)}
+# 5 consecutive ranks, the ace also plays low.
+STRAIGHT_MASKS = tuple(0b11111 << low for low in range(9)) + (RANK_BITS['A'] | 0b1111,)
+
+@dataclass(slots=True)
+class StreetOuts:
+    stage: str
+    community_cards: tuple
+    leaders: tuple # sits of the players that lead now
+    ranks: dict = field(repr=False) # of the form {sit: rank}
+    next_ranks: dict = field(repr=False) # of the form {sit: {next card: rank}}
+    outs: dict # of the form {sit: [card, ...]}
+    split_outs: dict # of the form {sit: [card, ...]}
+    draws: dict # of the form {sit: ['flush_draw', 'open_ended', ...]}
+
+    def to_view(self) -> dict:
+        """ A json serializable view, e.g. for spectators. """
+        return {
+            'stage': self.stage,
+            'leaders': list(self.leaders),
+            'outs': {sit: list(cards) for sit, cards in self.outs.items()},
+            'split_outs': {sit: list(cards) for sit, cards in self.split_outs.items()},
+            'draws': {sit: list(draws) for sit, draws in self.draws.items()},
+        }
+
+def get_leaders(ranks: dict) -> tuple:
+    best = min(ranks.values())
+    return tuple(sit for sit, rank in ranks.items() if rank == best)
+
+def get_draws(hole_cards: list[str], community_cards: list[str]) -> list[str]:
+    """ Returns the flush and straight draws of a player that use at least one of its hole cards. """
+    draws = []
+    board_suits = [card[1] for card in community_cards]
+    for suit in set(card[1] for card in hole_cards):
+        count = board_suits.count(suit) + [card[1] for card in hole_cards].count(suit)
+        if count >= 5:
+            return [] # a flush is made
+        if count == 4:
+            draws.append('flush_draw')
+        elif count == 3 and len(community_cards) == 3:
+            draws.append('backdoor_flush_draw')
+
+    board_mask = 0
+    for card in community_cards:
+        board_mask |= RANK_BITS[card[0]]
+    mask = board_mask
+    for card in hole_cards:
+        mask |= RANK_BITS[card[0]]
+    if any(straight & mask == straight for straight in STRAIGHT_MASKS):
+        return [draw for draw in draws if draw != 'backdoor_flush_draw']
+
+    completing_ranks = 0
+    for bit in RANK_BITS.values():
+        if mask & bit:
+            continue
+        for straight in STRAIGHT_MASKS:
+            if straight & (mask | bit) == straight and straight & (board_mask | bit) != straight:
+                completing_ranks += 1
+                break
+    if completing_ranks >= 2:
+        draws.append('open_ended')
+    elif completing_ranks == 1:
+        draws.append('gutshot')
+    return draws
+
+def _lookup_keys(card_ints: list[int]) -> list[tuple[int, int]]:
+    """ (prime product, suit or 0) of every 4 cards of card_ints, suit is set if the 4 cards are suited. """
+    keys = []
+    for four in itertools.combinations(card_ints, 4):
+        product = 1
+        suit = four[0] & 0xF000
+        for card in four:
+            product *= card & 0xFF
+            if card & 0xF000 != suit:
+                suit = 0
+        keys.append((product, suit))
+    return keys
+
+def _ranks_with_next_cards(current_rank: int, card_ints: list[int], next_cards: dict) -> dict:
+    """ Returns {card: rank} of the hand of card_ints plus each of next_cards ({card: card int}). """
+    table = hand_evaluator.get_evaluator().table
+    flush_lookup, unsuited_lookup = table.flush_lookup, table.unsuited_lookup
+    keys = _lookup_keys(card_ints)
+    ranks = {}
+    for card, card_int in next_cards.items():
+        prime, suit = card_int & 0xFF, card_int & 0xF000
+        best = current_rank
+        for product, four_suit in keys:
+            rank = flush_lookup[product * prime] if four_suit == suit else unsuited_lookup[product * prime]
+            if rank < best:
+                best = rank
+        ranks[card] = best
+    return ranks
+
+def get_outs(round: HoldemRound, previous: StreetOuts = None) -> StreetOuts:
+    """ Returns the outs and draws of the live players of a round on the flop or the turn.
+    previous is the result of the previous street of the same round, if it was computed.
+    """
+    community_cards = tuple(round.community_cards)
+    if len(community_cards) not in (3, 4):
+        raise ValueError('outs are computed on the flop and the turn')
+    live_players = [p for p in round.players if not p.folded]
+    if len(live_players) < 2:
+        raise ValueError('outs need at least two live players')
+
+    dead_cards = set(community_cards)
+    for player in round.players:
+        dead_cards.update(player.cards)
+    next_cards = {card: card_int for card, card_int in zip(CardDeck.full_deck, hand_evaluator.to_card_ints(CardDeck.full_deck)) if card not in dead_cards}
+
+    use_previous = previous != None and previous.community_cards == community_cards[:-1]
+    ranks = {}
+    next_ranks = {}
+    for player in live_players:
+        if use_previous and player.sit in previous.next_ranks:
+            ranks[player.sit] = previous.next_ranks[player.sit][community_cards[-1]]
+        else:
+            ranks[player.sit] = hand_evaluator.evaluate(player.cards, list(community_cards))
+        card_ints = hand_evaluator.to_card_ints(player.cards + list(community_cards))
+        next_ranks[player.sit] = _ranks_with_next_cards(ranks[player.sit], card_ints, next_cards)
+
+    leaders = get_leaders(ranks)
+    outs = {p.sit: [] for p in live_players}
+    split_outs = {p.sit: [] for p in live_players}
+    for card in next_cards:
+        card_leaders = get_leaders({sit: sit_ranks[card] for sit, sit_ranks in next_ranks.items()})
+        if card_leaders == leaders:
+            continue
+        if len(card_leaders) == 1:
+            outs[card_leaders[0]].append(card)
+            continue
+        for sit in card_leaders:
+            if sit not in leaders:
+                split_outs[sit].append(card)
+
+    return StreetOuts(
+        stage=round.stage.value,
+        community_cards=community_cards,
+        leaders=leaders,
+        ranks=ranks,
+        next_ranks=next_ranks,
+        outs=outs,
+        split_outs=split_outs,
+        draws={p.sit: get_draws(p.cards, list(community_cards)) for p in live_players},
+    )
+
+class OutsTracker:
+    """ Keeps the flop result of every round, so the turn is computed from it.
+    Results are kept per hand (the players' cards), since a round object can be reused for the next hand,
+    and for at most max_rounds rounds; a round's result is dropped once the turn is computed.
+    """
+    def __init__(self, max_rounds: int = 10_000):
+        self.max_rounds = max_rounds
+        self.results: OrderedDict = OrderedDict() # of the form {id(round): (hand, StreetOuts)}
+
+    def update(self, round: HoldemRound) -> StreetOuts:
+        hand = tuple((p.sit, tuple(p.cards)) for p in round.players)
+        previous = self.results.pop(id(round), None)
+        result = get_outs(round, previous[1] if previous != None and previous[0] == hand else None)
+        if len(result.community_cards) == 3:
+            self.results[id(round)] = (hand, result)
+            if len(self.results) > self.max_rounds:
+                self.results.popitem(last=False)
+        return result
+
+    def forget(self, round: HoldemRound):
+        self.results.pop(id(round), None)
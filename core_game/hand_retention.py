@@ -0,0 +1,107 @@
+""" Bounded retention of completed hands for long running tables.
+
+A HandRetention keeps a summary of the last max_hands hands of every table in a ring buffer, and
+offloads the full hand records (see holdem_replay.make_hand_record) to an optional sink.
+Tables pass their ended rounds to it (HoldemTable.archive_round), after which the round's deck is released.
+"""
+
+import json
+import queue
+from collections import deque
+from typing import NamedTuple
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRound, HoldemRoundStage
+    from holdem_replay import make_hand_record
+else:
+    from .holdem_round import HoldemRound, HoldemRoundStage
+    from .holdem_replay import make_hand_record
+
+class HandSummary(NamedTuple):
+    table_id: str
+    hand_number: int
+    player_ids: tuple # of the form ((sit, player_id), ...)
+    chips: tuple # of the form ((sit, starting chips, final chips), ...)
+    community_cards: tuple
+    winners: tuple # sits that won a pot
+    pot: int
+    num_actions: int
+    showdown: bool
+
+class JsonLinesSink:
+    """ Appends hand records to a file, one json record per line. """
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+
+    def __call__(self, record: dict):
+        self.file.write(json.dumps(record) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class QueueSink:
+    """ Puts hand records on a queue without blocking. Records are dropped (and counted) if the queue is full. """
+    def __init__(self, records: queue.Queue):
+        self.queue = records
+        self.dropped = 0
+
+    def __call__(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class HandRetention:
+    """ Ring buffers of the last max_hands hand summaries, per table, and an optional sink for full hand records.
+
+    sink is any callable that takes a hand record dict, e.g. JsonLinesSink or QueueSink.
+    """
+    def __init__(self, max_hands: int = 100, sink = None):
+        assert max_hands > 0
+        self.max_hands = max_hands
+        self.sink = sink
+        self.recent: dict[str:deque] = {} # of the form {table_id: deque of HandSummary}
+        self.hand_counts: dict[str:int] = {} # of the form {table_id: hands archived}
+
+    def archive(self, table_id: str, round: HoldemRound, player_ids: dict = None) -> HandSummary:
+        """ Stores a summary of an ended round, and passes its hand record to the sink. """
+        assert round.stage == HoldemRoundStage.ENDED
+        player_ids = player_ids or {}
+        hand_number = self.hand_counts.get(table_id, 0) + 1
+        self.hand_counts[table_id] = hand_number
+
+        summary = HandSummary(
+            table_id=table_id,
+            hand_number=hand_number,
+            player_ids=tuple((p.sit, player_ids.get(p.sit)) for p in round.players),
+            chips=tuple((p.sit, round.starting_chips.get(p.sit), p.chips) for p in round.players),
+            community_cards=tuple(round.community_cards),
+            winners=tuple(sorted({sit for sits in round.winners.values() for sit in sits})),
+            pot=sum(event.call_amount + event.raise_amount for event in round.log if event.action != 'fold'),
+            num_actions=len(round.log),
+            showdown=len([p for p in round.players if not p.folded]) > 1,
+        )
+        recent = self.recent.get(table_id)
+        if recent is None:
+            recent = self.recent[table_id] = deque(maxlen=self.max_hands)
+        recent.append(summary)
+
+        if self.sink is not None:
+            record = make_hand_record(round)
+            record['table_id'] = table_id
+            record['hand_number'] = hand_number
+            record['player_ids'] = [[sit, player_id] for sit, player_id in summary.player_ids]
+            self.sink(record)
+        return summary
+
+    def get_recent_hands(self, table_id: str) -> list[HandSummary]:
+        """ Returns the retained summaries of table_id, oldest first. """
+        return list(self.recent.get(table_id, ()))
+
+    def forget_table(self, table_id: str):
+        """ Drops everything retained for a closed table. """
+        self.recent.pop(table_id, None)
+        self.hand_counts.pop(table_id, None)
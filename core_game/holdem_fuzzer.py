@@ -0,0 +1,332 @@
+""" Randomized, seeded fuzzing of HoldemTable and HoldemRound, with invariant checking.
+
+A seed is turned into a list of operations (sits, leaves, legal and illegal moves, starting rounds),
+which are applied to a fresh table while the invariants are checked after every step.
+A failing list of operations is minimized, so it can be replayed with run_ops and turned into a test.
+Many seeds are run in parallel with fuzz().
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+if __name__ == '__main__':
+    # run as python -m core_game.holdem_fuzzer
+    from core_game import hand_evaluator
+    from core_game.holdem_round import HoldemRound, HoldemRoundPlayer, HoldemRoundStage
+    from core_game.holdem_table import HoldemTable, HoldemTableConfig
+else:
+    from . import hand_evaluator
+    from .holdem_round import HoldemRound, HoldemRoundPlayer, HoldemRoundStage
+    from .holdem_table import HoldemTable, HoldemTableConfig
+
+BETTING_STAGES = (HoldemRoundStage.PREFLOP, HoldemRoundStage.FLOP, HoldemRoundStage.TURN, HoldemRoundStage.RIVER)
+ACTIONS = ('check', 'call', 'raise', 'fold')
+USER_IDS = tuple(f'u{i}' for i in range(12))
+
+class InvariantViolation(Exception):
+    def __init__(self, invariant: str, message: str):
+        super().__init__(f'{invariant}: {message}')
+        self.invariant = invariant
+
+class FuzzFailure(NamedTuple):
+    seed: int
+    step: int # index of the failing operation in ops
+    invariant: str
+    message: str
+    config: tuple # (small_blind, reuse_round, rake_rate)
+    ops: list # the (minimized) operations, replayable with run_ops(config, ops)
+
+def make_config(rng: random.Random) -> tuple:
+    return (rng.choice((1, 5, 10, 25)), rng.random() < 0.5, rng.choice((0.0, 0.0, 0.05, 0.1)))
+
+def make_ops(rng: random.Random, num_steps: int) -> list[tuple]:
+    """ Returns num_steps random operations, each one of:
+
+        ('join', user_id, sit, chips) - sit and chips are sometimes out of range, user_id sometimes not a str
+        ('leave', user_id, sit) - sit is None for the player's own sit
+        ('start',) - starts a new round (if possible) and its first move
+        ('move', choice, fraction) - a legal move of the player to move, chosen by choice, raise size by fraction
+        ('bad_move', sit, action, call_amount, raise_amount) - a random, mostly illegal, move
+    """
+    ops = []
+    for _ in range(num_steps):
+        r = rng.random()
+        if r < 0.55:
+            ops.append(('move', rng.random(), rng.random()))
+        elif r < 0.7:
+            ops.append((
+                'bad_move', rng.randint(0, 10), rng.choice(ACTIONS + ('bet',)),
+                rng.choice((0, 1, 5, 10, 20, 100, -5)), rng.choice((0, 1, 5, 10, 20, 100, 10_000, -5)),
+            ))
+        elif r < 0.8:
+            ops.append(('start',))
+        elif r < 0.92:
+            user_id = rng.choice(USER_IDS) if rng.random() < 0.95 else rng.randint(0, 3)
+            sit = rng.randint(1, 9) if rng.random() < 0.9 else rng.choice((0, 10, -1, '3'))
+            chips = rng.randint(1, 500) if rng.random() < 0.9 else rng.choice((0, -10, 2.5))
+            ops.append(('join', user_id, sit, chips))
+        else:
+            ops.append(('leave', rng.choice(USER_IDS), None if rng.random() < 0.8 else rng.randint(1, 9)))
+    return ops
+
+class TableFuzzer:
+    """ Applies fuzz operations to a table, and checks the invariants after each one. """
+    def __init__(self, config: tuple):
+        small_blind, reuse_round = config[:2]
+        rake_rate = config[2] if len(config) > 2 else 0.0
+        self.table = HoldemTable('fuzz', HoldemTableConfig(small_blind, 0, 1, 1000, 9, reuse_round=reuse_round, rake_rate=rake_rate, rake_cap=3 * small_blind))
+        self.bank = 0 # chips brought to the table minus chips taken from it
+        self.checked_state_key = None
+
+    def apply(self, op: tuple):
+        table = self.table
+        name = op[0]
+        if name == 'join':
+            _, user_id, sit, chips = op
+            request = {'user_id': user_id, 'table_id': 'fuzz', 'type': 'join', 'sit': sit, 'chips': chips}
+            response = table.request_handler({'type': 'sit_request', 'data': request})
+            if response['success']:
+                self.bank += chips
+
+        elif name == 'leave':
+            _, user_id, sit = op
+            player = table.get_player_by_id(user_id)
+            if sit == None:
+                sit = player.sit if player != None else 1
+            request = {'user_id': user_id, 'table_id': 'fuzz', 'type': 'leave', 'sit': sit, 'chips': 0}
+            response = table.request_handler({'type': 'sit_request', 'data': request})
+            if response['success']:
+                self.bank -= response['data']['amount']
+                if table.get_player_by_id(user_id) != None:
+                    raise InvariantViolation('leave', f'{user_id} left but is still at the table')
+
+        elif name == 'start':
+            if table.round != None and table.round.stage != HoldemRoundStage.ENDED:
+                return
+            table.start_new_round()
+            if table.round != None and table.round.stage == HoldemRoundStage.NOT_STARTED:
+                table.round.start()
+
+        elif name == 'move':
+            round = table.round
+            if round == None or round.stage not in BETTING_STAGES:
+                return
+            _, choice, fraction = op
+            player = round.to_move
+            allowed_moves = round.get_allowed_moves(player)
+            moves = allowed_moves['moves']
+            if not moves:
+                raise InvariantViolation('allowed_moves', f'no allowed moves for sit {player.sit} to move')
+            action = moves[int(choice * len(moves))]
+            request = {'sit': player.sit, 'action': action, 'call_amount': 0, 'raise_amount': 0}
+            if action in ('call', 'raise'):
+                request['call_amount'] = allowed_moves['call_amount']
+            if action == 'raise':
+                low, high = allowed_moves['min_raise_amount'], allowed_moves['max_raise_amount']
+                request['raise_amount'] = low + int(fraction * fraction * (high - low))
+            self.apply_move(request, must_succeed=True)
+
+        elif name == 'bad_move':
+            _, sit, action, call_amount, raise_amount = op
+            if table.round == None:
+                return
+            self.apply_move({'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount})
+
+        else:
+            raise ValueError(f'unknown fuzz operation {op}')
+
+    def apply_move(self, request: dict, must_succeed: bool = False):
+        """ Applies a move like a live table does, checking the pots before the round is settled. """
+        round = self.table.round
+        expected = round.validate_game_request(round.get_player_by_sit(request['sit']), request) if round.stage in BETTING_STAGES else False
+        response = self.table.request_handler({'type': 'move_request', 'data': request})
+        if response['success'] != expected or (must_succeed and not response['success']):
+            raise InvariantViolation('validate_game_request', f'{request} was {"accepted" if response["success"] else "rejected"}')
+        if not response['success']:
+            return
+
+        round.start_next_move()
+        if round.stage in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+            round.make_pots()
+            check_pots(round)
+            round.finish()
+            check_settled(round)
+            self.bank -= round.rake
+
+    def get_state_key(self) -> tuple:
+        """ Changes whenever an operation changed the table, failed (rejected) operations leave it as is. """
+        round = self.table.round
+        if round == None:
+            return (self.bank, len(self.table.players))
+        return (self.bank, len(self.table.players), id(round), round.stage, len(round.log))
+
+    def check(self):
+        """ Checks the invariants, unless the table didn't change since the last check. """
+        state_key = self.get_state_key()
+        if state_key == self.checked_state_key:
+            return
+        self.checked_state_key = state_key
+
+        table = self.table
+        round = table.round
+        round_players = set(id(p) for p in round.players) if round != None else set()
+        in_play = round != None and round.stage in BETTING_STAGES
+
+        total = 0
+        for player in table.players:
+            chips = player.round_player.chips if id(player.round_player) in round_players else player.chips
+            if chips < 0:
+                raise InvariantViolation('chips', f'sit {player.sit} has {chips} chips')
+            total += chips
+        if in_play:
+            total += sum(round.get_player_total_bet(p) for p in round.players)
+        if total != self.bank:
+            raise InvariantViolation('chips', f'{total} chips on the table, {self.bank} were brought')
+
+        if in_play:
+            check_round(round)
+
+def check_round(round: HoldemRound):
+    """ Checks the invariants of a round in a betting stage. """
+    bets = sum(round.get_player_total_bet(p) for p in round.players)
+    if sum(p.chips for p in round.players) + bets != sum(round.starting_chips.values()):
+        raise InvariantViolation('chips', 'round chips and bets differ from the starting chips')
+
+    to_move = round.to_move
+    if to_move == None or to_move not in round.players or to_move.folded:
+        raise InvariantViolation('to_move', f'{to_move} is not a live player')
+    for player in round.players:
+        allowed_moves = round.get_allowed_moves(player)
+        if player is not to_move and allowed_moves['moves']:
+            raise InvariantViolation('allowed_moves', f'sit {player.sit} is not to move but has moves {allowed_moves}')
+    check_allowed_moves(round, to_move)
+
+def check_allowed_moves(round: HoldemRound, player: HoldemRoundPlayer):
+    """ Checks that exactly the allowed moves (at their allowed amounts) pass validate_game_request. """
+    allowed_moves = round.get_allowed_moves(player)
+    call_amount = allowed_moves['call_amount']
+    min_raise, max_raise = allowed_moves['min_raise_amount'], allowed_moves['max_raise_amount']
+    if 'raise' in allowed_moves['moves']:
+        if not 0 < min_raise <= max_raise or call_amount + max_raise > player.chips:
+            raise InvariantViolation('allowed_moves', f'bad raise amounts {allowed_moves} for {player.chips} chips')
+    if call_amount > player.chips:
+        raise InvariantViolation('allowed_moves', f'call amount {call_amount} above {player.chips} chips')
+
+    for action in ACTIONS:
+        requests = [{'sit': player.sit, 'action': action, 'call_amount': 0, 'raise_amount': 0}]
+        if action == 'call':
+            requests[0]['call_amount'] = call_amount
+        if action == 'raise':
+            requests = [
+                {'sit': player.sit, 'action': action, 'call_amount': call_amount, 'raise_amount': amount}
+                for amount in (min_raise, max_raise)
+            ]
+        for request in requests:
+            if round.validate_game_request(player, request) != (action in allowed_moves['moves']):
+                raise InvariantViolation('allowed_moves', f'validate_game_request disagrees with {allowed_moves} on {request}')
+
+def check_pots(round: HoldemRound):
+    """ Checks that the pots partition the bets, among the players who can win them. """
+    total_bets = sum(round.get_player_total_bet(p) for p in round.players)
+    if sum(pot['pot'] for pot in round.pots.values()) != total_bets:
+        raise InvariantViolation('pots', f'pots {round.pots} do not add up to the bets {total_bets}')
+    previous_players = None
+    for bet_rank in sorted(round.pots):
+        players = round.pots[bet_rank]['players']
+        if not players or any(p.folded for p in players):
+            raise InvariantViolation('pots', f'pot {bet_rank} has no players, or folded players')
+        if previous_players != None and not set(map(id, players)) <= previous_players:
+            raise InvariantViolation('pots', f'pot {bet_rank} players are not a subset of the lower pot players')
+        previous_players = set(map(id, players))
+
+def check_settled(round: HoldemRound):
+    if round.stage != HoldemRoundStage.ENDED:
+        raise InvariantViolation('stage', f'round not ended after finish, stage is {round.stage}')
+    if sum(p.chips for p in round.players) + round.rake != sum(round.starting_chips.values()):
+        raise InvariantViolation('chips', 'chips were not conserved by settling the pots')
+    if round.rake < 0 or (round.config.rake_cap > 0 and round.rake > round.config.rake_cap):
+        raise InvariantViolation('rake', f'rake of {round.rake} out of range')
+
+def run_ops(config: tuple, ops: list[tuple]) -> tuple:
+    """ Applies ops to a new table, returns (step, invariant, message) of the first failure, or None. """
+    fuzzer = TableFuzzer(config)
+    for step, op in enumerate(ops):
+        try:
+            fuzzer.apply(op)
+            fuzzer.check()
+        except InvariantViolation as e:
+            return (step, e.invariant, str(e))
+        except Exception as e:
+            return (step, f'exception {type(e).__name__}', f'{type(e).__name__}: {e}')
+    return None
+
+def minimize_ops(config: tuple, ops: list[tuple], invariant: str) -> list[tuple]:
+    """ Removes chunks of ops (halving the chunk size down to single ops) while they still fail the same invariant. """
+    def fails(candidate):
+        result = run_ops(config, candidate)
+        return result != None and result[1] == invariant
+
+    chunk_size = len(ops) // 2
+    while chunk_size >= 1:
+        start = 0
+        while start < len(ops):
+            candidate = ops[:start] + ops[start + chunk_size:]
+            if fails(candidate):
+                ops = candidate
+            else:
+                start += chunk_size
+        chunk_size //= 2
+    return ops
+
+def fuzz_seed(seed: int, num_steps: int = 1000, minimize: bool = True) -> FuzzFailure:
+    """ Fuzzes one seed, returns its (minimized) failure or None. """
+    rng = random.Random(seed)
+    config = make_config(rng)
+    ops = make_ops(rng, num_steps)
+    # the engine prints while it runs.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = run_ops(config, ops)
+        if result == None:
+            return None
+        step, invariant, message = result
+        ops = ops[:step + 1]
+        if minimize:
+            ops = minimize_ops(config, ops, invariant)
+            step, invariant, message = run_ops(config, ops)
+    return FuzzFailure(seed, step, invariant, message, config, ops)
+
+def _fuzz_seed(args: tuple) -> FuzzFailure:
+    return fuzz_seed(*args)
+
+def fuzz(seeds, num_steps: int = 1000, max_workers: int = None, minimize: bool = True) -> list[FuzzFailure]:
+    """ Fuzzes seeds in parallel and returns the failures, one per failing seed. """
+    hand_evaluator.preload() # shared by forked workers
+    seeds = list(seeds)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        chunksize = max(1, len(seeds) // (4 * (max_workers or os.cpu_count() or 1)))
+        results = executor.map(_fuzz_seed, [(seed, num_steps, minimize) for seed in seeds], chunksize=chunksize)
+        return [failure for failure in results if failure != None]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='fuzz HoldemTable with random seeded operations')
+    parser.add_argument('-n', '--seeds', type=int, default=1000, help='number of seeds')
+    parser.add_argument('-s', '--start-seed', type=int, default=0)
+    parser.add_argument('--steps', type=int, default=1000, help='operations per seed')
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('--no-minimize', action='store_true')
+    args = parser.parse_args()
+
+    failures = fuzz(range(args.start_seed, args.start_seed + args.seeds), args.steps, args.workers, not args.no_minimize)
+    for failure in failures:
+        print(f'seed {failure.seed} failed {failure.invariant} at step {failure.step}: {failure.message}')
+        print(f'    config={failure.config} ops={failure.ops}')
+    print(f'{args.seeds} seeds, {args.seeds * args.steps} operations, {len(failures)} failures')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
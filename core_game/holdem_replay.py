@@ -0,0 +1,152 @@
+""" Replaying recorded Holdem rounds (hands) from their log and deck order. """
+
+import copy
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+if __name__ == '__main__':
+    from holdem_round import (
+        CardDeck,
+        HoldemRound,
+        HoldemRoundConfig,
+        HoldemRoundPlayer,
+        HoldemRoundStage,
+    )
+
+else:
+    from .holdem_round import (
+        CardDeck,
+        HoldemRound,
+        HoldemRoundConfig,
+        HoldemRoundPlayer,
+        HoldemRoundStage,
+    )
+
+BLIND_ACTIONS = ('sb', 'bb')
+
+class ReplayError(Exception):
+    pass
+
+def make_hand_record(round: HoldemRound) -> dict:
+    """ Creates a json serializable record of a started round, from which the round can be replayed.
+
+    record = {
+        'small_blind': int,
+        'ante': int,
+        'rake_rate': float,
+        'rake_cap': int,
+        'players': [{'sit': int, 'chips': int}, ...], # chips at the start of the round
+        'first_to_move': int, # sit
+        'deck': list[str], # deck order before dealing
+        'actions': [request, ...], # game requests, without blinds
+        'final_chips': {sit: chips}, # present only if the round ended
+    }
+    """
+    assert round.stage != HoldemRoundStage.NOT_STARTED
+    record = {
+        'small_blind': round.config.small_blind,
+        'ante': round.config.ante,
+        'rake_rate': round.config.rake_rate,
+        'rake_cap': round.config.rake_cap,
+        'players': [{'sit': sit, 'chips': chips} for sit, chips in round.starting_chips.items()],
+        'first_to_move': round.first_to_move.sit,
+        'deck': list(round.deck_order),
+        'actions': [
+            {'sit': event.sit, 'action': event.action, 'call_amount': event.call_amount, 'raise_amount': event.raise_amount}
+            for event in round.log if event.action not in BLIND_ACTIONS
+        ],
+    }
+    if round.stage == HoldemRoundStage.ENDED:
+        record['final_chips'] = {p.sit: p.chips for p in round.players}
+    return record
+
+def apply_action(round: HoldemRound, request: dict) -> None:
+    """ Applies a recorded game request to round, and moves the round forward like a live table would. """
+    response = round.process_game_request(request)
+    if not response['success']:
+        raise ReplayError(f"recorded action rejected: {request}")
+
+    round.start_next_move()
+    if round.stage in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+        round.finish()
+
+class HoldemRoundReplayer:
+    """ Reconstructs the state of a recorded round at any action index.
+
+    A copy of the round is kept every checkpoint_interval actions, so seeking to action k
+    replays only the actions since the closest checkpoint before k.
+    """
+    def __init__(self, record: dict, checkpoint_interval: int = 8):
+        assert checkpoint_interval > 0
+        self.record = record
+        self.actions: list[dict] = record['actions']
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints: dict[int:HoldemRound] = {0: self.make_initial_round()}
+
+    def __len__(self):
+        return len(self.actions)
+
+    def make_initial_round(self) -> HoldemRound:
+        players = [HoldemRoundPlayer(p['sit'], p['chips']) for p in self.record['players']]
+        for player in players:
+            player.validate_player()
+        first_to_move = [p for p in players if p.sit == self.record['first_to_move']][0]
+        config = HoldemRoundConfig(self.record['small_blind'], self.record['ante'], self.record.get('rake_rate', 0.0), self.record.get('rake_cap', 0))
+        round = HoldemRound(config, players, first_to_move, deck=CardDeck(self.record['deck']))
+        round.start()
+        return round
+
+    def get_checkpoint_index(self, action_index: int) -> int:
+        """ Returns the index of the latest checkpoint at or before action_index. """
+        index = action_index - action_index % self.checkpoint_interval
+        while index not in self.checkpoints:
+            index -= self.checkpoint_interval
+        return index
+
+    def seek(self, action_index: int) -> HoldemRound:
+        """ Returns a new round object, in the state right after the first action_index actions were applied. """
+        if not 0 <= action_index <= len(self.actions):
+            raise IndexError(f"action index {action_index} out of range")
+
+        index = self.get_checkpoint_index(action_index)
+        round = copy.deepcopy(self.checkpoints[index])
+        while index < action_index:
+            apply_action(round, self.actions[index])
+            index += 1
+            if index % self.checkpoint_interval == 0 and index not in self.checkpoints:
+                self.checkpoints[index] = copy.deepcopy(round)
+        return round
+
+    def replay(self) -> HoldemRound:
+        """ Returns the round after all recorded actions. """
+        return self.seek(len(self.actions))
+
+def validate_hand_record(record: dict) -> None:
+    """ Replays a hand record, raises ReplayError if an action is rejected or final chips don't match. """
+    round = HoldemRoundReplayer(record, checkpoint_interval=len(record['actions']) + 1).replay()
+    if 'final_chips' in record:
+        final_chips = {int(sit): chips for sit, chips in record['final_chips'].items()}
+        if final_chips != {p.sit: p.chips for p in round.players}:
+            raise ReplayError("final chips don't match the replay")
+
+def validate_history_file(path: str) -> dict:
+    """ Validates every hand in a history file (one json hand record per line).
+
+    Returns {'path': str, 'hands': int, 'errors': [(line_number, message), ...]}
+    """
+    result = {'path': path, 'hands': 0, 'errors': []}
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            result['hands'] += 1
+            try:
+                validate_hand_record(json.loads(line))
+            except Exception as e:
+                result['errors'].append((line_number, f'{type(e).__name__}: {e}'))
+    return result
+
+def validate_history_files(paths: list[str], max_workers: int = None) -> list[dict]:
+    """ Validates history files in parallel, one file per worker process at a time. """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(validate_history_file, paths))
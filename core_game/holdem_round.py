@@ -4,33 +4,63 @@ from time import sleep
 import itertools
 from enum import Enum
 from dataclasses import dataclass, field
+from typing import NamedTuple
 import random
 
 if __name__ == '__main__':
-    from deuces import deuces as hand_ranker
+    import hand_evaluator
 else:
-    from .deuces import deuces as hand_ranker
+    from . import hand_evaluator
     
 class CardDeck(list):
+    __slots__ = ()
     suites = ['h','d','c','s']
     ranks = ['2','3','4','5','6','7','8','9','T','J','Q','K','A']
-    def __init__(self):
-        super().__init__(p[0]+p[1] for p in itertools.product(self.ranks,self.suites))
+    full_deck = tuple(p[0]+p[1] for p in itertools.product(ranks,suites))
+    def __init__(self, cards: list[str] = None):
+        """ Creates a shuffled deck, or a deck in the given order if cards is passed (used for replays). """
+        if cards is not None:
+            super().__init__(cards)
+            return
+        super().__init__(self.full_deck)
         self.shuffle()
     
     def shuffle(self):
         random.shuffle(self)
 
-@dataclass
+    def refill(self):
+        """ Puts all the cards back in the deck and shuffles it. """
+        self[:] = self.full_deck
+        self.shuffle()
+
+class Bet(NamedTuple):
+    sit: int
+    bet_type: str
+    call_amount: int
+    raise_amount: int
+
+class LogEntry(NamedTuple):
+    sit: int
+    action: str
+    call_amount: int
+    raise_amount: int
+    stage: str
+
+@dataclass(slots=True)
 class HoldemRoundPlayer:
-    """ Represents a player for a single round (or hand) of a Texas Hold'em game """
+    """ Represents a player for a single round (or hand) of a Texas Hold'em game.
+    Not validated on creation, validate_player() should be called on untrusted input.
+    """
     sit: int
     chips: int
     cards: list = field(default_factory=list,repr=False)
     folded: bool = field(default=False,repr=False)
 
-    def __post_init__(self):
-        self.validate_player()
+    def reset(self, chips: int):
+        """ Resets the player in place for a new round. """
+        self.chips = chips
+        self.cards = []
+        self.folded = False
 
     def validate_player(self):
         assert(
@@ -46,9 +76,14 @@ class HoldemRoundPlayer:
         assert(self.chips > 0)
 
 class PlayerQueue:
+    __slots__ = ('player_order', 'queue')
     def __init__(self,player_order: list[HoldemRoundPlayer]):
         self.player_order = player_order
         self.queue = player_order.copy()
+
+    def reset(self, player_order: list[HoldemRoundPlayer]):
+        self.player_order = player_order
+        self.queue[:] = player_order
     
     def get(self):
         return self.queue.pop(0)
@@ -72,10 +107,12 @@ class PlayerQueue:
             if not p.folded:
                 self.put(p)
 
-@dataclass
+@dataclass(slots=True)
 class HoldemRoundConfig:
     small_blind: int
     ante: int
+    rake_rate: float = 0.0 # share of the pots taken as rake, if the round reached the flop
+    rake_cap: int = 0 # maximal rake of a round, 0 for no cap
 
 class HoldemRoundStage(Enum):
     NOT_STARTED = 'not started'
@@ -87,7 +124,7 @@ class HoldemRoundStage(Enum):
     NO_SHOWDOWN = 'no showdown'
     ENDED = 'ended'
 
-@dataclass
+@dataclass(slots=True)
 class HoldemRound:
     """Main class that represents the state of a Holdem round (or hand)."""
     config: HoldemRoundConfig
@@ -95,8 +132,8 @@ class HoldemRound:
     first_to_move: HoldemRoundPlayer
     
     stage: HoldemRoundStage = HoldemRoundStage.NOT_STARTED
-    log: list = field(default_factory=list) 
-    bets: dict = field(default_factory=lambda: { # each bet is represented as (sit, bet_type, call_amount, raise_amount)
+    log: list[LogEntry] = field(default_factory=list) 
+    bets: dict = field(default_factory=lambda: { # each bet is represented as Bet(sit, bet_type, call_amount, raise_amount)
         HoldemRoundStage.PREFLOP.value:[],
         HoldemRoundStage.FLOP.value:[],
         HoldemRoundStage.TURN.value:[],
@@ -108,13 +145,39 @@ class HoldemRound:
     pots: dict = field(default_factory=dict)
     move_queue: PlayerQueue = field(init=False, repr=False)
     to_move: HoldemRoundPlayer = field(init=False)
-    deck: CardDeck = field(init=False, repr=False)
+    deck: CardDeck = field(default=None, repr=False) # pass a preset deck to replay a recorded hand
+    deck_order: list[str] = field(default_factory=list, repr=False) # order of the deck before dealing
+    starting_chips: dict[int:int] = field(default_factory=dict, repr=False) # of the form {sit: chips}
+    rake: int = field(default=0, repr=False) # rake taken from the pots
+    awards: dict[int:int] = field(default_factory=dict, repr=False) # of the form {sit: chips won from the pots}
 
     def __post_init__(self):
         self.players = sorted(self.players,key=lambda p:p.sit)
-        move_order = self.players[self.players.index(self.first_to_move):] +  self.players[:self.players.index(self.first_to_move)]
-        self.move_queue = PlayerQueue(move_order)
+        self.move_queue = PlayerQueue(self.get_move_order())
+        self.to_move = None
+
+    def get_move_order(self) -> list[HoldemRoundPlayer]:
+        return self.players[self.players.index(self.first_to_move):] +  self.players[:self.players.index(self.first_to_move)]
+
+    def reset(self, players: list[HoldemRoundPlayer], first_to_move: HoldemRoundPlayer):
+        """ Resets the round in place for a new hand, reusing its containers and deck. """
+        self.players = sorted(players,key=lambda p:p.sit)
+        self.first_to_move = first_to_move
+        self.stage = HoldemRoundStage.NOT_STARTED
+        self.log.clear()
+        for bets in self.bets.values():
+            bets.clear()
+        self.winners.clear()
+        self.community_cards.clear()
+        self.pots.clear()
+        self.move_queue.reset(self.get_move_order())
         self.to_move = None
+        if self.deck is not None:
+            self.deck.refill()
+        self.deck_order = []
+        self.starting_chips = {}
+        self.rake = 0
+        self.awards.clear()
     
     def get_player_by_sit(self, sit: int) -> HoldemRoundPlayer:
         for p in self.players:
@@ -191,21 +254,27 @@ class HoldemRound:
     def get_largest_raise_in_stage(self, stage: HoldemRoundStage):
         return max([0] +[bet[3] for bet in self.bets[stage]])
     
-    def is_betting_open(self):
+    def is_betting_open(self, player: HoldemRoundPlayer = None) -> bool:
+        """ Returns whether player may raise in the current stage.
+        Betting is open for a player that did not act in the stage yet, or if a full raise was made since
+        it last acted. A raise smaller than the largest raise before it (an all in) doesn't reopen betting.
+        """
         raised_amount = 0
         betting_open = True
-        for bet in self.bets[self.stage.value]:
-            if bet[0] == 'raise':
-                if bet[3] >= raised_amount:
-                    raised_amount = bet[3]
+        for event in self.log:
+            if event.stage != self.stage.value:
+                continue
+            if player != None and event.sit == player.sit and event.action not in ('sb', 'bb'):
+                betting_open = False
+            if event.action in ('raise', 'sb', 'bb') and event.raise_amount >= raised_amount:
+                raised_amount = event.raise_amount
+                if player == None or event.sit != player.sit:
                     betting_open = True
-                else:
-                    betting_open = False
         return betting_open
 
     def get_max_raise_amount(self, player: HoldemRoundPlayer) -> int:
         """ Returns the maximal amount a player can raise. Returns 0 if betting is closed."""
-        if not self.is_betting_open():
+        if not self.is_betting_open(player):
             return 0
         
         return player.chips - self.get_call_amount(player)
@@ -220,23 +289,15 @@ class HoldemRound:
     
     @staticmethod
     def join_pots(pots: dict) -> dict:
-        
-        if len(pots) == 1:
-            return pots
-        
+        """ Joins consecutive pots that have the same players, into the pot of the higher bet rank. """
         new_pots = {}
-        bet_ranks = list(reversed(sorted(pots.keys())))
-        bet_rank = bet_ranks[0]
-        for br in bet_ranks[1:]:
-            print(br)
-            if len([p.sit for p in pots[br]['players']]) == len([p.sit for p in pots[bet_rank]['players']]):
-                print(10)
-                new_bet_rank = br + bet_rank
-                new_pot = pots[br]['pot'] + pots[bet_rank]['pot']
-                new_pots[new_bet_rank] = {'pot': new_pot, 'players':pots[br]['players']}
-                bet_rank = new_bet_rank
-            else:
-                bet_rank = br
+        previous = None
+        for bet_rank in sorted(pots):
+            pot = pots[bet_rank]
+            if previous != None and [p.sit for p in new_pots[previous]['players']] == [p.sit for p in pot['players']]:
+                pot = {'pot': new_pots.pop(previous)['pot'] + pot['pot'], 'players': pot['players']}
+            new_pots[bet_rank] = pot
+            previous = bet_rank
         return new_pots
 
     def make_pots(self):
@@ -245,31 +306,30 @@ class HoldemRound:
 
         self.pots = {
             bet_rank: {
-                'pot': (bet_rank(n) - bet_rank(n-1)) * num_of_players_in_bet_rank
-                'players':[player1, player2, ...]
-
+                'pot': sum of the bets of all players between the previous bet rank and bet_rank
+                'players':[player1, player2, ...] # players that did not fold and bet at least bet_rank
             }
             
         }
 
-        Thus one player can win several pots of different "bet_ranks".
-        
+        The bet ranks are the total bets of the players that did not fold, so one player can win several
+        pots of different "bet_ranks". Bets of folded players above the highest bet rank go to the highest pot.
         """
-        ordered_total_bets = sorted([(p, self.get_player_total_bet(p)) for p in self.players], key=lambda x:x[1])
+        total_bets = [(p, self.get_player_total_bet(p)) for p in self.players]
+        bet_ranks = sorted(set(bet for p, bet in total_bets if not p.folded and bet > 0))
+        if not bet_ranks:
+            bet_ranks = [0]
         pots = dict()
-        bet_rank = 0
-        for count,(player,bet) in enumerate(ordered_total_bets):
-            if bet > bet_rank:
-                pots[bet] = {'pot':(bet-bet_rank) * (len(ordered_total_bets) - count),'players':[]}
-                bet_rank = bet
-            for bet_rank in pots:
-                if not player.folded:
-                    pots[bet_rank]['players'].append(player)
-
-        new_pots = self.join_pots(pots)
+        previous_bet_rank = 0
+        for bet_rank in bet_ranks:
+            pots[bet_rank] = {
+                'pot': sum(min(bet, bet_rank) - min(bet, previous_bet_rank) for p, bet in total_bets),
+                'players': [p for p, bet in total_bets if not p.folded and bet >= bet_rank],
+            }
+            previous_bet_rank = bet_rank
+        pots[previous_bet_rank]['pot'] += sum(max(0, bet - previous_bet_rank) for p, bet in total_bets)
 
-        self.pots = new_pots
-        print(new_pots)
+        self.pots = self.join_pots(pots)
     
     def determine_pots_winners(self) -> None:
         assert self.stage in (HoldemRoundStage.NO_SHOWDOWN,HoldemRoundStage.SHOWDOWN)
@@ -280,7 +340,6 @@ class HoldemRound:
             for bet_rank in self.pots:
                 self.winners[bet_rank] = [not_folded_players[0].sit]
             return
-        evaluator = hand_ranker.Evaluator()
         for bet_rank in self.pots:
             hand_ranks = dict()
             
@@ -288,10 +347,7 @@ class HoldemRound:
                 if p.folded:
                     continue
 
-                player_cards = [hand_ranker.Card.new(c) for c in p.cards]
-                community_cards = [hand_ranker.Card.new(c) for c in self.community_cards]
-                
-                hand_ranks[p.sit] = evaluator.evaluate(player_cards, community_cards)
+                hand_ranks[p.sit] = hand_evaluator.evaluate(p.cards, self.community_cards)
 
             self.winners[bet_rank] = [sit for sit in  hand_ranks if sit == min(hand_ranks, key=hand_ranks.get)] # todo: use filter instead
             print(self.winners)
@@ -299,49 +355,60 @@ class HoldemRound:
     def distribute_pot_of_rank(self,rank: int):
         pass
 
+    def take_rake(self):
+        """ Takes the rake (no flop, no rake) from the pots, main pot first.
+        The uncalled part of the largest bet is returned to its player, so it is not raked.
+        """
+        if self.config.rake_rate <= 0 or len(self.community_cards) < 3:
+            return
+        total_bets = sorted(self.get_player_total_bet(p) for p in self.players)
+        uncalled = total_bets[-1] - total_bets[-2]
+        rake = int((sum(pot['pot'] for pot in self.pots.values()) - uncalled) * self.config.rake_rate)
+        if self.config.rake_cap > 0:
+            rake = min(rake, self.config.rake_cap)
+        self.rake = rake
+        for bet_rank in sorted(self.pots):
+            taken = min(rake, self.pots[bet_rank]['pot'])
+            self.pots[bet_rank]['pot'] -= taken
+            rake -= taken
+
     def distribute_pots(self):
         assert self.stage in (HoldemRoundStage.NO_SHOWDOWN, HoldemRoundStage.SHOWDOWN)
         assert len(self.winners) > 0
         
-        for player in self.players:
-            for bet_rank in self.winners:
-                if player.sit in self.winners[bet_rank]:
-                    player.chips += self.pots[bet_rank]['pot']//len(self.winners[bet_rank])
+        self.take_rake()
+        for bet_rank in self.winners:
+            winners = sorted(self.winners[bet_rank])
+            share, odd_chips = divmod(self.pots[bet_rank]['pot'], len(winners))
+            for count, sit in enumerate(winners):
+                # the odd chips of a split pot go to the lowest sits.
+                award = share + (count < odd_chips)
+                self.get_player_by_sit(sit).chips += award
+                self.awards[sit] = self.awards.get(sit, 0) + award
 
         self.pots = dict()
 
 
     def deal_cards(self):
-        self.deck = CardDeck()
+        if self.deck is None:
+            self.deck = CardDeck()
+        self.deck_order = list(self.deck)
         for player in self.players:
             player.cards = [self.deck.pop(),self.deck.pop()]
     
     def post_blinds(self):
+        """ Posts the blinds, a player short of chips posts all of them. """
         sb_player = self.move_queue.player_order[-2]
         bb_player = self.move_queue.player_order[-1]
-        #print(sb_player.sit, bb_player.sit)
-        sb_player.chips -= min(sb_player.chips, self.config.small_blind)
-        bb_player.chips -= min(bb_player.chips, 2*self.config.small_blind)
-        self.bets['preflop'].append((sb_player.sit, 'raise', 0, self.config.small_blind))
-        self.bets['preflop'].append((bb_player.sit, 'raise', self.config.small_blind, self.config.small_blind))
-        self.log.append(
-            {
-                'action': 'sb',
-                'call_amount': 0,
-                'raise_amount': self.config.small_blind, 
-                'sit': sb_player.sit, 
-                'stage': 'preflop'
-                }
-        )
-        self.log.append(
-            {
-                'action': 'bb',
-                'call_amount': self.config.small_blind,
-                'raise_amount': self.config.small_blind, 
-                'sit': bb_player.sit, 
-                'stage': 'preflop'
-                }
-        )
+        sb_amount = min(sb_player.chips, self.config.small_blind)
+        bb_amount = min(bb_player.chips, 2*self.config.small_blind)
+        bb_call_amount = min(bb_amount, sb_amount)
+        sb_player.chips -= sb_amount
+        bb_player.chips -= bb_amount
+        self.bets['preflop'].append(Bet(sb_player.sit, 'raise', 0, sb_amount))
+        self.bets['preflop'].append(Bet(bb_player.sit, 'raise', bb_call_amount, bb_amount - bb_call_amount))
+        self.log.append(LogEntry(sb_player.sit, 'sb', 0, sb_amount, 'preflop'))
+        self.log.append(LogEntry(bb_player.sit, 'bb', bb_call_amount, bb_amount - bb_call_amount, 'preflop'))
 
     def validate_game_setup(self):
         if self.stage is not HoldemRoundStage.NOT_STARTED:
@@ -351,6 +418,7 @@ class HoldemRound:
     
     def start(self):
         self.validate_game_setup()
+        self.starting_chips = {p.sit: p.chips for p in self.players}
         self.deal_cards()
         self.post_blinds()
         self.stage = HoldemRoundStage.PREFLOP
@@ -392,8 +460,16 @@ class HoldemRound:
             self.stage = HoldemRoundStage.ENDED
         return
     
+    def finish(self):
+        """ Settles the pots of a round that reached showdown (or no showdown) and ends it. """
+        assert self.stage in (HoldemRoundStage.NO_SHOWDOWN, HoldemRoundStage.SHOWDOWN)
+        self.make_pots()
+        self.determine_pots_winners()
+        self.distribute_pots()
+        self.start_next_stage()
+
     def start_next_move(self):
-        if len(self.move_queue) == 0:
+        if len(self.move_queue) == 0 or len([p for p in self.players if not p.folded]) == 1:
             self.start_next_stage()
         else:
             self.to_move = self.move_queue.get()
@@ -401,8 +477,8 @@ class HoldemRound:
     def get_last_move(self, player: HoldemRoundPlayer):
         last_move = {}
         for event in self.log:
-            if event['sit'] == player.sit and event['stage'] == self.stage.value:
-                last_move = event.copy()
+            if event.sit == player.sit and event.stage == self.stage.value:
+                last_move = event._asdict()
                 
         return last_move
 
@@ -423,15 +499,8 @@ class HoldemRound:
         return view
     
     def get_hand_rank_name(self, player: HoldemRoundPlayer):
-        evaluator = hand_ranker.Evaluator()
-
-        player_cards = [hand_ranker.Card.new(c) for c in player.cards]
-        community_cards = [hand_ranker.Card.new(c) for c in self.community_cards]
-        
-        rank = evaluator.evaluate(player_cards, community_cards)
-        print(evaluator.table)
-        hand_name = evaluator.class_to_string(evaluator.get_rank_class(rank))
-        return hand_name
+        rank = hand_evaluator.evaluate(player.cards, self.community_cards)
+        return hand_evaluator.get_hand_rank_name(rank)
     
     """ Game Requests Handlers """
 
@@ -470,8 +539,9 @@ class HoldemRound:
         'fold':is_valid_fold,
     }
     
-    def validate_game_request(self, player: HoldemRoundPlayer, request: dict):
-        allowed_moves = self.get_allowed_moves(player)
+    def validate_game_request(self, player: HoldemRoundPlayer, request: dict, allowed_moves: dict = None):
+        if allowed_moves == None:
+            allowed_moves = self.get_allowed_moves(player)
         
         if not request['action'] in allowed_moves['moves']:
             return False
@@ -487,11 +557,11 @@ class HoldemRound:
         return
     
     def apply_call(self, player: HoldemRoundPlayer, request: dict):
-        self.bets[self.stage.value].append((player.sit, request['action'], request['call_amount'], request['raise_amount']))
+        self.bets[self.stage.value].append(Bet(player.sit, request['action'], request['call_amount'], request['raise_amount']))
         player.chips -= (request['call_amount']+request['raise_amount'])
 
     def apply_raise(self, player: HoldemRoundPlayer, request: dict):
-        self.bets[self.stage.value].append((player.sit, request['action'], request['call_amount'], request['raise_amount']))
+        self.bets[self.stage.value].append(Bet(player.sit, request['action'], request['call_amount'], request['raise_amount']))
         player.chips -= (request['call_amount']+request['raise_amount'])
 
     def apply_fold(self, player: HoldemRoundPlayer, request: dict):
@@ -507,9 +577,9 @@ class HoldemRound:
     # TODO: should probably be in abstract class
 
     def apply_game_request(self, player: HoldemRoundPlayer , request: dict):
-        log_record = request.copy()
-        log_record.update({'stage': self.stage.value})
-        self.log.append(log_record)
+        self.log.append(LogEntry(
+            player.sit, request['action'], request.get('call_amount', 0), request.get('raise_amount', 0), self.stage.value
+        ))
         self.APPLY[request['action']](self, player, request)
 
         if request['action'] == 'raise':
@@ -517,22 +587,25 @@ class HoldemRound:
 
     # TODO: should probably be in abstract class
 
-    def process_game_request(self, request: dict) -> None:
+    def process_game_request(self, request: dict, player: HoldemRoundPlayer = None, allowed_moves: dict = None) -> None:
         """
         Main function interface for game requests.
 
         Requests should be of the form:
         {
             'sit': int, # sit of player
-            'type': str, # one of 'fold','raise','check','call'
+            'action': str, # one of 'fold','raise','check','call'
             'call_amount': int, # present if call or raise
             'raise_amount': int, # presest if call or raise
         }
 
+        player can be passed if it was already looked up by request['sit'], and allowed_moves if
+        get_allowed_moves(player) was already computed in the current state.
         """
 
-        player = self.get_player_by_sit(request['sit'])
-        if not self.validate_game_request(player, request):
+        if player == None:
+            player = self.get_player_by_sit(request['sit'])
+        if not self.validate_game_request(player, request, allowed_moves):
             print(request['action'] + ' not allowed.')
             return {'type':'move_response', 'success':False}
         
@@ -566,7 +639,7 @@ def main():
     print(game.get_allowed_moves(player1))
     res = game.process_game_request({
         'sit':1,
-        'move':'raise',
+        'action':'raise',
         'call_amount':0,
         'raise_amount':100,
         }
@@ -7,6 +7,7 @@ if __name__ == '__main__':
         HoldemRoundPlayer,
         HoldemRoundStage,
     )
+    from chip_ledger import ReconciliationError
     
 else:
     from .holdem_round import (
@@ -15,8 +16,9 @@ else:
         HoldemRoundPlayer,
         HoldemRoundStage,
     )
+    from .chip_ledger import ReconciliationError
 
-@dataclass
+@dataclass(slots=True)
 class HoldemTablePlayer:
     id: str
     table_id: str
@@ -27,9 +29,13 @@ class HoldemTablePlayer:
     def __post_init__(self):
         self.round_player = self.make_round_player()
 
-    def make_round_player(self):
+    def make_round_player(self, reuse: bool = False):
+        """ Makes the player's HoldemRoundPlayer for a new round, if reuse the previous one is reset in place. """
         if self.round_player != None:
             self.sync_chips()
+            if reuse:
+                self.round_player.reset(self.chips)
+                return
         self.round_player = HoldemRoundPlayer(self.sit,self.chips)
 
     def sync_chips(self):
@@ -37,13 +43,16 @@ class HoldemTablePlayer:
             return
         self.chips = self.round_player.chips
     
-@dataclass
+@dataclass(slots=True)
 class HoldemTableConfig:
     small_blind: int
     ante: int
     min_buyin: int
     max_buyin: int
     num_of_sits: int
+    reuse_round: bool = False # reset the round and round players in place for a new round, instead of making new ones
+    rake_rate: float = 0.0 # see HoldemRoundConfig
+    rake_cap: int = 0
 
 class HoldemTable:
     """ Represents a poker table.
@@ -52,12 +61,18 @@ class HoldemTable:
     """
 
     # TODO: "players" Should probably be a dict {'sit':player}...
-    def __init__(self, table_id: str, config: HoldemTableConfig):
+    def __init__(self, table_id: str, config: HoldemTableConfig, retention: 'HandRetention' = None, ledger: 'ChipLedger' = None):
         self.table_id: str = table_id
         self.config: HoldemTableConfig = config
         self.players: list[HoldemTablePlayer] = []
         self.first_to_move: HoldemTablePlayer = None
         self.round: HoldemRound = None
+        self.retention = retention # a hand_retention.HandRetention, ended rounds are archived to it
+        self.round_archived: bool = False
+        self.round_player_ids: dict[int:str] = {} # of the form {sit: player id}, the players of self.round when it started
+        self.ledger = ledger # a chip_ledger.ChipLedger, buy ins, ended rounds and cash outs are recorded in it
+        self.round_settled: bool = False
+        self.rounds_started: int = 0 # counts start_new_round, tells apart the hands of a reused round
     
     def add_player(self, player_id: str, sit: int, chips: int):
         """ Creates a new HoldemTablePlayer object and adds it to self.players """
@@ -72,7 +87,11 @@ class HoldemTable:
         self.players.append(player)
     
     def remove_player(self, player: HoldemTablePlayer):
+        if player is self.first_to_move:
+            self.rotate_first_to_move()
         self.players.remove(player)
+        if len(self.players) == 0:
+            self.first_to_move = None
         del player
 
     async def _validate_start_new_round(self):
@@ -88,16 +107,64 @@ class HoldemTable:
                 print("HoldemTable.start_new_round: can't start, round is ongoing")
                 return
         
-        config = HoldemRoundConfig(self.config.small_blind, self.config.ante)
+        self.close_round()
+        reuse = self.config.reuse_round and self.round != None
         for player in self.players:
-            player.make_round_player()
+            player.make_round_player(reuse)
         
         # TODO: change first_to_move to dealer.
-        round = HoldemRound(config,[player.round_player for player in self.players], first_to_move=self.first_to_move.round_player)
-        self.round = round
+        if reuse:
+            self.round.config.small_blind = self.config.small_blind
+            self.round.config.ante = self.config.ante
+            self.round.config.rake_rate = self.config.rake_rate
+            self.round.config.rake_cap = self.config.rake_cap
+            self.round.reset([player.round_player for player in self.players], self.first_to_move.round_player)
+        else:
+            config = HoldemRoundConfig(self.config.small_blind, self.config.ante, self.config.rake_rate, self.config.rake_cap)
+            self.round = HoldemRound(config,[player.round_player for player in self.players], first_to_move=self.first_to_move.round_player)
+        self.round_player_ids = {player.sit: player.id for player in self.players}
+        self.round_archived = False
+        self.round_settled = False
+        self.rounds_started += 1
 
         self.rotate_first_to_move()
 
+    def settle_round(self):
+        """ Records the chip movements of the ended round in self.ledger (once). See close_round. """
+        if self.ledger == None or self.round == None or self.round_settled:
+            return
+        if self.round.stage != HoldemRoundStage.ENDED:
+            return
+
+        round_players = {id(p) for p in self.round.players}
+        try:
+            self.ledger.record_round(self.table_id, self.round, {p.sit: p.id for p in self.players if id(p.round_player) in round_players})
+        except ReconciliationError:
+            # the round's transfers are posted, only the check after them failed, so they are not posted again.
+            self.round_settled = True
+            raise
+        self.round_settled = True
+
+    def close_round(self):
+        """ Settles and archives the round if it ended. Called when a round is finished through process_requests,
+        before sit requests and by start_new_round. Callers that finish self.round directly should call it right after.
+        """
+        self.settle_round()
+        self.archive_round()
+
+    def archive_round(self):
+        """ Passes the ended round to self.retention (once), and releases its deck. See close_round. """
+        if self.retention == None or self.round == None or self.round_archived:
+            return
+        if self.round.stage != HoldemRoundStage.ENDED:
+            return
+
+        self.retention.archive(self.table_id, self.round, self.round_player_ids)
+        self.round_archived = True
+        self.round.deck_order = []
+        if not self.config.reuse_round:
+            self.round.deck = None
+
     
     def rotate_first_to_move(self):
         sits = list(reversed(sorted([p.sit for p in self.players])))
@@ -115,8 +182,24 @@ class HoldemTable:
                 return player
                 
     
+    def validate_join_request(self, join_request) -> bool:
+        """ Checks the types and ranges of an (untrusted) join request. Players are not validated after this. """
+        sit = join_request.get('sit')
+        chips = join_request.get('chips')
+        if not isinstance(join_request.get('user_id'), str):
+            return False
+        if type(sit) != int or not 0 < sit <= min(self.config.num_of_sits, 9):
+            return False
+        if type(chips) != int or chips <= 0:
+            return False
+        return True
+
     def _process_join_request(self, join_request):
         response = {'type':'sit_response', 'success':True}
+        if not self.validate_join_request(join_request):
+            response['success'] = False
+            return response
+
         if self.get_player_by_sit(join_request['sit']) != None:
             response['success'] = False
             return response
@@ -124,8 +207,14 @@ class HoldemTable:
         if self.get_player_by_id(join_request['user_id']) != None:
             response['success'] = False
             return response
+
+        if self.ledger != None and not self.ledger.can_buy_in(join_request['user_id'], join_request['chips']):
+            response['success'] = False
+            return response
         
         self.add_player(join_request['user_id'], join_request['sit'], join_request['chips'])
+        if self.ledger != None:
+            self.ledger.record_buy_in(self.table_id, join_request['user_id'], join_request['chips'])
         response['data'] = {'amount': join_request['chips']}
 
         return response
@@ -139,18 +228,21 @@ class HoldemTable:
             return response
         
         player = self.get_player_by_id(leave_request['user_id'])
-        if player == None:
+        if player == None or player.sit != leave_request['sit']:
             return response
 
         if self.round != None:
-            if player.round_player in self.round.players:
+            if any(player.round_player is p for p in self.round.players):
                 if self.round.stage != HoldemRoundStage.ENDED:
                     return response
         
+        self.settle_round()
         player.sync_chips()
         response['data'] = {'amount': player.chips}
         response['success'] = True
         self.remove_player(player)
+        if self.ledger != None:
+            self.ledger.record_cash_out(self.table_id, player.id, player.chips)
         
         # print(response)
         return response
@@ -167,6 +259,9 @@ class HoldemTable:
         }
         """
         
+        # the ended round is archived with the players it was played by.
+        self.close_round()
+
         if sit_request['type'] == 'join':
             return self._process_join_request(sit_request)
         
@@ -207,8 +302,96 @@ class HoldemTable:
 
         return response
     
+    def process_requests(self, requests: list[dict], stop_on_rejection: bool = False, advance_round: bool = False) -> list[dict]:
+        """ Handles a batch of requests in order, like request_handler, and returns their responses.
+
+        Player lookups are shared by the whole batch. The shared view data and the allowed moves of players are
+        computed once per table state, and reused by the moves and table views of the batch until a request changes it.
+        If stop_on_rejection, processing stops after the first rejected request (its response is the last one returned).
+        If advance_round, the round's next move is started after every accepted move, and a round that reaches
+        showdown is finished (as in holdem_replay.apply_action), so a batch can hold consecutive moves.
+        """
+        responses = []
+        players_by_id = None
+        round = self.round
+        round_players = {p.sit: p for p in round.players} if round != None else {}
+        # of the current state, reset by every accepted request.
+        shared_data = None
+        allowed_moves = {} # of the form {sit: allowed moves}
+        for request in requests:
+            request_type = request['type']
+            if request_type == 'move_request':
+                if round == None:
+                    response = {'type': 'move_response','success': False}
+                else:
+                    data = request['data']
+                    player = round_players.get(data['sit'])
+                    if player != None and data['sit'] not in allowed_moves:
+                        allowed_moves[data['sit']] = round.get_allowed_moves(player)
+                    response = round.process_game_request(data, player, allowed_moves.get(data['sit']))
+                    if response['success']:
+                        shared_data = None
+                        allowed_moves = {}
+                        if advance_round:
+                            round.start_next_move()
+                            if round.stage in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+                                round.finish()
+                                self.close_round()
+
+            elif request_type == 'sit_request':
+                response = self.process_sit_request(request['data'])
+                if response['success']:
+                    players_by_id = None
+                    shared_data = None
+                    allowed_moves = {}
+
+            elif request_type == 'table_view_request':
+                if players_by_id == None:
+                    players_by_id = {p.id: p for p in self.players}
+                if shared_data == None:
+                    shared_data = self.get_shared_view_data()
+                player = players_by_id.get(request['data']['user_id'])
+                player_allowed_moves = None
+                if player != None and player.round_player != None and round_players.get(player.sit) is player.round_player:
+                    if player.sit not in allowed_moves:
+                        allowed_moves[player.sit] = round.get_allowed_moves(player.round_player)
+                    player_allowed_moves = allowed_moves[player.sit]
+                response = self.make_table_view(shared_data, player, player_allowed_moves)
+
+            else:
+                raise AssertionError(f'unknown request type {request_type}')
+
+            responses.append(response)
+            if stop_on_rejection and response.get('success') == False:
+                break
+        return responses
+
     def get_table_view(self, player: HoldemTablePlayer = None) -> dict:
+        return self.make_table_view(self.get_shared_view_data(), player)
+
+    def make_table_view(self, shared_data: dict, player: HoldemTablePlayer = None, allowed_moves: dict = None) -> dict:
+        """ Makes a table view from shared data computed once (see get_shared_view_data), e.g. for a broadcast to many players.
+        allowed_moves can be passed if the player's allowed moves were already computed in the current state.
+        """
+        personal_data = {}
+        if player != None:
+            if player.round_player != None:
+                if allowed_moves == None:
+                    allowed_moves = self.round.get_allowed_moves(player.round_player)
+                personal_data = {'id': player.id, 'sit': player.sit, 'cards': player.round_player.cards, 'allowed_moves': allowed_moves}
         
+
+        view = {
+            'type': 'table_view_update',
+            'data': {
+                'personal_data': personal_data,
+                'shared_data': shared_data,
+            }
+        }
+        return view
+
+    def get_shared_view_data(self) -> dict:
+        """ The part of the table view that is the same for all players and spectators. """
         shared_data = {
                 'players': [
                     {'user_id': p.id, 'sit': p.sit, 'chips': p.chips, 'active': p.active}
@@ -234,7 +417,7 @@ class HoldemTable:
                 'bets': self.round.bets,
                 'stage': self.round.stage.value,
                 'last_moves': last_moves,
-                'to_move': self.round.to_move.sit,
+                'to_move': self.round.to_move.sit if self.round.to_move != None else None,
                 'show_cards': {},
             }
 
@@ -243,20 +426,16 @@ class HoldemTable:
                     if not p.folded:
                         shared_data['show_cards'][p.sit] = p.cards
 
-        personal_data = {}
-        if player != None:
-            if player.round_player != None:
-                personal_data = {'id': player.id, 'sit': player.sit, 'cards': player.round_player.cards, 'allowed_moves': self.round.get_allowed_moves(player.round_player)}
-        
+        return shared_data
 
-        view = {
-            'type': 'table_view_update',
-            'data': {
-                'personal_data': personal_data,
-                'shared_data': shared_data,
-            }
-        }
-        return view
+def process_table_requests(tables: dict[str:HoldemTable], requests: dict[str:list[dict]], stop_on_rejection: bool = False, advance_round: bool = False) -> dict[str:list[dict]]:
+    """ Handles batches of requests for many tables, of the form {table_id: [request, ...]}.
+    Requests of each table are handled in order with HoldemTable.process_requests. Returns {table_id: [response, ...]}.
+    """
+    return {
+        table_id: tables[table_id].process_requests(table_requests, stop_on_rejection, advance_round)
+        for table_id, table_requests in requests.items()
+    }
 
 def main():
     config = HoldemTableConfig(20,0,100,1000,9)
@@ -0,0 +1,207 @@
+""" Latency histograms and counters for the hot paths of HoldemTable and HoldemRound.
+
+Instrumentation is off by default and costs nothing while off: enable() wraps the instrumented methods
+on their classes and disable() puts the original methods back.
+
+Usage:
+    from core_game import instrumentation
+    instrumentation.enable()
+    ...
+    instrumentation.metrics.snapshot()
+    instrumentation.write_prometheus('/var/lib/node_exporter/holdem.prom')
+"""
+
+import functools
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter_ns
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRound, HoldemRoundStage
+    from holdem_table import HoldemTable
+else:
+    from .holdem_round import HoldemRound, HoldemRoundStage
+    from .holdem_table import HoldemTable
+
+# upper bounds of the latency buckets, in nanoseconds: 1us, 2us, 4us, ... ~1s
+BUCKET_BOUNDS_NS = tuple(1000 * 2**i for i in range(21))
+
+BETTING_STAGES = (HoldemRoundStage.PREFLOP, HoldemRoundStage.FLOP, HoldemRoundStage.TURN, HoldemRoundStage.RIVER)
+
+class LatencyHistogram:
+    """ Fixed bucket histogram. The last bucket counts everything above the largest bound. """
+    def __init__(self, bounds_ns: tuple = BUCKET_BOUNDS_NS):
+        self.bounds_ns = bounds_ns
+        self.counts = [0] * (len(bounds_ns) + 1)
+        self.count = 0
+        self.sum_ns = 0
+
+    def record(self, duration_ns: int):
+        self.counts[bisect_left(self.bounds_ns, duration_ns)] += 1
+        self.count += 1
+        self.sum_ns += duration_ns
+
+    def percentile(self, q: float) -> float:
+        """ Returns the upper bound (in seconds) of the bucket holding the q-th quantile, q in [0,1]. """
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds_ns, self.counts):
+            seen += count
+            if seen >= target:
+                return bound / 1e9
+        return float('inf')
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_seconds': self.sum_ns / 1e9,
+            'buckets': {bound / 1e9: count for bound, count in zip(self.bounds_ns, self.counts)} | {float('inf'): self.counts[-1]},
+            'p50_seconds': self.percentile(0.5),
+            'p99_seconds': self.percentile(0.99),
+        }
+
+class Metrics:
+    def __init__(self):
+        self.histograms: dict[str:LatencyHistogram] = {}
+        self.rejected_moves: dict[str:int] = {} # of the form {reason: count}
+
+    def get_histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def count_rejected_move(self, reason: str):
+        self.rejected_moves[reason] = self.rejected_moves.get(reason, 0) + 1
+
+    def reset(self):
+        # histograms are reset in place, since instrumented methods hold references to them.
+        for histogram in self.histograms.values():
+            histogram.__init__(histogram.bounds_ns)
+        self.rejected_moves.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            'latency': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            'rejected_moves': dict(self.rejected_moves),
+        }
+
+    def to_prometheus(self) -> str:
+        """ Returns the metrics in the Prometheus text exposition format. """
+        lines = [
+            '# HELP holdem_call_duration_seconds Latency of instrumented engine functions.',
+            '# TYPE holdem_call_duration_seconds histogram',
+        ]
+        for name, histogram in self.histograms.items():
+            cumulative = 0
+            for bound, count in zip(histogram.bounds_ns, histogram.counts):
+                cumulative += count
+                lines.append(f'holdem_call_duration_seconds_bucket{{function="{name}",le="{bound / 1e9:g}"}} {cumulative}')
+            lines.append(f'holdem_call_duration_seconds_bucket{{function="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'holdem_call_duration_seconds_sum{{function="{name}"}} {histogram.sum_ns / 1e9:.9f}')
+            lines.append(f'holdem_call_duration_seconds_count{{function="{name}"}} {histogram.count}')
+
+        lines += [
+            '# HELP holdem_rejected_moves_total Move requests rejected by the round, by reason.',
+            '# TYPE holdem_rejected_moves_total counter',
+        ]
+        for reason, count in self.rejected_moves.items():
+            lines.append(f'holdem_rejected_moves_total{{reason="{reason}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def get_rejection_reason(round: HoldemRound, request: dict) -> str:
+    """ Returns why round rejected request. Called after the rejection, when the round state is unchanged. """
+    player = round.get_player_by_sit(request.get('sit'))
+    if player is None:
+        return 'unknown_sit'
+    if round.stage not in BETTING_STAGES:
+        return 'round_not_in_betting'
+    if round.to_move is not player:
+        return 'not_to_move'
+    if request.get('action') not in round.get_allowed_moves(player)['moves']:
+        return 'action_not_allowed'
+    return 'invalid_amount'
+
+def timed(name: str, function):
+    histogram = metrics.get_histogram(name)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.record(perf_counter_ns() - start)
+    return wrapper
+
+def timed_process_game_request(function):
+    histogram = metrics.get_histogram('HoldemRound.process_game_request')
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        start = perf_counter_ns()
+        response = function(self, *args, **kwargs)
+        histogram.record(perf_counter_ns() - start)
+        if not response['success']:
+            request = args[0] if args else kwargs['request']
+            metrics.count_rejected_move(get_rejection_reason(self, request))
+        return response
+    return wrapper
+
+# (class, method name, wrapper factory)
+INSTRUMENTED_METHODS = (
+    (HoldemTable, 'request_handler', lambda f: timed('HoldemTable.request_handler', f)),
+    (HoldemTable, 'get_table_view', lambda f: timed('HoldemTable.get_table_view', f)),
+    (HoldemRound, 'process_game_request', timed_process_game_request),
+    (HoldemRound, 'get_allowed_moves', lambda f: timed('HoldemRound.get_allowed_moves', f)),
+    (HoldemRound, 'determine_pots_winners', lambda f: timed('HoldemRound.determine_pots_winners', f)),
+)
+
+_original_methods = {}
+
+def is_enabled() -> bool:
+    return bool(_original_methods)
+
+def enable():
+    if is_enabled():
+        return
+    for cls, name, wrap in INSTRUMENTED_METHODS:
+        original = cls.__dict__[name]
+        _original_methods[(cls, name)] = original
+        setattr(cls, name, wrap(original))
+
+def disable():
+    for (cls, name), original in _original_methods.items():
+        setattr(cls, name, original)
+    _original_methods.clear()
+
+def write_prometheus(path: str):
+    """ Writes the metrics to path atomically, e.g. for a node exporter textfile collector. """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(metrics.to_prometheus())
+    os.replace(tmp_path, path)
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_prometheus(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """ Serves the metrics over http from a background thread. Call .shutdown() on the result to stop. """
+    server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+    threading.Thread(target=server.serve_forever, name='PrometheusServer', daemon=True).start()
+    return server
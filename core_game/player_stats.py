@@ -0,0 +1,156 @@
+""" Incremental player statistics (VPIP, PFR, 3-bet, aggression factor, showdown rates), updated per hand. """
+
+import numpy as np
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRound, HoldemRoundStage
+else:
+    from .holdem_round import HoldemRound, HoldemRoundStage
+
+COUNTERS = (
+    'hands',
+    'vpip', # hands with a voluntary preflop call or raise
+    'pfr', # hands with a preflop raise
+    'three_bet_opportunities', # hands where the player acted preflop facing exactly one raise
+    'three_bets',
+    'postflop_raises',
+    'postflop_calls',
+    'saw_flop',
+    'went_to_showdown',
+    'won_at_showdown',
+    'won',
+)
+COUNTER_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+
+class PlayerStatsAggregator:
+    """ Per player counters, stored as rows of a single int64 array.
+
+    Rounds are added once they ended, in O(number of actions) each.
+    Usage:
+        stats = PlayerStatsAggregator()
+        stats.add_round(round, {sit: player_id, ...})
+        stats.get_stats(player_id)
+    """
+    def __init__(self, capacity: int = 64):
+        self.player_ids: list = []
+        self.rows: dict = {} # of the form {player_id: row}
+        self.counters = np.zeros((capacity, len(COUNTERS)), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def __contains__(self, player_id):
+        return player_id in self.rows
+
+    def get_row(self, player_id) -> int:
+        """ Returns the row of player_id, adding a new row if needed. """
+        row = self.rows.get(player_id)
+        if row is not None:
+            return row
+
+        row = len(self.player_ids)
+        if row == len(self.counters):
+            self.counters = np.concatenate((self.counters, np.zeros_like(self.counters)))
+        self.rows[player_id] = row
+        self.player_ids.append(player_id)
+        return row
+
+    def add_round(self, round: HoldemRound, player_ids: dict = None) -> None:
+        """ Updates the counters with an ended round. player_ids maps sits to player ids, defaults to the sits. """
+        assert round.stage == HoldemRoundStage.ENDED
+        if player_ids is None:
+            player_ids = {p.sit: p.sit for p in round.players}
+        rows = {p.sit: self.get_row(player_ids[p.sit]) for p in round.players}
+        counters = self.counters
+        index = COUNTER_INDEX
+
+        vpip_sits = set()
+        pfr_sits = set()
+        three_bet_opportunity_sits = set()
+        three_bet_sits = set()
+        folded_preflop = set()
+        preflop_raises = 0
+        for event in round.log:
+            sit = event.sit
+            action = event.action
+            if event.stage == 'preflop':
+                if action in ('sb', 'bb'):
+                    continue
+                if preflop_raises == 1:
+                    three_bet_opportunity_sits.add(sit)
+                if action == 'raise':
+                    preflop_raises += 1
+                    vpip_sits.add(sit)
+                    pfr_sits.add(sit)
+                    if preflop_raises == 2:
+                        three_bet_sits.add(sit)
+                elif action == 'call':
+                    vpip_sits.add(sit)
+                elif action == 'fold':
+                    folded_preflop.add(sit)
+            elif action == 'raise':
+                counters[rows[sit], index['postflop_raises']] += 1
+            elif action == 'call':
+                counters[rows[sit], index['postflop_calls']] += 1
+
+        for sits, counter in (
+            (vpip_sits, 'vpip'),
+            (pfr_sits, 'pfr'),
+            (three_bet_opportunity_sits, 'three_bet_opportunities'),
+            (three_bet_sits, 'three_bets'),
+        ):
+            for sit in sits:
+                counters[rows[sit], index[counter]] += 1
+
+        winner_sits = {sit for sits in round.winners.values() for sit in sits}
+        not_folded = [p.sit for p in round.players if not p.folded]
+        showdown = len(not_folded) > 1
+        saw_flop = len(round.community_cards) >= 3
+        for p in round.players:
+            row = rows[p.sit]
+            counters[row, index['hands']] += 1
+            if saw_flop and p.sit not in folded_preflop:
+                counters[row, index['saw_flop']] += 1
+            if showdown and not p.folded:
+                counters[row, index['went_to_showdown']] += 1
+                if p.sit in winner_sits:
+                    counters[row, index['won_at_showdown']] += 1
+            if p.sit in winner_sits:
+                counters[row, index['won']] += 1
+
+    def get_counters(self, player_id) -> dict:
+        if player_id not in self.rows:
+            return {name: 0 for name in COUNTERS}
+        return dict(zip(COUNTERS, self.counters[self.rows[player_id]].tolist()))
+
+    def get_stats(self, player_id) -> dict:
+        """ Returns the player's stats as ratios (None if there is no sample yet). """
+        c = self.get_counters(player_id)
+        ratio = lambda a, b: c[a] / c[b] if c[b] else None
+        return {
+            'hands': c['hands'],
+            'vpip': ratio('vpip', 'hands'),
+            'pfr': ratio('pfr', 'hands'),
+            'three_bet': ratio('three_bets', 'three_bet_opportunities'),
+            'aggression_factor': ratio('postflop_raises', 'postflop_calls'),
+            'wtsd': ratio('went_to_showdown', 'saw_flop'),
+            'wsd': ratio('won_at_showdown', 'went_to_showdown'),
+        }
+
+    def save(self, path: str) -> None:
+        """ Saves a snapshot of all counters to path (.npz). Ids are stored as text (no pickled objects), integer ids (sits) are flagged. """
+        np.savez(
+            path,
+            player_ids=np.array([str(player_id) for player_id in self.player_ids], dtype=str),
+            int_ids=np.array([type(player_id) == int for player_id in self.player_ids], dtype=bool),
+            counters=self.counters[:len(self)],
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'PlayerStatsAggregator':
+        data = np.load(path)
+        aggregator = cls(capacity=max(64, len(data['counters'])))
+        for player_id, int_id in zip(data['player_ids'].tolist(), data['int_ids'].tolist()):
+            aggregator.get_row(int(player_id) if int_id else player_id)
+        aggregator.counters[:len(aggregator)] = data['counters']
+        return aggregator
@@ -0,0 +1,426 @@
+""" Hand ranges and range vs range equity.
+
+A range is parsed from the usual notation, e.g. 'QQ+, AKs, ATo+, 76s-54s, AhKh, KQs:0.5' (':' sets a weight),
+into a HandRange, an array of weights of the 1326 two card combos.
+Equity is computed over all runouts of the board (or a seeded sample of them if there are more than
+`samples`), by evaluating every combo of both ranges at once with numpy, on 7 card tables built from the
+evaluator's lookup tables. Combos that share a card with the board or the runout are masked out with card
+bitmasks, and pairs of combos that share a card are removed from sums of weights by rank, so pairs are never
+compared one by one.
+
+EquityCalculator memoizes results per (range pair, board), and computes batches of queries on a process pool.
+"""
+
+import itertools
+import math
+import re
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+if __name__ == '__main__':
+    import hand_evaluator
+    from holdem_round import CardDeck
+else:
+    from . import hand_evaluator
+    from .holdem_round import CardDeck
+
+RANKS = ''.join(CardDeck.ranks) # '23456789TJQKA'
+SUITS = ''.join(CardDeck.suites)
+CARD_INDEX = {card: i for i, card in enumerate(CardDeck.full_deck)}
+
+COMBOS = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64) # (1326, 2) card indices
+COMBO_INDEX = {(int(a), int(b)): i for i, (a, b) in enumerate(COMBOS)}
+COMBO_MASKS = (np.uint64(1) << COMBOS[:, 0].astype(np.uint64)) | (np.uint64(1) << COMBOS[:, 1].astype(np.uint64))
+
+FIVE_OF_SEVEN = np.array(list(itertools.combinations(range(7), 5)), dtype=np.int64) # (21, 5)
+EVALUATION_BATCH_SIZE = 20_000 # hands evaluated at once, bounds the memory used
+RANK_SPAN = 1 << 13 # above every hand rank, to sort ranks by group
+
+_lookup_arrays = None
+
+def cards_mask(cards) -> np.uint64:
+    mask = np.uint64(0)
+    for card in cards:
+        mask |= np.uint64(1) << np.uint64(CARD_INDEX[card])
+    return mask
+
+class HandRange:
+    """ Weights (0 to 1) of the 1326 two card combos, in COMBOS order. """
+    __slots__ = ('weights',)
+
+    def __init__(self, weights: np.ndarray = None):
+        self.weights = np.zeros(len(COMBOS)) if weights is None else weights
+
+    @classmethod
+    def from_cards(cls, cards: list[str]) -> 'HandRange':
+        """ A range of a single known hand. """
+        hand_range = cls()
+        hand_range.weights[combo_index(*cards)] = 1.0
+        return hand_range
+
+    def __len__(self):
+        """ Number of combos in the range. """
+        return int(np.count_nonzero(self.weights))
+
+    def __eq__(self, other):
+        return isinstance(other, HandRange) and np.array_equal(self.weights, other.weights)
+
+    def key(self) -> bytes:
+        """ Canonical key of the range, equal for ranges with the same weights however they were written. """
+        return self.weights.tobytes()
+
+    def combos(self) -> list[tuple[str, str, float]]:
+        """ Returns [(card, card, weight), ...] of the combos in the range. """
+        full_deck = CardDeck.full_deck
+        return [(full_deck[a], full_deck[b], float(self.weights[i])) for i, (a, b) in enumerate(COMBOS) if self.weights[i] > 0]
+
+def combo_index(card1: str, card2: str) -> int:
+    a, b = sorted((CARD_INDEX[card1], CARD_INDEX[card2]))
+    if a == b:
+        raise ValueError(f'combo of the same card {card1}')
+    return COMBO_INDEX[(a, b)]
+
+def _hand_combos(high: str, low: str, suitedness: str) -> list[int]:
+    """ Combo indices of a hand like ('A', 'K', 's'), suitedness is 's', 'o' or '' for both. """
+    combos = []
+    for s1, s2 in itertools.product(SUITS, SUITS):
+        if high == low and s1 >= s2:
+            continue
+        if suitedness == 's' and s1 != s2 or suitedness == 'o' and s1 == s2:
+            continue
+        combos.append(combo_index(high + s1, low + s2))
+    return combos
+
+HAND_PATTERN = re.compile(r'([2-9TJQKA])([2-9TJQKA])([so]?)$')
+CARDS_PATTERN = re.compile(r'([2-9TJQKA][hdcs])([2-9TJQKA][hdcs])$')
+
+def _parse_hand(text: str) -> tuple[int, int, str]:
+    match = HAND_PATTERN.match(text)
+    if match == None:
+        raise ValueError(f'invalid hand {text!r}')
+    high, low, suitedness = RANKS.index(match[1]), RANKS.index(match[2]), match[3]
+    if high < low:
+        high, low = low, high
+    if high == low and suitedness:
+        raise ValueError(f'a pair can not be suited or offsuit: {text!r}')
+    return high, low, suitedness
+
+def _parse_token(token: str) -> list[int]:
+    """ Combo indices of one comma separated part of a range, without its weight. """
+    match = CARDS_PATTERN.match(token)
+    if match != None:
+        return [combo_index(match[1], match[2])]
+
+    if token.endswith('+'):
+        high, low, suitedness = _parse_hand(token[:-1])
+        if high == low:
+            hands = [(rank, rank) for rank in range(low, len(RANKS))]
+        else:
+            hands = [(high, kicker) for kicker in range(low, high)]
+    elif '-' in token:
+        first, last = (_parse_hand(part) for part in token.split('-'))
+        if first[2] != last[2] or first[0] - first[1] != last[0] - last[1] and first[0] != last[0]:
+            raise ValueError(f'invalid hand interval {token!r}')
+        if first[0] == first[1]:
+            hands = [(rank, rank) for rank in range(min(first[0], last[0]), max(first[0], last[0]) + 1)]
+        elif first[0] == last[0]:
+            hands = [(first[0], kicker) for kicker in range(min(first[1], last[1]), max(first[1], last[1]) + 1)]
+        else:
+            gap = first[0] - first[1]
+            hands = [(low + gap, low) for low in range(min(first[1], last[1]), max(first[1], last[1]) + 1)]
+        suitedness = first[2]
+    else:
+        high, low, suitedness = _parse_hand(token)
+        hands = [(high, low)]
+
+    combos = []
+    for high, low in hands:
+        combos += _hand_combos(RANKS[high], RANKS[low], suitedness)
+    return combos
+
+@lru_cache(maxsize=1024)
+def _parse_range(text: str) -> bytes:
+    weights = np.zeros(len(COMBOS))
+    for token in text.replace(' ', '').split(','):
+        if not token:
+            continue
+        token, _, weight = token.partition(':')
+        weight = float(weight) if weight else 1.0
+        if not 0 <= weight <= 1:
+            raise ValueError(f'weight of {token!r} not between 0 and 1')
+        weights[_parse_token(token)] = weight
+    return weights.tobytes()
+
+def parse_range(text: str) -> HandRange:
+    """ Parses range notation, e.g. 'QQ+, AKs, A2s-A5s, KJo+, 76s-54s, AhKh, T9s:0.5'.
+    A later part of the range overrides the weight of an earlier one.
+    """
+    return HandRange(np.frombuffer(_parse_range(text), dtype=np.float64).copy())
+
+def to_range(hand_range) -> HandRange:
+    """ Accepts a HandRange, range notation, or a list of two cards. """
+    if isinstance(hand_range, HandRange):
+        return hand_range
+    if isinstance(hand_range, str):
+        return parse_range(hand_range)
+    return HandRange.from_cards(list(hand_range))
+
+def _get_lookup_arrays():
+    """ Seven card lookup arrays, built once from the evaluator's five card tables, and the prime,
+    rank bit and suit of every card index.
+    Without a flush, the rank of 7 cards only depends on their ranks: the sorted prime products of every
+    7 card rank multiset are kept with the rank of their best 5. The best flush is looked up by the 13 bit
+    set of the ranks of a suit, as at most one suit can have 5 cards and no better hand is possible then.
+    """
+    global _lookup_arrays
+    if _lookup_arrays is None:
+        table = hand_evaluator.get_evaluator().table
+        flush_keys, flush_ranks, unsuited_keys, unsuited_ranks = (
+            np.array(column, dtype=np.int64) for lookup in (table.flush_lookup, table.unsuited_lookup)
+            for column in zip(*sorted(lookup.items())))
+        card_ints = np.array(hand_evaluator.to_card_ints(CardDeck.full_deck), dtype=np.int64)
+        card_ranks = (card_ints >> 8) & 0xF
+        rank_primes = np.zeros(13, dtype=np.int64)
+        rank_primes[card_ranks] = card_ints & 0xFF
+
+        # every multiset of 7 ranks with at most 4 of each, in order of prime product.
+        multisets = np.array([ranks for ranks in itertools.combinations_with_replacement(range(13), 7)
+                              if all(ranks[i] != ranks[i + 4] for i in range(3))], dtype=np.int64)
+        seven_keys = np.prod(rank_primes[multisets], axis=1)
+        order = np.argsort(seven_keys)
+        fives = np.prod(rank_primes[multisets[order][:, FIVE_OF_SEVEN]], axis=-1) # (n, 21)
+        seven_ranks = unsuited_ranks[np.searchsorted(unsuited_keys, fives)].min(axis=1)
+
+        # the best flush of every set of 5 to 7 ranks, the rest are never a flush.
+        flush_best = np.full(1 << 13, np.iinfo(np.int64).max, dtype=np.int64)
+        for size in (5, 6, 7):
+            suited = np.array(list(itertools.combinations(range(13), size)), dtype=np.int64)
+            five_of_size = np.array(list(itertools.combinations(range(size), 5)), dtype=np.int64)
+            fives = np.prod(rank_primes[suited[:, five_of_size]], axis=-1)
+            flush_best[np.sum(1 << suited, axis=1)] = flush_ranks[np.searchsorted(flush_keys, fives)].min(axis=1)
+
+        suits = np.log2((card_ints >> 12) & 0xF).astype(np.int64)
+        _lookup_arrays = (seven_keys[order], seven_ranks, flush_best, card_ints & 0xFF, 1 << card_ranks, suits)
+    return _lookup_arrays
+
+def _suited_bits(cards: np.ndarray) -> list:
+    """ The rank bits of the cards of each suit, over the last axis of an array of card indices. """
+    rank_bits, suits = _get_lookup_arrays()[4:]
+    return [np.bitwise_or.reduce(np.where(suits[cards] == suit, rank_bits[cards], 0), axis=-1) for suit in range(4)]
+
+def _seven_card_ranks(products: np.ndarray, suited_bits: list) -> np.ndarray:
+    """ The ranks of 7 card hands, from the prime product of their cards and their rank bits of each suit. """
+    seven_keys, seven_ranks, flush_best = _get_lookup_arrays()[:3]
+    # products of impossible hands (a card twice) are clipped, they are only evaluated to be masked out.
+    ranks = seven_ranks[np.searchsorted(seven_keys, products).clip(0, len(seven_keys) - 1)]
+    for bits in suited_bits:
+        np.minimum(ranks, flush_best[bits], out=ranks)
+    return ranks
+
+def evaluate_many(hands: np.ndarray) -> np.ndarray:
+    """ Returns the ranks (lower is better, as hand_evaluator.evaluate) of an array of 7 card indices per hand. """
+    primes = _get_lookup_arrays()[3]
+    hands = np.asarray(hands, dtype=np.int64)
+    shape = hands.shape[:-1]
+    hands = hands.reshape(-1, 7)
+    result = np.empty(len(hands), dtype=np.int64)
+    for start in range(0, len(hands), EVALUATION_BATCH_SIZE):
+        batch = hands[start:start + EVALUATION_BATCH_SIZE]
+        result[start:start + len(batch)] = _seven_card_ranks(np.prod(primes[batch], axis=1), _suited_bits(batch))
+    return result.reshape(shape)
+
+def evaluate_on_boards(combos: np.ndarray, boards: np.ndarray) -> np.ndarray:
+    """ Returns the ranks of every combo (2 card indices) on every board (5 card indices), of shape (boards, combos). """
+    primes = _get_lookup_arrays()[3]
+    products = np.prod(primes[boards], axis=1)[:, None] * np.prod(primes[combos], axis=1)[None, :]
+    suited_bits = [board_bits[:, None] | combo_bits[None, :]
+                   for board_bits, combo_bits in zip(_suited_bits(boards), _suited_bits(combos))]
+    return _seven_card_ranks(products, suited_bits)
+
+def get_runouts(community_cards: tuple, samples: int, seed: int) -> np.ndarray:
+    """ All the completions of the board to 5 cards, or `samples` random ones if there are more. """
+    missing = 5 - len(community_cards)
+    dead = {CARD_INDEX[card] for card in community_cards}
+    deck = np.array([i for i in range(52) if i not in dead], dtype=np.int64)
+    if missing == 0:
+        return np.zeros((1, 0), dtype=np.int64)
+    if math.comb(len(deck), missing) <= samples:
+        return np.array(list(itertools.combinations(deck, missing)), dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    return deck[np.argsort(rng.random((samples, len(deck))), axis=1)[:, :missing]]
+
+def _run_bounds(sorted_values: np.ndarray) -> tuple:
+    """ The start and end (exclusive) of the run of equal values that every item of a sorted array is in. """
+    changes = np.flatnonzero(sorted_values[1:] != sorted_values[:-1]) + 1
+    starts = np.zeros(len(sorted_values), dtype=np.int64)
+    starts[changes] = changes
+    ends = np.full(len(sorted_values), len(sorted_values), dtype=np.int64)
+    ends[changes - 1] = changes
+    return np.maximum.accumulate(starts), np.minimum.accumulate(ends[::-1])[::-1]
+
+def _sum_versus(ranks: np.ndarray, cards: np.ndarray, weights_a: np.ndarray, weights_b: np.ndarray) -> tuple:
+    """ Returns (won, total): the weight of the pairs of a combo of a and one of b without a shared card,
+    over runouts, and the part of it won by a (ties count half).
+    ranks and weights are of shape (runouts, combos), dead combos have no weight, cards of shape (combos, 2).
+    Instead of comparing every pair, the weights of b are summed by rank per runout, and per runout and card:
+    b without a card of a = all of b - b with a's first card - b with its second card + a itself.
+    """
+    runouts, size = ranks.shape
+    runout_groups = np.arange(runouts)[:, None, None]
+    groups = np.concatenate([
+        np.broadcast_to(runout_groups, (runouts, size, 1)),
+        runouts + runout_groups * 52 + cards[None, :, :],
+    ], axis=2) # (runouts, combos, 3)
+    keys = (groups * RANK_SPAN + ranks[:, :, None]).ravel()
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    cumulative = np.concatenate([[0.0], np.cumsum(np.broadcast_to(weights_b[:, :, None], groups.shape).ravel()[order])])
+    better, not_worse = (cumulative[bounds] for bounds in _run_bounds(sorted_keys))
+    group_starts, group_ends = (cumulative[bounds] for bounds in _run_bounds(sorted_keys // RANK_SPAN))
+    beaten = group_ends - not_worse + 0.5 * (not_worse - better)
+    signs = np.broadcast_to(np.array([1.0, -1.0, -1.0]) * weights_a[:, :, None], groups.shape).ravel()[order]
+    won = signs @ beaten + 0.5 * np.sum(weights_a * weights_b)
+    total = signs @ (group_ends - group_starts) + np.sum(weights_a * weights_b)
+    return float(won), float(total)
+
+def compute_equity(weights_a: np.ndarray, weights_b: np.ndarray, community_cards: tuple = (), samples: int = 1000, seed: int = 0) -> float:
+    """ Returns the equity (share of the pot, ties split) of range a against range b on the board. """
+    board = np.array([CARD_INDEX[card] for card in community_cards], dtype=np.int64)
+    board_mask = cards_mask(community_cards)
+    live = (COMBO_MASKS & board_mask) == 0
+    index_a = np.flatnonzero((weights_a > 0) & live)
+    index_b = np.flatnonzero((weights_b > 0) & live)
+    if len(index_a) == 0 or len(index_b) == 0:
+        raise ValueError('a range has no combos left on this board')
+
+    # every combo of both ranges is evaluated once per runout.
+    union = np.union1d(index_a, index_b)
+    runouts = get_runouts(tuple(community_cards), samples, seed)
+    boards = np.concatenate([np.broadcast_to(board, (len(runouts), len(board))), runouts], axis=1)
+    runout_masks = np.zeros(len(runouts), dtype=np.uint64)
+    for column in runouts.T:
+        runout_masks |= np.uint64(1) << column.astype(np.uint64)
+
+    won = total = 0.0
+    batch_size = max(1, EVALUATION_BATCH_SIZE // len(union))
+    for start in range(0, len(runouts), batch_size):
+        ranks = evaluate_on_boards(COMBOS[union], boards[start:start + batch_size])
+        not_dead = (COMBO_MASKS[union][None, :] & runout_masks[start:start + batch_size, None]) == 0
+        batch_won, batch_total = _sum_versus(ranks, COMBOS[union], weights_a[union] * not_dead, weights_b[union] * not_dead)
+        won += batch_won
+        total += batch_total
+
+    if total < 1e-9:
+        raise ValueError('the ranges have no combos without shared cards')
+    return won / total
+
+def _compute_equity(args: tuple) -> float:
+    return compute_equity(*args)
+
+class EquityCalculator:
+    """ Range vs range and hand vs range equity, memoized per (range pair, board).
+
+    Ranges can be passed as HandRange, range notation, or a list of two cards.
+    equities() computes the queries that are not cached in parallel, on a process pool of max_workers.
+    Usage:
+        with EquityCalculator() as calculator:
+            calculator.equity('QQ+, AKs', '22+, A2s+, KTs+', ['Ah', '7c', '2d'])
+    """
+    def __init__(self, max_workers: int = None, samples: int = 1000, cache_size: int = 100_000):
+        self.max_workers = max_workers
+        self.samples = samples
+        self.cache_size = cache_size
+        self.cache: OrderedDict = OrderedDict() # of the form {(range key, range key, board): equity}
+        self.hits = 0
+        self.misses = 0
+        self.executor: ProcessPoolExecutor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _make_query(self, range_a, range_b, community_cards) -> tuple:
+        """ Returns (cache key, reversed, args of compute_equity). The key has the smaller range key first. """
+        range_a, range_b = to_range(range_a), to_range(range_b)
+        board = tuple(sorted(community_cards, key=CARD_INDEX.__getitem__))
+        key_a, key_b = range_a.key(), range_b.key()
+        reverse = key_a > key_b
+        if reverse:
+            range_a, range_b, key_a, key_b = range_b, range_a, key_b, key_a
+        key = (key_a, key_b, board)
+        # the sample seed is derived from the query, so results don't depend on the cache.
+        seed = zlib.crc32(key_a + key_b + ''.join(board).encode())
+        return key, reverse, (range_a.weights, range_b.weights, board, self.samples, seed)
+
+    def _get_cached(self, key):
+        equity = self.cache.get(key)
+        if equity != None:
+            self.cache.move_to_end(key)
+        return equity
+
+    def _store(self, key, equity: float):
+        self.cache[key] = equity
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def equity(self, range_a, range_b, community_cards: list[str] = ()) -> float:
+        """ Equity of range_a against range_b, computed in this process if not cached. """
+        key, reverse, args = self._make_query(range_a, range_b, community_cards)
+        equity = self._get_cached(key)
+        if equity == None:
+            self.misses += 1
+            equity = compute_equity(*args)
+            self._store(key, equity)
+        else:
+            self.hits += 1
+        return 1 - equity if reverse else equity
+
+    def hand_equity(self, cards: list[str], hand_range, community_cards: list[str] = ()) -> float:
+        return self.equity(HandRange.from_cards(cards), hand_range, community_cards)
+
+    def equities(self, queries: list[tuple]) -> list[float]:
+        """ Returns the equities of queries [(range_a, range_b, community_cards), ...], computing the missing ones in parallel. """
+        prepared = [self._make_query(*query) for query in queries]
+        # hits are copied first, storing the computed equities may evict them from the cache.
+        known = {}
+        missing = {}
+        for key, reverse, args in prepared:
+            if key in known or key in missing:
+                continue
+            equity = self._get_cached(key)
+            if equity != None:
+                known[key] = equity
+            else:
+                missing[key] = args
+        self.misses += len(missing)
+        self.hits += len(prepared) - len(missing)
+
+        if len(missing) == 1 or self.max_workers == 1:
+            results = [compute_equity(*args) for args in missing.values()]
+        elif missing:
+            if self.executor == None:
+                hand_evaluator.preload() # shared by forked workers
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            results = list(self.executor.map(_compute_equity, missing.values()))
+        else:
+            results = []
+        for key, equity in zip(missing, results):
+            known[key] = equity
+            self._store(key, equity)
+
+        equities = []
+        for key, reverse, args in prepared:
+            equity = known[key]
+            equities.append(1 - equity if reverse else equity)
+        return equities
@@ -0,0 +1,234 @@
+""" Decoding and validation of (untrusted) requests, before they reach HoldemTable.request_handler.
+
+Requests come either as JSON, or in a compact binary encoding with a fixed layout per request type:
+
+    header:             magic (u8), version (u8), request type code (u8)
+    move_request:       header, sit (u8), action code (u8), call_amount (u32), raise_amount (u32), table_id
+    sit_request:        header, sit type code (u8), sit (u8), chips (u32), user_id, table_id
+    table_view_request: header, user_id, table_id
+
+Strings are utf-8, prefixed by their length in bytes (u8), integers are little endian. An empty table_id
+of a move request stands for a request without one. A payload starting with the magic byte is decoded as
+binary, anything else as JSON, so existing JSON clients keep working.
+
+Both decoders return a request of the form HoldemTable.request_handler expects, holding only the known
+fields. JSON requests pass the validator of their type, compiled once from SCHEMAS into one check per
+field, which rejects wrong types (bools are not ints), out of range values and missing fields. Binary
+requests are checked while unpacked, their layout already fixes the types and most of the ranges.
+Whether a move or a sit is allowed is still decided by the table.
+
+Usage:
+    try:
+        request = decode_request(payload)
+    except RequestError as e:
+        ... # reply with an error, the table never sees the payload
+    response = tables[request['data']['table_id']].request_handler(request)
+"""
+
+import json
+import struct
+
+MAGIC = 0xB7 # never the first byte of a utf-8 JSON text
+VERSION = 1
+MAX_SIT = 9
+MAX_AMOUNT = 2**32 - 1
+MAX_STRING_BYTES = 255
+
+REQUEST_TYPES = ('move_request', 'sit_request', 'table_view_request')
+ACTIONS = ('check', 'call', 'raise', 'fold')
+SIT_TYPES = ('join', 'leave')
+
+# codes start at 1, so a zeroed field is never a valid code.
+REQUEST_TYPE_CODES = {request_type: code for code, request_type in enumerate(REQUEST_TYPES, 1)}
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS, 1)}
+SIT_TYPE_CODES = {sit_type: code for code, sit_type in enumerate(SIT_TYPES, 1)}
+
+HEADER = struct.Struct('<BBB')
+LAYOUTS = {
+    'move_request': struct.Struct('<BBBBBII'),
+    'sit_request': struct.Struct('<BBBBBI'),
+    'table_view_request': HEADER,
+}
+
+class RequestError(ValueError):
+    pass
+
+""" Schemas """
+
+def integer(low: int, high: int):
+    def check(value):
+        return type(value) == int and low <= value <= high
+    return check
+
+def one_of(*values):
+    values = frozenset(values)
+    def check(value):
+        return type(value) == str and value in values
+    return check
+
+def string(max_bytes: int = MAX_STRING_BYTES):
+    def check(value):
+        return type(value) == str and 0 < len(value) <= max_bytes and len(value.encode()) <= max_bytes
+    return check
+
+# of the form {request type: {field: (check, required)}}, the fields of request['data'].
+SCHEMAS = {
+    'move_request': {
+        'sit': (integer(1, MAX_SIT), True),
+        'action': (one_of(*ACTIONS), True),
+        'call_amount': (integer(0, MAX_AMOUNT), True),
+        'raise_amount': (integer(0, MAX_AMOUNT), True),
+        'table_id': (string(), False),
+    },
+    'sit_request': {
+        'user_id': (string(), True),
+        'table_id': (string(), True),
+        'type': (one_of(*SIT_TYPES), True),
+        'sit': (integer(1, MAX_SIT), True),
+        'chips': (integer(0, MAX_AMOUNT), True),
+    },
+    'table_view_request': {
+        'user_id': (string(), True),
+        'table_id': (string(), False),
+    },
+}
+
+def compile_validator(schema: dict):
+    """ Returns a function that checks the data of a request against schema, and returns its known fields.
+    Raises RequestError on the first field that fails.
+    """
+    fields = tuple((key, check, required) for key, (check, required) in schema.items())
+    def validate(data) -> dict:
+        if type(data) != dict:
+            raise RequestError('request data is not an object')
+        valid = {}
+        for key, check, required in fields:
+            value = data.get(key)
+            if value == None:
+                if required:
+                    raise RequestError(f'missing field {key}')
+                continue
+            if not check(value):
+                raise RequestError(f'invalid field {key}')
+            valid[key] = value
+        return valid
+    return validate
+
+VALIDATORS = {request_type: compile_validator(schema) for request_type, schema in SCHEMAS.items()}
+
+def validate_request(request) -> dict:
+    """ Returns the valid form of a request dict ({'type', 'data'}), raises RequestError if it is malformed. """
+    if type(request) != dict:
+        raise RequestError('request is not an object')
+    validator = VALIDATORS.get(request.get('type')) if type(request.get('type')) == str else None
+    if validator == None:
+        raise RequestError('unknown request type')
+    return {'type': request['type'], 'data': validator(request.get('data'))}
+
+def is_valid_request(request) -> bool:
+    try:
+        validate_request(request)
+    except RequestError:
+        return False
+    return True
+
+""" Binary encoding """
+
+def _pack_string(value: str) -> bytes:
+    encoded = value.encode()
+    if len(encoded) > MAX_STRING_BYTES:
+        raise RequestError('string too long')
+    return bytes((len(encoded),)) + encoded
+
+def _unpack_string(payload: bytes, offset: int) -> tuple[str, int]:
+    if offset >= len(payload):
+        raise RequestError('truncated request')
+    end = offset + 1 + payload[offset]
+    if end > len(payload):
+        raise RequestError('truncated request')
+    try:
+        return payload[offset + 1:end].decode(), end
+    except UnicodeDecodeError:
+        raise RequestError('invalid utf-8 string') from None
+
+def encode_request(request: dict) -> bytes:
+    """ Encodes a request in the binary format. The request is validated first. """
+    request = validate_request(request)
+    request_type, data = request['type'], request['data']
+    header = (MAGIC, VERSION, REQUEST_TYPE_CODES[request_type])
+    layout = LAYOUTS[request_type]
+    if request_type == 'move_request':
+        fixed = layout.pack(*header, data['sit'], ACTION_CODES[data['action']], data['call_amount'], data['raise_amount'])
+        return fixed + _pack_string(data.get('table_id', ''))
+    if request_type == 'sit_request':
+        fixed = layout.pack(*header, SIT_TYPE_CODES[data['type']], data['sit'], data['chips'])
+        return fixed + _pack_string(data['user_id']) + _pack_string(data['table_id'])
+    return layout.pack(*header) + _pack_string(data['user_id']) + _pack_string(data.get('table_id', ''))
+
+def decode_binary_request(payload: bytes) -> dict:
+    if len(payload) < HEADER.size:
+        raise RequestError('truncated request')
+    magic, version, type_code = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise RequestError('unsupported encoding')
+    if not 0 < type_code <= len(REQUEST_TYPES):
+        raise RequestError('unknown request type')
+    request_type = REQUEST_TYPES[type_code - 1]
+    layout = LAYOUTS[request_type]
+    if len(payload) < layout.size:
+        raise RequestError('truncated request')
+
+    if request_type == 'move_request':
+        _, _, _, sit, action_code, call_amount, raise_amount = layout.unpack_from(payload)
+        if not 0 < action_code <= len(ACTIONS):
+            raise RequestError('invalid field action')
+        if not 0 < sit <= MAX_SIT:
+            raise RequestError('invalid field sit')
+        data = {'sit': sit, 'action': ACTIONS[action_code - 1], 'call_amount': call_amount, 'raise_amount': raise_amount}
+        table_id, end = _unpack_string(payload, layout.size)
+        if table_id:
+            data['table_id'] = table_id
+    elif request_type == 'sit_request':
+        _, _, _, sit_type_code, sit, chips = layout.unpack_from(payload)
+        if not 0 < sit_type_code <= len(SIT_TYPES):
+            raise RequestError('invalid field type')
+        if not 0 < sit <= MAX_SIT:
+            raise RequestError('invalid field sit')
+        user_id, offset = _unpack_string(payload, layout.size)
+        table_id, end = _unpack_string(payload, offset)
+        if not table_id:
+            raise RequestError('missing field table_id')
+        data = {'user_id': user_id, 'table_id': table_id, 'type': SIT_TYPES[sit_type_code - 1], 'sit': sit, 'chips': chips}
+    else:
+        user_id, offset = _unpack_string(payload, layout.size)
+        table_id, end = _unpack_string(payload, offset)
+        data = {'user_id': user_id}
+        if table_id:
+            data['table_id'] = table_id
+
+    if end != len(payload):
+        raise RequestError('trailing bytes after request')
+    if request_type != 'move_request' and not user_id:
+        raise RequestError('missing field user_id')
+    # the layout already fixes the types and the ranges of the other fields.
+    return {'type': request_type, 'data': data}
+
+""" JSON fallback """
+
+def encode_json_request(request: dict) -> bytes:
+    return json.dumps(validate_request(request), separators=(',', ':')).encode()
+
+def decode_json_request(payload) -> dict:
+    try:
+        request = json.loads(payload)
+    except (ValueError, TypeError):
+        raise RequestError('invalid json') from None
+    return validate_request(request)
+
+def decode_request(payload) -> dict:
+    """ Decodes and validates a binary or JSON payload (bytes, or str for JSON). Raises RequestError if it is malformed. """
+    if type(payload) in (bytes, bytearray, memoryview):
+        payload = bytes(payload)
+        if payload[:1] == bytes((MAGIC,)):
+            return decode_binary_request(payload)
+    return decode_json_request(payload)
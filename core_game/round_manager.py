@@ -51,26 +51,26 @@ class HoldemRoundManager:
         assert player.folded == False
         allowed_moves = game.get_allowed_moves(player)
         
-        if not request['move'] in allowed_moves['moves']:
+        if not request['action'] in allowed_moves['moves']:
             return False
         
         if not game.stage in (HoldemRoundStage.FLOP,HoldemRoundStage.PREFLOP,HoldemRoundStage.RIVER,HoldemRoundStage.TURN):
             print('Move not allowed - game ended.')
             return False
 
-        return HoldemRoundManager.VALIDATE[request['move']](allowed_moves, request)
+        return HoldemRoundManager.VALIDATE[request['action']](allowed_moves, request)
     
     @staticmethod
     def apply_check(game: HoldemRound, player: HoldemRoundPlayer, request: dict):
         return
     @staticmethod
     def apply_call(game: HoldemRound, player: HoldemRoundPlayer, request: dict):
-        game.bets[game.stage].append((player.sit, request['move'], request['call_amount'], request['raise_amount']))
+        game.bets[game.stage].append((player.sit, request['action'], request['call_amount'], request['raise_amount']))
         player.chips -= (request['call_amount']+request['raise_amount'])
 
     @staticmethod
     def apply_raise(game: HoldemRound, player: HoldemRoundPlayer, request: dict):
-        game.bets[game.stage].append((player.sit, request['move'], request['call_amount'], request['raise_amount']))
+        game.bets[game.stage].append((player.sit, request['action'], request['call_amount'], request['raise_amount']))
         player.chips -= (request['call_amount']+request['raise_amount'])
 
     @staticmethod
@@ -89,9 +89,9 @@ class HoldemRoundManager:
     def apply_game_request(game: HoldemRound, player: HoldemRoundPlayer , request: dict):
         
         game.log.append({player.sit: request})
-        HoldemRoundManager.APPLY[request['move']](game, player, request)
+        HoldemRoundManager.APPLY[request['action']](game, player, request)
 
-        if request['move'] == 'raise':
+        if request['action'] == 'raise':
             game.move_queue.extend_due_to_raise(player)
     
     # TODO: should probably be in abstract class
@@ -103,7 +103,7 @@ class HoldemRoundManager:
         Requests should be of the form:
         {
             'sit': int, # sit of player
-            'type': str, # one of 'fold','raise','check','call'
+            'action': str, # one of 'fold','raise','check','call'
             'call_amount': int, # present if call or raise
             'raise_amount': int, # presest if call or raise
         }
@@ -112,7 +112,7 @@ class HoldemRoundManager:
 
         player = game.get_player_by_sit(request['sit'])
         if not HoldemRoundManager.validate_game_request(game, player, request):
-            print(request['move'] + ' not allowed.')
+            print(request['action'] + ' not allowed.')
             return {'type':'move_response', 'accepted':False}
         
         HoldemRoundManager.apply_game_request(game, player, request)
@@ -127,10 +127,10 @@ def main():
     game.start()
     print(game.stage)
     
-    HoldemRoundManager.process_game_request(game,{'sit':1,'move':'check', 'call_amount':0, 'raise_amount':0})
+    HoldemRoundManager.process_game_request(game,{'sit':1,'action':'check', 'call_amount':0, 'raise_amount':0})
     print(game.players)
     game.start_next_move()
-    HoldemRoundManager.process_game_request(game,{'sit':2,'move':'raise', 'call_amount':0,'raise_amount':40})
+    HoldemRoundManager.process_game_request(game,{'sit':2,'action':'raise', 'call_amount':0,'raise_amount':40})
     print(game)
     game.start_next_move()
     print(game)
@@ -0,0 +1,124 @@
+""" Coalesced delivery of table view updates to the players and spectators of a table.
+
+State changes of a table are only marked (mark_changed); the views are built once per event loop tick
+(or per window seconds), so a move followed by start_next_move and start_next_stage sends a single
+table_view_update per recipient. The shared part of the view is built once for all recipients.
+
+Every recipient has one pending update slot. A recipient that is still sending the previous update
+gets only the newest view when it is done, superseded views are dropped.
+"""
+
+import asyncio
+
+if __name__ == '__main__':
+    from holdem_table import HoldemTable
+else:
+    from .holdem_table import HoldemTable
+
+# request types that change the table view when they succeed
+STATE_CHANGING_REQUESTS = ('move_request', 'sit_request')
+
+class BroadcastRecipient:
+    __slots__ = ('id', 'spectator', 'pending', 'task', 'sent', 'dropped')
+
+    def __init__(self, recipient_id: str, spectator: bool):
+        self.id = recipient_id
+        self.spectator = spectator
+        self.pending: dict = None # latest view that was not sent yet
+        self.task: asyncio.Task = None
+        self.sent = 0
+        self.dropped = 0
+
+class TableBroadcaster:
+    """ Sends coalesced table_view_update messages of a table to its recipients.
+
+    send is a coroutine function send(recipient_id, view), e.g. writing to the recipient's connection.
+    A recipient is a player of the table (by user id) or, if spectator, anyone, who gets no personal data.
+    With window=0 changes are coalesced within one event loop tick, otherwise within window seconds.
+    Must be used from a running event loop.
+    """
+    def __init__(self, table: HoldemTable, send, window: float = 0.0):
+        assert window >= 0
+        self.table = table
+        self.send = send
+        self.window = window
+        self.recipients: dict[str:BroadcastRecipient] = {}
+        self.scheduled: asyncio.Handle = None
+        self.flushes = 0
+        self.send_errors = 0
+
+    def add_recipient(self, recipient_id: str, spectator: bool = False):
+        """ Adds a recipient and sends it the current view. """
+        if recipient_id not in self.recipients:
+            self.recipients[recipient_id] = BroadcastRecipient(recipient_id, spectator)
+        self.mark_changed()
+
+    def remove_recipient(self, recipient_id: str):
+        recipient = self.recipients.pop(recipient_id, None)
+        if recipient != None and recipient.task != None:
+            recipient.task.cancel()
+
+    def mark_changed(self):
+        """ Schedules a broadcast, unless one is already scheduled. """
+        if self.scheduled != None:
+            return
+        loop = asyncio.get_running_loop()
+        if self.window == 0:
+            self.scheduled = loop.call_soon(self.flush)
+        else:
+            self.scheduled = loop.call_later(self.window, self.flush)
+
+    def handle_request(self, request: dict) -> dict:
+        """ Handles a request with table.request_handler, and schedules a broadcast if it changed the table. """
+        response = self.table.request_handler(request)
+        if request['type'] in STATE_CHANGING_REQUESTS and response.get('success'):
+            self.mark_changed()
+        return response
+
+    def flush(self):
+        """ Builds the current views and hands them to the recipients' senders. """
+        if self.scheduled != None:
+            self.scheduled.cancel()
+            self.scheduled = None
+        if not self.recipients:
+            return
+        self.flushes += 1
+
+        shared_data = self.table.get_shared_view_data()
+        players_by_id = {p.id: p for p in self.table.players}
+        for recipient in self.recipients.values():
+            player = None if recipient.spectator else players_by_id.get(recipient.id)
+            if recipient.pending != None:
+                recipient.dropped += 1
+            recipient.pending = self.table.make_table_view(shared_data, player)
+            if recipient.task == None:
+                recipient.task = asyncio.get_running_loop().create_task(self._send_pending(recipient))
+
+    async def _send_pending(self, recipient: BroadcastRecipient):
+        try:
+            while recipient.pending != None:
+                view = recipient.pending
+                recipient.pending = None
+                try:
+                    await self.send(recipient.id, view)
+                    recipient.sent += 1
+                except (ConnectionError, OSError):
+                    self.send_errors += 1
+        finally:
+            recipient.task = None
+
+    def get_stats(self) -> dict:
+        return {
+            'flushes': self.flushes,
+            'sent': sum(r.sent for r in self.recipients.values()),
+            'dropped': sum(r.dropped for r in self.recipients.values()),
+            'send_errors': self.send_errors,
+        }
+
+    async def drain(self):
+        """ Flushes a scheduled broadcast and waits until all pending views were sent. """
+        if self.scheduled != None:
+            self.flush()
+        tasks = [r.task for r in self.recipients.values() if r.task != None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,293 @@
+""" Read replicas of the public state of tables in shared memory, for view serving processes.
+
+The process that owns a table publishes the shared part of its view (HoldemTable.get_shared_view_data) into
+a shared memory segment of the table once per batch of requests with an accepted move or sit request, after
+the round moved on to the next move, and whenever it changes the round itself (round start).
+The requests go through the publisher (handle_requests, with process_requests(advance_round=True)), so
+readers never see the state between an accepted move and the start of the next one. Other processes answer table_view_request and spectator traffic by
+reading the segment, without a round trip to the owner and without its GIL. The personal part of a view
+(cards and allowed moves) is never published, it stays with the owner.
+
+The segment is a fixed layout of struct fields, guarded by a sequence lock: the writer makes the sequence
+odd, writes the fields and makes it even again; a reader copies the segment and keeps the copy only if
+the sequence was even and unchanged around the copy, otherwise it retries. Writers never wait for readers.
+Aligned 8 byte writes of the sequence are atomic on the platforms we run on (x86-64, arm64).
+
+A state that doesn't fit the layout (more than MAX_BETS bets in a round, long user ids) is published as
+truncated, and readers return None for it, so the caller can ask the owner instead.
+
+Usage, in the owner process:
+    publisher = ReplicaPublisher()
+    responses = publisher.handle_requests(table, requests)
+    ...
+    table.round.start()
+    publisher.publish(table)
+
+In a view serving process:
+    reader = ReplicaReader()
+    view = reader.get_table_view(table_id) # a table_view_update without personal data, or None
+"""
+
+import hashlib
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+if __name__ == '__main__':
+    from holdem_round import Bet, CardDeck, HoldemRoundStage
+    from holdem_table import HoldemTable
+    from table_broadcast import STATE_CHANGING_REQUESTS
+else:
+    from .holdem_round import Bet, CardDeck, HoldemRoundStage
+    from .holdem_table import HoldemTable
+    from .table_broadcast import STATE_CHANGING_REQUESTS
+
+MAX_PLAYERS = 9
+MAX_POTS = 9
+MAX_BETS = 128
+MAX_USER_ID_BYTES = 64
+NO_CARD = 255
+
+CARDS = CardDeck.full_deck
+CARD_CODES = {card: code for code, card in enumerate(CARDS)}
+STAGES = tuple(HoldemRoundStage)
+STAGE_CODES = {stage.value: code for code, stage in enumerate(STAGES)}
+BET_STAGES = tuple(stage.value for stage in STAGES[1:5]) # preflop to river, the keys of HoldemRound.bets
+ACTIONS = ('check', 'call', 'raise', 'fold', 'sb', 'bb')
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# flags
+HAS_ROUND = 1
+TRUNCATED = 2
+ACTIVE = 1
+IN_HAND = 2
+FOLDED = 4
+
+SEQUENCE = struct.Struct('<Q')
+# version, flags, stage, to_move (0 for none), players, board cards, pots, last moves, shown hands, bets
+HEADER = struct.Struct('<QBBBBBBBBH')
+BOARD = struct.Struct('<5B')
+POTS = struct.Struct(f'<{MAX_POTS}Q')
+PLAYER = struct.Struct(f'<B{MAX_USER_ID_BYTES}sBQB') # user id length, user id, sit, chips, flags
+MOVE = struct.Struct('<BBBQQ') # sit, action, stage, call_amount, raise_amount
+SHOWN = struct.Struct('<BBB') # sit, cards
+BET = struct.Struct('<BBBQQ') # stage, sit, bet type, call_amount, raise_amount
+
+HEADER_OFFSET = SEQUENCE.size
+BOARD_OFFSET = HEADER_OFFSET + HEADER.size
+POTS_OFFSET = BOARD_OFFSET + BOARD.size
+PLAYERS_OFFSET = POTS_OFFSET + POTS.size
+MOVES_OFFSET = PLAYERS_OFFSET + MAX_PLAYERS * PLAYER.size
+SHOWN_OFFSET = MOVES_OFFSET + MAX_PLAYERS * MOVE.size
+BETS_OFFSET = SHOWN_OFFSET + MAX_PLAYERS * SHOWN.size
+SEGMENT_SIZE = BETS_OFFSET + MAX_BETS * BET.size
+
+# names of the segments published by this process, the resource tracker is shared by its publishers and readers.
+_published = set()
+
+def get_segment_name(table_id: str, prefix: str = 'holdem') -> str:
+    """ Shared memory names are short on some platforms, so the table id is hashed. """
+    return f'{prefix}_{hashlib.sha1(table_id.encode()).hexdigest()[:16]}'
+
+class StateTooLarge(Exception):
+    pass
+
+def encode_shared_data(buffer, shared_data: dict, version: int):
+    """ Writes the fields of shared_data into buffer (without the sequence). Raises StateTooLarge if it doesn't fit. """
+    players = shared_data['players']
+    has_round = 'stage' in shared_data
+    board = shared_data.get('community_cards', [])
+    pots = shared_data.get('pots', [])
+    last_moves = list(shared_data.get('last_moves', {}).values())
+    shown = list(shared_data.get('show_cards', {}).items())
+    bets = [(stage, bet) for stage, stage_bets in shared_data.get('bets', {}).items() for bet in stage_bets]
+    if len(players) > MAX_PLAYERS or len(pots) > MAX_POTS or len(bets) > MAX_BETS:
+        raise StateTooLarge()
+
+    to_move = shared_data.get('to_move')
+    stage = STAGE_CODES[shared_data['stage']] if has_round else 0
+    HEADER.pack_into(
+        buffer, HEADER_OFFSET, version, HAS_ROUND if has_round else 0, stage, to_move or 0,
+        len(players), len(board), len(pots), len(last_moves), len(shown), len(bets),
+    )
+    BOARD.pack_into(buffer, BOARD_OFFSET, *([CARD_CODES[card] for card in board] + [NO_CARD] * (5 - len(board))))
+    POTS.pack_into(buffer, POTS_OFFSET, *(list(pots) + [0] * (MAX_POTS - len(pots))))
+    for index, player in enumerate(players):
+        user_id = player['user_id'].encode()
+        if len(user_id) > MAX_USER_ID_BYTES:
+            raise StateTooLarge()
+        flags = (ACTIVE if player['active'] else 0) | (IN_HAND if player.get('in_hand') else 0) | (FOLDED if player.get('folded') else 0)
+        PLAYER.pack_into(buffer, PLAYERS_OFFSET + index * PLAYER.size, len(user_id), user_id, player['sit'], player['chips'], flags)
+    for index, move in enumerate(last_moves):
+        MOVE.pack_into(buffer, MOVES_OFFSET + index * MOVE.size, move['sit'], ACTION_CODES[move['action']], STAGE_CODES[move['stage']], move['call_amount'], move['raise_amount'])
+    for index, (sit, cards) in enumerate(shown):
+        SHOWN.pack_into(buffer, SHOWN_OFFSET + index * SHOWN.size, sit, *(CARD_CODES[card] for card in cards))
+    for index, (stage, bet) in enumerate(bets):
+        BET.pack_into(buffer, BETS_OFFSET + index * BET.size, STAGE_CODES[stage], bet.sit, ACTION_CODES[bet.bet_type], bet.call_amount, bet.raise_amount)
+
+def decode_shared_data(buffer) -> tuple[int, dict]:
+    """ Returns (version, shared data) of a copied segment, shared data is None if the state was truncated. """
+    version, flags, stage, to_move, num_players, num_board, num_pots, num_moves, num_shown, num_bets = HEADER.unpack_from(buffer, HEADER_OFFSET)
+    if flags & TRUNCATED:
+        return version, None
+
+    players = []
+    for index in range(num_players):
+        length, user_id, sit, chips, player_flags = PLAYER.unpack_from(buffer, PLAYERS_OFFSET + index * PLAYER.size)
+        player = {'user_id': user_id[:length].decode(), 'sit': sit, 'chips': chips, 'active': bool(player_flags & ACTIVE)}
+        if flags & HAS_ROUND:
+            player['in_hand'] = bool(player_flags & IN_HAND)
+            if player_flags & IN_HAND:
+                player['folded'] = bool(player_flags & FOLDED)
+        players.append(player)
+    if not flags & HAS_ROUND:
+        return version, {'players': players}
+
+    last_moves = {}
+    for index in range(num_moves):
+        sit, action, move_stage, call_amount, raise_amount = MOVE.unpack_from(buffer, MOVES_OFFSET + index * MOVE.size)
+        last_moves[sit] = {'sit': sit, 'action': ACTIONS[action], 'call_amount': call_amount, 'raise_amount': raise_amount, 'stage': STAGES[move_stage].value}
+    show_cards = {}
+    for index in range(num_shown):
+        sit, card1, card2 = SHOWN.unpack_from(buffer, SHOWN_OFFSET + index * SHOWN.size)
+        show_cards[sit] = [CARDS[card1], CARDS[card2]]
+    bets = {stage: [] for stage in BET_STAGES}
+    for index in range(num_bets):
+        bet_stage, sit, bet_type, call_amount, raise_amount = BET.unpack_from(buffer, BETS_OFFSET + index * BET.size)
+        bets[STAGES[bet_stage].value].append(Bet(sit, ACTIONS[bet_type], call_amount, raise_amount))
+
+    return version, {
+        'players': players,
+        'community_cards': [CARDS[card] for card in BOARD.unpack_from(buffer, BOARD_OFFSET)[:num_board]],
+        'pots': list(POTS.unpack_from(buffer, POTS_OFFSET)[:num_pots]),
+        'bets': bets,
+        'stage': STAGES[stage].value,
+        'last_moves': last_moves,
+        'to_move': to_move or None,
+        'show_cards': show_cards,
+    }
+
+class ReplicaPublisher:
+    """ Publishes tables of the owner process into their shared memory segments. """
+    def __init__(self, prefix: str = 'holdem'):
+        self.prefix = prefix
+        self.segments: dict[str:shared_memory.SharedMemory] = {} # of the form {table_id: segment}
+        self.versions: dict[str:int] = {} # of the form {table_id: version}
+
+    def get_segment(self, table_id: str) -> shared_memory.SharedMemory:
+        segment = self.segments.get(table_id)
+        if segment == None:
+            name = get_segment_name(table_id, self.prefix)
+            try:
+                segment = shared_memory.SharedMemory(name, create=True, size=SEGMENT_SIZE)
+            except FileExistsError:
+                # left by a previous owner of the table, its content is replaced on publish.
+                # versions go on from the previous owner's, so readers never see a version go back.
+                segment = shared_memory.SharedMemory(name)
+                self.versions[table_id] = HEADER.unpack_from(segment.buf, HEADER_OFFSET)[0]
+            _published.add(name)
+            self.segments[table_id] = segment
+        return segment
+
+    def publish(self, table: HoldemTable) -> int:
+        """ Writes the shared view data of table into its segment, returns the new version. """
+        buffer = self.get_segment(table.table_id).buf
+        version = self.versions.get(table.table_id, 0) + 1
+        self.versions[table.table_id] = version
+        shared_data = table.get_shared_view_data()
+
+        sequence = SEQUENCE.unpack_from(buffer, 0)[0]
+        SEQUENCE.pack_into(buffer, 0, sequence + 1 | 1) # odd while writing
+        try:
+            encode_shared_data(buffer, shared_data, version)
+        except StateTooLarge:
+            HEADER.pack_into(buffer, HEADER_OFFSET, version, TRUNCATED, 0, 0, 0, 0, 0, 0, 0, 0)
+        SEQUENCE.pack_into(buffer, 0, (sequence + 1 | 1) + 1)
+        return version
+
+    def handle_requests(self, table: HoldemTable, requests: list[dict]) -> list[dict]:
+        """ Handles requests with table.process_requests(advance_round=True), and publishes table once
+        if any of them was accepted and changed its state. Returns the responses.
+        """
+        responses = table.process_requests(requests, advance_round=True)
+        if any(request['type'] in STATE_CHANGING_REQUESTS and response.get('success') for request, response in zip(requests, responses)):
+            self.publish(table)
+        return responses
+
+    def handle_request(self, table: HoldemTable, request: dict) -> dict:
+        return self.handle_requests(table, [request])[0]
+
+    def remove(self, table_id: str):
+        segment = self.segments.pop(table_id, None)
+        self.versions.pop(table_id, None)
+        if segment != None:
+            _published.discard(segment.name)
+            segment.close()
+            segment.unlink()
+
+    def close(self):
+        for table_id in list(self.segments):
+            self.remove(table_id)
+
+class ReplicaReader:
+    """ Reads published tables. Segments are attached on first use, a table that wasn't published reads as None. """
+    def __init__(self, prefix: str = 'holdem', max_retries: int = 1000):
+        self.prefix = prefix
+        self.max_retries = max_retries
+        self.segments: dict[str:shared_memory.SharedMemory] = {}
+        self.reads = 0
+        self.retries = 0
+
+    def attach(self, table_id: str) -> shared_memory.SharedMemory:
+        segment = self.segments.get(table_id)
+        if segment == None:
+            name = get_segment_name(table_id, self.prefix)
+            try:
+                if sys.version_info >= (3, 13):
+                    segment = shared_memory.SharedMemory(name, track=False)
+                else:
+                    segment = shared_memory.SharedMemory(name)
+                    # the owner unlinks the segment, the resource tracker must not do it when a reader exits.
+                    if name not in _published:
+                        resource_tracker.unregister(segment._name, 'shared_memory')
+            except FileNotFoundError:
+                return None
+            self.segments[table_id] = segment
+        return segment
+
+    def read(self, table_id: str) -> tuple[int, dict]:
+        """ Returns (version, shared data) of a consistent copy of the table's segment, or None. """
+        segment = self.attach(table_id)
+        if segment == None:
+            return None
+        buffer = segment.buf
+        self.reads += 1
+        for attempt in range(self.max_retries):
+            before = SEQUENCE.unpack_from(buffer, 0)[0]
+            if before & 1 == 0:
+                copy = bytes(buffer[:SEGMENT_SIZE])
+                if SEQUENCE.unpack_from(buffer, 0)[0] == before:
+                    if before == 0:
+                        return None # created, but not published yet
+                    return decode_shared_data(copy)
+            self.retries += 1
+            if attempt % 100 == 99:
+                time.sleep(0) # let a descheduled writer finish
+        return None
+
+    def get_shared_view_data(self, table_id: str) -> dict:
+        result = self.read(table_id)
+        return result[1] if result != None else None
+
+    def get_table_view(self, table_id: str) -> dict:
+        """ The table view of a spectator, as HoldemTable.get_table_view() without a player, or None. """
+        shared_data = self.get_shared_view_data(table_id)
+        if shared_data == None:
+            return None
+        return {'type': 'table_view_update', 'data': {'personal_data': {}, 'shared_data': shared_data}}
+
+    def close(self):
+        for segment in self.segments.values():
+            segment.close()
+        self.segments.clear()
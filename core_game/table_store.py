@@ -0,0 +1,314 @@
+""" Crash safe persistence of HoldemTable objects to a local SQLite database.
+
+Every accepted request is appended to a journal, and the full state of a table is checkpointed every
+checkpoint_interval journal entries. On startup a table is restored from its last checkpoint, and the
+journal entries written after it are replayed.
+
+All database writes are done in batches by a background thread, so recording a request only serializes
+it and puts it on a queue. A failed batch is retried; if it still fails, it and everything queued after it
+are kept in TableStore.unwritten, and recording raises TableStoreError from then on.
+
+The journal assumes tables are driven like a replayed hand (see holdem_replay.apply_action): after an accepted
+move the round's next move is started, and a round that reaches showdown is finished.
+"""
+
+import json
+import queue
+from dataclasses import asdict
+import sqlite3
+import threading
+import time
+
+if __name__ == '__main__':
+    from holdem_round import (
+        Bet,
+        CardDeck,
+        HoldemRound,
+        HoldemRoundConfig,
+        HoldemRoundPlayer,
+        HoldemRoundStage,
+        LogEntry,
+    )
+    from holdem_table import HoldemTable, HoldemTableConfig, HoldemTablePlayer
+    from holdem_replay import apply_action
+
+else:
+    from .holdem_round import (
+        Bet,
+        CardDeck,
+        HoldemRound,
+        HoldemRoundConfig,
+        HoldemRoundPlayer,
+        HoldemRoundStage,
+        LogEntry,
+    )
+    from .holdem_table import HoldemTable, HoldemTableConfig, HoldemTablePlayer
+    from .holdem_replay import apply_action
+
+JOURNALED_REQUEST_TYPES = ('move_request', 'sit_request')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    table_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal (
+    table_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (table_id, seq)
+);
+"""
+
+""" State serialization """
+
+def round_to_dict(round: HoldemRound) -> dict:
+    return {
+        'config': {'small_blind': round.config.small_blind, 'ante': round.config.ante, 'rake_rate': round.config.rake_rate, 'rake_cap': round.config.rake_cap},
+        'players': [{'sit': p.sit, 'chips': p.chips, 'cards': p.cards, 'folded': p.folded} for p in round.players],
+        'first_to_move': round.first_to_move.sit,
+        'stage': round.stage.value,
+        'log': round.log,
+        'bets': round.bets,
+        'winners': [[bet_rank, sits] for bet_rank, sits in round.winners.items()],
+        'community_cards': round.community_cards,
+        'pots': [[bet_rank, pot['pot'], [p.sit for p in pot['players']]] for bet_rank, pot in round.pots.items()],
+        'player_order': [p.sit for p in round.move_queue.player_order],
+        'queue': [p.sit for p in round.move_queue.queue],
+        'to_move': round.to_move.sit if round.to_move is not None else None,
+        'deck': list(round.deck) if round.deck is not None else None,
+        'deck_order': round.deck_order,
+        'starting_chips': [[sit, chips] for sit, chips in round.starting_chips.items()],
+        'rake': round.rake,
+        'awards': [[sit, chips] for sit, chips in round.awards.items()],
+    }
+
+def round_from_dict(state: dict) -> HoldemRound:
+    players = {p['sit']: HoldemRoundPlayer(p['sit'], p['chips'], list(p['cards']), p['folded']) for p in state['players']}
+
+    round = HoldemRound(
+        HoldemRoundConfig(**state['config']),
+        list(players.values()),
+        players[state['first_to_move']],
+    )
+    round.stage = HoldemRoundStage(state['stage'])
+    round.log = [LogEntry(*event) for event in state['log']]
+    round.bets = {stage: [Bet(*bet) for bet in bets] for stage, bets in state['bets'].items()}
+    round.winners = {bet_rank: sits for bet_rank, sits in state['winners']}
+    round.community_cards = state['community_cards']
+    round.pots = {bet_rank: {'pot': pot, 'players': [players[s] for s in sits]} for bet_rank, pot, sits in state['pots']}
+    round.move_queue.player_order = [players[s] for s in state['player_order']]
+    round.move_queue.queue = [players[s] for s in state['queue']]
+    round.to_move = players.get(state['to_move'])
+    round.deck = CardDeck(state['deck']) if state['deck'] is not None else None
+    round.deck_order = state['deck_order']
+    round.starting_chips = {sit: chips for sit, chips in state['starting_chips']}
+    round.rake = state.get('rake', 0)
+    round.awards = {sit: chips for sit, chips in state.get('awards', [])}
+    return round
+
+def table_to_dict(table: HoldemTable) -> dict:
+    round_sits = {p.sit for p in table.round.players} if table.round is not None else set()
+    return {
+        'table_id': table.table_id,
+        'config': asdict(table.config),
+        'players': [
+            {
+                'id': p.id,
+                'sit': p.sit,
+                'chips': p.chips,
+                'active': p.active,
+                'in_round': p.round_player is not None and p.sit in round_sits,
+            }
+            for p in table.players
+        ],
+        'first_to_move': table.first_to_move.sit if table.first_to_move is not None else None,
+        'rounds_started': table.rounds_started,
+        'round': round_to_dict(table.round) if table.round is not None else None,
+    }
+
+def table_from_dict(state: dict) -> HoldemTable:
+    table = HoldemTable(state['table_id'], HoldemTableConfig(**state['config']))
+    if state['round'] is not None:
+        table.round = round_from_dict(state['round'])
+    for p in state['players']:
+        player = HoldemTablePlayer(p['id'], table.table_id, p['sit'], p['chips'], p['active'])
+        if p['in_round']:
+            player.round_player = table.round.get_player_by_sit(p['sit'])
+            table.round_player_ids[p['sit']] = p['id']
+        table.players.append(player)
+    table.first_to_move = table.get_player_by_sit(state['first_to_move'])
+    table.rounds_started = state.get('rounds_started', 0) # missing in older snapshots
+    return table
+
+def apply_journal_event(table: HoldemTable, event: dict) -> None:
+    if event['type'] == 'round_start':
+        table.start_new_round()
+        table.round.deck = CardDeck(event['deck'])
+        table.round.start()
+    elif event['type'] == 'move_request':
+        apply_action(table.round, event['data'])
+    else:
+        table.request_handler(event)
+
+""" Store """
+
+class TableStoreError(Exception):
+    pass
+
+class TableStore:
+    """ Journals requests and checkpoints tables to a SQLite database in WAL mode.
+
+    Usage:
+        store = TableStore('tables.db')
+        tables = store.restore_tables()
+        ...
+        response = table.request_handler(request)
+        store.record_request(table, request, response)
+        ...
+        table.start_new_round()
+        table.round.start()
+        store.record_round_start(table)
+        ...
+        store.close()
+    """
+    def __init__(self, path: str, checkpoint_interval: int = 100, batch_size: int = 1000, retries: int = 3):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.batch_size = batch_size
+        self.retries = retries # of a failed batch, before the store stops writing
+        self.unwritten: list[tuple] = [] # writes that were not committed, after the store failed
+        self.sequences: dict[str:int] = {} # of the form {table_id: last journal seq}
+        self.checkpoint_sequences: dict[str:int] = {} # of the form {table_id: seq of last checkpoint}
+        self.error: Exception = None
+
+        connection = self.connect()
+        connection.executescript(SCHEMA)
+        for table_id, seq in connection.execute("SELECT table_id, max(seq) FROM journal GROUP BY table_id"):
+            self.sequences[table_id] = seq
+        for table_id, seq in connection.execute("SELECT table_id, seq FROM checkpoints"):
+            self.checkpoint_sequences[table_id] = seq
+            self.sequences[table_id] = max(seq, self.sequences.get(table_id, 0))
+        connection.close()
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name='TableStoreWriter', daemon=True)
+        self.writer.start()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _write_loop(self):
+        connection = self.connect()
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            running = None not in batch
+            items = [item for item in batch if item is not None]
+            if self.error is None:
+                self._write(connection, items)
+            else:
+                # nothing is written after a failed batch, so the journal has no gaps.
+                self.unwritten.extend(items)
+            for _ in batch:
+                self.queue.task_done()
+        connection.close()
+
+    def _write(self, connection: sqlite3.Connection, items: list[tuple]) -> None:
+        """ Commits items in one transaction, retried with a backoff. If all attempts fail, items are kept in
+        self.unwritten and self.error is set.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with connection:
+                    for item in items:
+                        if item[0] == 'journal':
+                            connection.execute("INSERT INTO journal VALUES (?, ?, ?)", item[1:])
+                        elif item[0] == 'checkpoint':
+                            table_id, seq, state = item[1:]
+                            connection.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)", (table_id, seq, state))
+                            connection.execute("DELETE FROM journal WHERE table_id = ? AND seq <= ?", (table_id, seq))
+                return
+            except Exception as e:
+                error = e
+                if attempt < self.retries:
+                    time.sleep(0.01 * 2**attempt)
+        self.unwritten.extend(items)
+        self.error = error
+
+    def _put(self, item: tuple) -> None:
+        if self.error is not None:
+            raise TableStoreError(f'the store failed to write, {len(self.unwritten)} writes are not stored') from self.error
+        self.queue.put(item)
+
+    def _next_seq(self, table_id: str) -> int:
+        seq = self.sequences.get(table_id, 0) + 1
+        self.sequences[table_id] = seq
+        return seq
+
+    def _journal(self, table: HoldemTable, event: dict) -> None:
+        seq = self._next_seq(table.table_id)
+        if table.table_id not in self.checkpoint_sequences:
+            # the table state already includes event, so a first checkpoint replaces it.
+            self.checkpoint(table)
+            return
+        self._put(('journal', table.table_id, seq, json.dumps(event)))
+        if seq - self.checkpoint_sequences.get(table.table_id, 0) >= self.checkpoint_interval:
+            self.checkpoint(table)
+
+    def record_request(self, table: HoldemTable, request: dict, response: dict) -> None:
+        """ Journals request if it was accepted and changes the table state. """
+        if request['type'] not in JOURNALED_REQUEST_TYPES:
+            return
+        if not response or not response.get('success'):
+            return
+        self._journal(table, request)
+
+    def record_round_start(self, table: HoldemTable) -> None:
+        """ Journals the start of table's round. Should be called right after table.round.start(). """
+        self._journal(table, {'type': 'round_start', 'deck': table.round.deck_order})
+
+    def checkpoint(self, table: HoldemTable) -> None:
+        """ Saves the full state of table. Entries journaled before the checkpoint are deleted. """
+        seq = self.sequences.get(table.table_id, 0)
+        self.checkpoint_sequences[table.table_id] = seq
+        self._put(('checkpoint', table.table_id, seq, json.dumps(table_to_dict(table))))
+
+    def flush(self) -> None:
+        """ Blocks until all queued writes are committed. """
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+    def restore_tables(self) -> dict[str:HoldemTable]:
+        """ Rebuilds all stored tables from their last checkpoint and the journal entries after it. """
+        self.flush()
+        connection = self.connect()
+        tables = {}
+        for table_id, state in connection.execute("SELECT table_id, state FROM checkpoints"):
+            tables[table_id] = table_from_dict(json.loads(state))
+
+        rows = connection.execute(
+            "SELECT journal.table_id, journal.event FROM journal JOIN checkpoints USING (table_id) "
+            "WHERE journal.seq > checkpoints.seq ORDER BY journal.table_id, journal.seq"
+        )
+        for table_id, event in rows:
+            apply_journal_event(tables[table_id], json.loads(event))
+        connection.close()
+        return tables
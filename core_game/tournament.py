@@ -0,0 +1,265 @@
+""" Multi table tournaments over HoldemTable objects.
+
+The tournament seats the entrants, sets the blinds and antes of every new hand from the level schedule,
+eliminates the players that lost their chips, and balances the tables. Players are only moved from a
+table between its hands; a player moved to a table in the middle of a hand joins its next hand.
+
+The number of players of every table is kept in buckets ({count: tables}), so the tables with the
+fewest and most players are found without going over the tables. Balancing is done when a table ends
+a hand (the only time its players can be moved):
+    - a table is broken when the remaining players fit in one table less. The table with the fewest
+      players is broken, right away if it is between hands, otherwise when its hand ends.
+    - a table with 2 or more players than the shortest table moves players to the shortest tables.
+The moves of all the tables that ended a hand together are planned and applied as one batch.
+
+Usage:
+    tournament = Tournament('t1', TournamentConfig(1500, 9, [BlindLevel(10, 0, 600), BlindLevel(15, 0, 600)]))
+    for user_id in user_ids:
+        tournament.register(user_id)
+    tournament.start()
+    for table_id in tournament.tables:
+        tournament.start_hand(table_id) # then table.round.start() and play the hand like a live table
+    ...
+    moves = tournament.end_hands([table_id, ...]) # tables whose rounds ended
+    ... # start the next hand of the ended tables, and of the tables in moves
+"""
+
+import bisect
+import itertools
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import NamedTuple
+
+if __name__ == '__main__':
+    from holdem_round import HoldemRoundStage
+    from holdem_table import HoldemTable, HoldemTableConfig
+else:
+    from .holdem_round import HoldemRoundStage
+    from .holdem_table import HoldemTable, HoldemTableConfig
+
+class BlindLevel(NamedTuple):
+    small_blind: int
+    ante: int
+    duration: float # seconds, the last level lasts until the end of the tournament
+
+class TableMove(NamedTuple):
+    user_id: str
+    from_table: str
+    to_table: str
+    sit: int
+    chips: int
+
+@dataclass(slots=True)
+class TournamentConfig:
+    starting_chips: int
+    table_size: int # sits of every table, at most 9
+    levels: list[BlindLevel]
+    reuse_round: bool = True # see HoldemTableConfig
+    seed: int = None # of the random seating
+
+class TournamentError(Exception):
+    pass
+
+class Tournament:
+    def __init__(self, tournament_id: str, config: TournamentConfig, clock=time.monotonic):
+        assert 2 <= config.table_size <= 9
+        assert len(config.levels) > 0
+        self.tournament_id = tournament_id
+        self.config = config
+        self.clock = clock
+        self.level_ends = list(itertools.accumulate(level.duration for level in config.levels))[:-1] # seconds from the start
+        self.started_at: float = None
+
+        self.entrants: list[str] = []
+        self.tables: dict[str:HoldemTable] = {}
+        self.counts: dict[str:int] = {} # of the form {table_id: players}
+        self.buckets: list[dict] = [{} for _ in range(config.table_size + 1)] # buckets[count] is an ordered set of table ids
+        self.breaking: str = None # table to break when its hand ends
+        self.places: dict[str:int] = {} # of the form {user_id: finishing place}
+        self.remaining: int = 0
+        self.moves: int = 0
+
+    """ Setup """
+
+    def register(self, user_id: str):
+        if self.started_at != None:
+            raise TournamentError('registration is closed')
+        if user_id in self.places or user_id in self.entrants:
+            raise TournamentError(f'{user_id} is already registered')
+        self.entrants.append(user_id)
+
+    def start(self):
+        """ Seats the entrants at random, on as few tables as possible, with at most one player difference. """
+        if len(self.entrants) < 2:
+            raise TournamentError('a tournament needs at least two entrants')
+        self.started_at = self.clock()
+        entrants = list(self.entrants)
+        random.Random(self.config.seed).shuffle(entrants)
+        num_tables = math.ceil(len(entrants) / self.config.table_size)
+        for index in range(num_tables):
+            self.add_table(f'{self.tournament_id}:{index + 1}')
+        table_ids = list(self.tables)
+        for index, user_id in enumerate(entrants):
+            table = self.tables[table_ids[index % num_tables]]
+            table.add_player(user_id, index // num_tables + 1, self.config.starting_chips)
+        for table_id, table in self.tables.items():
+            self.set_count(table_id, len(table.players))
+        self.remaining = len(entrants)
+
+    def add_table(self, table_id: str):
+        level = self.get_level()
+        config = HoldemTableConfig(level.small_blind, level.ante, 0, self.config.starting_chips * len(self.entrants), self.config.table_size, self.config.reuse_round)
+        self.tables[table_id] = HoldemTable(table_id, config)
+        self.counts[table_id] = 0
+        self.buckets[0][table_id] = None
+
+    def remove_table(self, table_id: str):
+        del self.tables[table_id]
+        del self.buckets[self.counts.pop(table_id)][table_id]
+        if self.breaking == table_id:
+            self.breaking = None
+
+    def set_count(self, table_id: str, count: int):
+        del self.buckets[self.counts[table_id]][table_id]
+        self.counts[table_id] = count
+        self.buckets[count][table_id] = None
+
+    """ Levels """
+
+    def get_level_index(self) -> int:
+        if self.started_at == None:
+            return 0
+        return bisect.bisect_right(self.level_ends, self.clock() - self.started_at)
+
+    def get_level(self) -> BlindLevel:
+        return self.config.levels[self.get_level_index()]
+
+    """ Hands """
+
+    def is_between_hands(self, table_id: str) -> bool:
+        round = self.tables[table_id].round
+        return round == None or round.stage == HoldemRoundStage.ENDED
+
+    def start_hand(self, table_id: str) -> bool:
+        """ Starts a new round at the table with the current level's blinds. Returns False if it can't start. """
+        table = self.tables.get(table_id)
+        if table == None or self.is_finished() or not self.is_between_hands(table_id) or len(table.players) < 2:
+            return False
+        level = self.get_level()
+        table.config.small_blind = level.small_blind
+        table.config.ante = level.ante
+        table.start_new_round()
+        return True
+
+    def end_hands(self, table_ids: list[str]) -> list[TableMove]:
+        """ Eliminates the busted players of tables whose hands ended, then balances the tables.
+        Returns the moves made, the ended tables and the destinations of moves can start their next hands.
+        """
+        ended = [table_id for table_id in table_ids if table_id in self.tables and self.is_between_hands(table_id)]
+        for table_id in ended:
+            self.eliminate_players(table_id)
+        if self.is_finished():
+            return []
+        return self.apply_moves(self.plan_moves(ended))
+
+    def end_hand(self, table_id: str) -> list[TableMove]:
+        return self.end_hands([table_id])
+
+    def eliminate_players(self, table_id: str):
+        """ Removes the players left without chips. Players busted in the same hand are placed by their chips at its start. """
+        table = self.tables[table_id]
+        for player in table.players:
+            player.sync_chips()
+        busted = [player for player in table.players if player.chips == 0]
+        if not busted:
+            return
+        starting_chips = table.round.starting_chips if table.round != None else {}
+        busted.sort(key=lambda player: (starting_chips.get(player.sit, 0), -player.sit))
+        for player in busted:
+            self.places[player.id] = self.remaining
+            self.remaining -= 1
+            table.remove_player(player)
+        if len(table.players) == 0:
+            self.remove_table(table_id)
+        else:
+            self.set_count(table_id, len(table.players))
+        if self.remaining == 1:
+            winner = next(player for table in self.tables.values() for player in table.players)
+            self.places[winner.id] = 1
+
+    """ Balancing """
+
+    def get_shortest_table(self, exclude: str = None) -> str:
+        """ Returns a table with the fewest players, other than exclude and the table being broken. """
+        for bucket in self.buckets:
+            for table_id in bucket:
+                if table_id != exclude and table_id != self.breaking:
+                    return table_id
+
+    def plan_moves(self, ended: list[str]) -> list[tuple]:
+        """ Returns the moves (user_id, from_table, to_table) that balance the tables, players are only moved from ended tables.
+        The counts are updated as the moves are planned, apply_moves makes them at the tables.
+        """
+        if self.breaking == None and len(self.tables) > math.ceil(self.remaining / self.config.table_size):
+            self.breaking = self.get_shortest_table()
+        if self.breaking != None and self.breaking not in ended and self.is_between_hands(self.breaking):
+            ended = list(ended) + [self.breaking]
+
+        moves = []
+        for table_id in ended:
+            if table_id not in self.tables:
+                continue
+            leaving = sorted(self.tables[table_id].players, key=lambda player: -player.sit)
+            while leaving:
+                to_table = self.get_shortest_table(table_id)
+                if to_table == None:
+                    break
+                if table_id != self.breaking and self.counts[table_id] - self.counts[to_table] < 2:
+                    break
+                moves.append((leaving.pop(0).id, table_id, to_table))
+                self.set_count(table_id, self.counts[table_id] - 1)
+                self.set_count(to_table, self.counts[to_table] + 1)
+        return moves
+
+    def apply_moves(self, moves: list[tuple]) -> list[TableMove]:
+        """ Moves the players of planned moves as a batch, and removes the tables left empty. """
+        applied = []
+        for user_id, from_table, to_table in moves:
+            source, destination = self.tables[from_table], self.tables[to_table]
+            player = source.get_player_by_id(user_id)
+            player.sync_chips()
+            source.remove_player(player)
+            taken = {p.sit for p in destination.players}
+            sit = next(sit for sit in range(1, self.config.table_size + 1) if sit not in taken)
+            destination.add_player(user_id, sit, player.chips)
+            applied.append(TableMove(user_id, from_table, to_table, sit, player.chips))
+        for table_id in {move.from_table for move in applied}:
+            if len(self.tables[table_id].players) == 0:
+                self.remove_table(table_id)
+        self.moves += len(applied)
+        return applied
+
+    """ State """
+
+    def is_finished(self) -> bool:
+        return self.started_at != None and self.remaining <= 1
+
+    def get_standings(self) -> list[tuple]:
+        """ Returns [(user_id, chips or place), ...] of the players still in, by chips, then the eliminated by place. """
+        playing = sorted(((player.id, player.chips) for table in self.tables.values() for player in table.players), key=lambda item: -item[1])
+        eliminated = sorted(((user_id, place) for user_id, place in self.places.items() if place > 1), key=lambda item: item[1])
+        return playing + eliminated
+
+    def get_stats(self) -> dict:
+        counts = [count for count, bucket in enumerate(self.buckets) for _ in bucket]
+        return {
+            'entrants': len(self.entrants),
+            'remaining': self.remaining,
+            'tables': len(self.tables),
+            'level': self.get_level_index() + 1,
+            'min_table': min(counts, default=0),
+            'max_table': max(counts, default=0),
+            'moves': self.moves,
+        }
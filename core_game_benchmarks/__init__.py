@@ -0,0 +1,6 @@
+""" Benchmarks of the core_game hot paths.
+
+Run from the repository root:
+    python -m core_game_benchmarks run -o results.json
+    python -m core_game_benchmarks compare baseline.json results.json
+"""
@@ -0,0 +1,49 @@
+import argparse
+import sys
+
+from .runner import (
+    compare_results,
+    format_comparison,
+    format_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+from .scenarios import PLAYER_COUNTS, SCENARIOS
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m core_game_benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run benchmarks')
+    run_parser.add_argument('-o', '--output', help='save results as json')
+    run_parser.add_argument('-b', '--baseline', help='compare the results to a baseline json')
+    run_parser.add_argument('-s', '--scenario', action='append', choices=list(SCENARIOS), help='scenarios to run (default: all)')
+    run_parser.add_argument('-p', '--players', type=int, nargs='+', default=PLAYER_COUNTS)
+    run_parser.add_argument('-r', '--repeat', type=int, default=5)
+    run_parser.add_argument('-t', '--threshold', type=float, default=0.1)
+
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run_benchmarks(args.scenario, tuple(args.players), args.repeat)
+        print(format_results(results))
+        if args.output:
+            save_results(results, args.output)
+        if not args.baseline:
+            return 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline = load_results(args.baseline)
+        results = load_results(args.current)
+
+    comparison = compare_results(baseline, results, args.threshold)
+    print(format_comparison(comparison))
+    return 1 if any(c['regression'] for c in comparison) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+""" Running benchmark scenarios, saving results as json and comparing them to a baseline. """
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from time import perf_counter_ns
+
+from .scenarios import PLAYER_COUNTS, PLAYER_INDEPENDENT, SCENARIOS
+
+def measure(setup, run, number: int, repeat: int) -> list[float]:
+    """ Returns repeat samples of the mean time of a run call, in nanoseconds. """
+    samples = []
+    for _ in range(repeat):
+        states = [setup() for _ in range(number)]
+        start = perf_counter_ns()
+        for state in states:
+            run(state)
+        samples.append((perf_counter_ns() - start) / number)
+    return samples
+
+def run_benchmarks(names: list[str] = None, player_counts: tuple = PLAYER_COUNTS, repeat: int = 5) -> dict:
+    """ Runs the scenarios in names (all by default) for every player count.
+
+    Returns {'meta': {...}, 'results': {'scenario[players=n]': {'median_ns': float, ...}}}
+    """
+    results = {}
+    for name in names or SCENARIOS:
+        scenario, number = SCENARIOS[name]
+        for num_players in player_counts[:1] if name in PLAYER_INDEPENDENT else player_counts:
+            setup, run = scenario(num_players)
+            # the engine prints while it runs, which would dominate the output.
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(setup()) # warm up
+                samples = measure(setup, run, number, repeat)
+            key = name if name in PLAYER_INDEPENDENT else f'{name}[players={num_players}]'
+            results[key] = {
+                'median_ns': statistics.median(samples),
+                'min_ns': min(samples),
+                'mean_ns': statistics.mean(samples),
+                'ops_per_second': 1e9 / statistics.median(samples),
+                'number': number,
+                'repeat': repeat,
+            }
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+def save_results(results: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    """ Compares the medians of the benchmarks present in both results.
+
+    A benchmark is a regression if it got slower by more than threshold (0.1 is 10%).
+    Returns [{'name', 'baseline_ns', 'current_ns', 'ratio', 'regression'}, ...]
+    """
+    comparison = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        baseline_ns = baseline['results'][name]['median_ns']
+        ratio = result['median_ns'] / baseline_ns
+        comparison.append({
+            'name': name,
+            'baseline_ns': baseline_ns,
+            'current_ns': result['median_ns'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold,
+        })
+    return comparison
+
+def format_results(results: dict) -> str:
+    lines = [f"{'benchmark':<45}{'median':>14}{'ops/s':>14}"]
+    for name, result in results['results'].items():
+        lines.append(f"{name:<45}{result['median_ns'] / 1000:>12.2f}us{result['ops_per_second']:>14.0f}")
+    return '\n'.join(lines)
+
+def format_comparison(comparison: list[dict]) -> str:
+    lines = [f"{'benchmark':<45}{'baseline':>14}{'current':>14}{'change':>10}"]
+    for c in comparison:
+        flag = '  REGRESSION' if c['regression'] else ''
+        lines.append(
+            f"{c['name']:<45}{c['baseline_ns'] / 1000:>12.2f}us{c['current_ns'] / 1000:>12.2f}us{c['ratio'] - 1:>+10.1%}{flag}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,167 @@
+""" Benchmark scenarios.
+
+A scenario is a function of the number of players that returns (setup, run):
+setup() builds a fresh state, and run(state) executes the measured code once on it.
+Only run is timed.
+"""
+
+import os
+import subprocess
+import sys
+
+from core_game.holdem_round import (
+    Bet,
+    CardDeck,
+    HoldemRound,
+    HoldemRoundConfig,
+    HoldemRoundPlayer,
+    HoldemRoundStage,
+    LogEntry,
+)
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+
+SMALL_BLIND = 5
+CHIPS = 1000
+
+def make_round(num_players: int, chips: int = CHIPS) -> HoldemRound:
+    players = [HoldemRoundPlayer(sit, chips) for sit in range(1, num_players + 1)]
+    return HoldemRound(HoldemRoundConfig(SMALL_BLIND, 0), players, players[0])
+
+def make_started_round(num_players: int) -> HoldemRound:
+    round = make_round(num_players)
+    round.start()
+    return round
+
+def make_table(num_players: int, reuse_round: bool = False) -> HoldemTable:
+    table = HoldemTable('bench', HoldemTableConfig(SMALL_BLIND, 0, 100, 10 * CHIPS, 9, reuse_round))
+    for sit in range(1, num_players + 1):
+        table.add_player(f'player_{sit}', sit, CHIPS)
+    return table
+
+def passive_request(round: HoldemRound) -> dict:
+    """ A call or check request for the player to move. """
+    allowed_moves = round.get_allowed_moves(round.to_move)
+    action = 'call' if 'call' in allowed_moves['moves'] else 'check'
+    return {'sit': round.to_move.sit, 'action': action, 'call_amount': allowed_moves['call_amount'], 'raise_amount': 0}
+
+def card_deck(num_players: int):
+    return (lambda: None), (lambda state: CardDeck())
+
+def deal_cards(num_players: int):
+    return (lambda: make_round(num_players)), (lambda round: round.deal_cards())
+
+def get_allowed_moves(num_players: int, num_bets: int):
+    def setup():
+        round = make_started_round(num_players)
+        bets = round.bets[HoldemRoundStage.PREFLOP.value]
+        sits = [p.sit for p in round.players]
+        while len(bets) < num_bets:
+            # alternating minimal raises, as many as num_bets, between the other players.
+            # the log gets them too, the betting rules read the stage's actions from it.
+            sit = sits[1 + len(bets) % (num_players - 1)]
+            bets.append(Bet(sit, 'raise', 0, 2 * SMALL_BLIND))
+            round.log.append(LogEntry(sit, 'raise', 0, 2 * SMALL_BLIND, HoldemRoundStage.PREFLOP.value))
+        return round
+    return setup, (lambda round: round.get_allowed_moves(round.to_move))
+
+def get_allowed_moves_factory(num_bets: int):
+    return lambda num_players: get_allowed_moves(num_players, num_bets)
+
+def process_game_request(num_players: int):
+    def setup():
+        round = make_started_round(num_players)
+        return round, passive_request(round)
+    return setup, (lambda state: state[0].process_game_request(state[1]))
+
+def make_pots(num_players: int):
+    def setup():
+        # every player all in preflop, with a different stack.
+        round = make_round(num_players)
+        for p in round.players:
+            round.bets[HoldemRoundStage.PREFLOP.value].append(Bet(p.sit, 'raise', 0, 100 * p.sit))
+            p.chips = 0
+        return round
+    return setup, (lambda round: round.make_pots())
+
+def determine_pots_winners(num_players: int):
+    def setup():
+        round = make_started_round(num_players)
+        round.community_cards = [round.deck.pop() for _ in range(5)]
+        round.stage = HoldemRoundStage.SHOWDOWN
+        round.pots = {2 * SMALL_BLIND: {'pot': 2 * SMALL_BLIND * num_players, 'players': list(round.players)}}
+        return round
+    return setup, (lambda round: round.determine_pots_winners())
+
+def get_table_view(num_players: int):
+    def setup():
+        table = make_table(num_players)
+        table.start_new_round()
+        table.round.start()
+        return table, table.players[0]
+    return setup, (lambda state: state[0].get_table_view(state[1]))
+
+def full_hand(num_players: int, reuse_round: bool = False):
+    """ A hand through HoldemTable where every player calls or checks to showdown. """
+    def run(table):
+        table.start_new_round()
+        round = table.round
+        round.start()
+        while round.stage != HoldemRoundStage.ENDED:
+            request = passive_request(round)
+            table.request_handler({'type': 'move_request', 'data': request})
+            round.start_next_move()
+            if round.stage in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+                round.finish()
+    def setup():
+        table = make_table(num_players, reuse_round)
+        if reuse_round:
+            run(table) # so the next hand reuses the round
+        return table
+    return setup, run
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START_CODE = {
+    'import': 'import core_game.holdem_round',
+    'showdown': (
+        'from core_game.holdem_round import HoldemRoundPlayer, HoldemRound, HoldemRoundConfig\n'
+        'players = [HoldemRoundPlayer(1, 100), HoldemRoundPlayer(2, 100)]\n'
+        'round = HoldemRound(HoldemRoundConfig(5, 0), players, players[0])\n'
+        'round.start()\n'
+        'round.community_cards = [round.deck.pop() for _ in range(5)]\n'
+        'round.get_hand_rank_name(players[0])\n'
+    ),
+}
+
+def cold_start(what: str):
+    """ A new python process that imports the engine (and evaluates a first hand, for 'showdown'). """
+    command = [sys.executable, '-c', COLD_START_CODE[what]]
+    return (lambda: None), (lambda state: subprocess.run(command, cwd=REPOSITORY_ROOT, check=True))
+
+def python_startup(num_players: int):
+    """ A new python process that does nothing, the baseline of the cold start scenarios. """
+    command = [sys.executable, '-c', 'pass']
+    return (lambda: None), (lambda state: subprocess.run(command, check=True))
+
+# name: (scenario, number of calls per sample)
+SCENARIOS = {
+    'card_deck': (card_deck, 1000),
+    'deal_cards': (deal_cards, 1000),
+    'get_allowed_moves[bets=2]': (get_allowed_moves_factory(2), 1000),
+    'get_allowed_moves[bets=8]': (get_allowed_moves_factory(8), 1000),
+    'get_allowed_moves[bets=32]': (get_allowed_moves_factory(32), 1000),
+    'process_game_request': (process_game_request, 1000),
+    'make_pots': (make_pots, 1000),
+    'determine_pots_winners': (determine_pots_winners, 20),
+    'get_table_view': (get_table_view, 1000),
+    'full_hand': (full_hand, 10),
+    'full_hand[reuse_round]': (lambda num_players: full_hand(num_players, reuse_round=True), 10),
+    'python_startup': (python_startup, 5),
+    'cold_start_import': (lambda num_players: cold_start('import'), 5),
+    'cold_start_showdown': (lambda num_players: cold_start('showdown'), 5),
+}
+
+# scenarios that don't depend on the number of players, these run once.
+PLAYER_INDEPENDENT = {'card_deck', 'python_startup', 'cold_start_import', 'cold_start_showdown'}
+
+PLAYER_COUNTS = (2, 6, 9)
@@ -0,0 +1,25 @@
+""" Fixtures shared by the test modules. """
+
+from core_game.holdem_round import (
+    HoldemRoundPlayer,
+    HoldemRound,
+    HoldemRoundConfig,
+    HoldemRoundStage,
+)
+from core_game.holdem_replay import apply_action
+
+def start_hand():
+    """ A started heads up round, sit 1 (1000 chips) is the small blind, sit 2 (500 chips) the big blind. """
+    p1 = HoldemRoundPlayer(1,1000,[])
+    p2 = HoldemRoundPlayer(2,500,[])
+    game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2],p1)
+    game.start()
+    return game
+
+def play_checked_down_hand():
+    """ The small blind calls, then both players check to the end. """
+    game = start_hand()
+    apply_action(game, {'sit':1, 'action':'call', 'call_amount':5, 'raise_amount':0})
+    while game.stage != HoldemRoundStage.ENDED:
+        apply_action(game, {'sit':game.to_move.sit, 'action':'check', 'call_amount':0, 'raise_amount':0})
+    return game
@@ -0,0 +1,88 @@
+import unittest
+from unittest import mock
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game import instrumentation
+from core_game.holdem_round import HoldemRound, HoldemRoundStage
+from core_game.holdem_table import HoldemTable, HoldemTableConfig, process_table_requests
+
+def sit_request(user_id, sit, chips):
+    return {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': 'table_1', 'type': 'join', 'sit': sit, 'chips': chips}}
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+def view_request(user_id):
+    return {'type': 'table_view_request', 'data': {'user_id': user_id}}
+
+def make_started_table(table_id='table_1'):
+    table = HoldemTable(table_id, HoldemTableConfig(5,0,100,1000,9))
+    table.process_requests([sit_request('p1', 1, 200), sit_request('p2', 2, 300)])
+    table.start_new_round()
+    table.round.start()
+    return table
+
+class TestProcessRequests(unittest.TestCase):
+    def test_same_responses_as_request_handler(self):
+        requests = [move_request(2, 'check'), move_request(1, 'call', 5), move_request(1, 'fold'), view_request('p2'), view_request('nobody')]
+        table = make_started_table()
+        other_table = make_started_table()
+        other_table.round.players[0].cards = table.round.players[0].cards
+        other_table.round.players[1].cards = table.round.players[1].cards
+        other_table.round.deck = table.round.deck
+        self.assertEqual(table.process_requests(requests), [other_table.request_handler(r) for r in requests])
+
+    def test_state_is_computed_once_per_change(self):
+        table = make_started_table()
+        requests = [move_request(1, 'check'), move_request(1, 'call', 4), view_request('p1'), view_request('p2'), move_request(1, 'call', 5), view_request('p1')]
+        with mock.patch.object(HoldemRound, 'get_allowed_moves', autospec=True, side_effect=HoldemRound.get_allowed_moves) as get_allowed_moves:
+            with mock.patch.object(HoldemTable, 'get_shared_view_data', autospec=True, side_effect=HoldemTable.get_shared_view_data) as get_shared_view_data:
+                responses = table.process_requests(requests)
+        self.assertEqual([r.get('success') for r in responses], [False, False, None, None, True, None])
+        # p1 before the call, p2 before it, p1 after it.
+        self.assertEqual(get_allowed_moves.call_count, 3)
+        self.assertEqual(get_shared_view_data.call_count, 2)
+        self.assertIs(responses[2]['data']['shared_data'], responses[3]['data']['shared_data'])
+        self.assertEqual(responses[5], table.get_table_view(table.get_player_by_id('p1')))
+
+    def test_with_instrumentation(self):
+        instrumentation.metrics.reset()
+        instrumentation.enable()
+        try:
+            responses = make_started_table().process_requests([move_request(2, 'check'), move_request(1, 'call', 5), move_request(2, 'check')], advance_round=True)
+        finally:
+            instrumentation.disable()
+        self.assertEqual([r['success'] for r in responses], [False, True, True])
+        snapshot = instrumentation.metrics.snapshot()
+        self.assertEqual(snapshot['latency']['HoldemRound.process_game_request']['count'], 3)
+        self.assertEqual(snapshot['rejected_moves'], {'not_to_move': 1})
+
+    def test_sit_requests_update_lookups(self):
+        table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9))
+        responses = table.process_requests([view_request('p1'), sit_request('p1', 1, 200), view_request('p1')])
+        self.assertEqual(responses[0]['data']['personal_data'], {})
+        self.assertEqual(responses[2]['data']['shared_data']['players'][0]['user_id'], 'p1')
+
+    def test_stop_on_rejection(self):
+        table = make_started_table()
+        responses = table.process_requests([move_request(2, 'check'), move_request(1, 'call', 5)], stop_on_rejection=True)
+        self.assertEqual(responses, [{'type': 'move_response', 'success': False}])
+
+    def test_advance_round(self):
+        table = make_started_table()
+        requests = [move_request(1, 'call', 5)] + [move_request(sit, 'check') for sit in (2, 1, 2, 1, 2, 1, 2)]
+        responses = table.process_requests(requests, stop_on_rejection=True, advance_round=True)
+        self.assertTrue(all(r['success'] for r in responses))
+        self.assertEqual(table.round.stage, HoldemRoundStage.ENDED)
+        self.assertEqual(sum(p.chips for p in table.round.players), 500)
+
+    def test_many_tables(self):
+        tables = {'t1': make_started_table('t1'), 't2': make_started_table('t2')}
+        responses = process_table_requests(tables, {'t1': [move_request(1, 'fold')], 't2': [move_request(2, 'fold')]})
+        self.assertEqual([r['success'] for r in responses['t1']], [True])
+        self.assertEqual([r['success'] for r in responses['t2']], [False])
+
+if __name__ == '__main__':
+    unittest.main()
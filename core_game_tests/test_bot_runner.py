@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import HoldemRoundStage
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.bot_runner import BotRunner, CheckCallPolicy, RandomPolicy
+
+class RecordingPolicy(CheckCallPolicy):
+    def __init__(self):
+        self.batches = []
+
+    async def decide(self, decisions):
+        self.batches.append(decisions)
+        return super().decide(decisions)
+
+class FoldPolicy:
+    def decide(self, decisions):
+        return [{'action': 'fold', 'call_amount': 0, 'raise_amount': 0} for _ in decisions]
+
+class SlowPolicy:
+    async def decide(self, decisions):
+        await asyncio.sleep(1)
+        return [{'action': 'fold'} for _ in decisions]
+
+class InvalidPolicy:
+    def decide(self, decisions):
+        return [{'action': 'raise', 'call_amount': 0, 'raise_amount': 10**9} for _ in decisions]
+
+def make_runner(num_tables, policy, **kwargs):
+    runner = BotRunner(**kwargs)
+    for t in range(num_tables):
+        table = HoldemTable(f'table_{t}', HoldemTableConfig(5,0,100,1000,9))
+        runner.add_table(table)
+        for sit in (1, 2, 3):
+            runner.seat_bot(table.table_id, f'bot_{t}_{sit}', sit, 500, policy)
+    return runner
+
+def start_rounds(runner):
+    for table in runner.tables.values():
+        table.start_new_round()
+        table.round.start()
+        runner.notify(table.table_id)
+
+class TestBotRunner(unittest.TestCase):
+    def test_bots_play_hands_to_the_end(self):
+        runner = make_runner(3, CheckCallPolicy())
+        start_rounds(runner)
+        asyncio.run(runner.run_until_idle())
+        for table in runner.tables.values():
+            self.assertEqual(table.round.stage, HoldemRoundStage.ENDED)
+            self.assertEqual(sum(p.chips for p in table.round.players), 1500)
+        self.assertEqual(runner.get_stats()['fallbacks'], 0)
+
+    def test_decisions_are_batched_across_tables(self):
+        policy = RecordingPolicy()
+        runner = make_runner(10, policy)
+        start_rounds(runner)
+        asyncio.run(runner.step())
+        self.assertEqual(len(policy.batches), 1)
+        self.assertEqual(sorted(d.table_id for d in policy.batches[0]), sorted(runner.tables))
+        decision = policy.batches[0][0]
+        self.assertEqual(decision.view['data']['personal_data']['sit'], decision.sit)
+        self.assertIn('call', decision.view['data']['personal_data']['allowed_moves']['moves'])
+
+    def test_deadline(self):
+        runner = make_runner(2, SlowPolicy(), deadline=0.01)
+        start_rounds(runner)
+        asyncio.run(runner.step())
+        stats = runner.get_stats()
+        self.assertEqual((stats['timeouts'], stats['fallbacks'], stats['decisions']), (2, 2, 2))
+        for table in runner.tables.values():
+            self.assertTrue(table.round.players[0].folded) # couldn't check facing the big blind
+
+    def test_invalid_reply_falls_back(self):
+        runner = make_runner(1, InvalidPolicy())
+        start_rounds(runner)
+        asyncio.run(runner.run_until_idle())
+        self.assertEqual(runner.tables['table_0'].round.stage, HoldemRoundStage.ENDED)
+        self.assertEqual(runner.get_stats()['fallbacks'], runner.get_stats()['decisions'])
+
+    def test_human_seats_are_not_played(self):
+        runner = make_runner(1, CheckCallPolicy())
+        runner.detach('table_0', 'bot_0_1')
+        start_rounds(runner)
+        self.assertEqual(asyncio.run(runner.run_until_idle()), 0)
+        self.assertEqual(runner.tables['table_0'].round.to_move.sit, 1)
+
+    def test_reused_round_is_played_every_hand(self):
+        # the bot folds first to act in the first and third hands, the human in the second.
+        runner = BotRunner()
+        table = HoldemTable('table_0', HoldemTableConfig(5,0,100,1000,9, reuse_round=True))
+        runner.add_table(table)
+        for sit in (1, 2):
+            runner.seat_bot(table.table_id, f'bot_{sit}', sit, 500, FoldPolicy())
+        bot_sit = table.players[0].sit
+        runner.detach(table.table_id, table.players[1].id)
+        round = table.round
+        for hand in range(3):
+            table.start_new_round()
+            table.round.start()
+            self.assertTrue(round == None or table.round is round)
+            round = table.round
+            if round.to_move.sit != bot_sit:
+                table.process_requests([{'type': 'move_request', 'data': {'sit': round.to_move.sit, 'action': 'fold', 'call_amount': 0, 'raise_amount': 0}}], advance_round=True)
+            runner.notify(table.table_id)
+            asyncio.run(runner.run_until_idle())
+            self.assertEqual(round.stage, HoldemRoundStage.ENDED, f'hand {hand}')
+        self.assertEqual(runner.get_stats()['decisions'], 2)
+
+    def test_run_with_auto_start(self):
+        runner = make_runner(4, RandomPolicy(seed=1), auto_start_rounds=True)
+        asyncio.run(runner.run(max_decisions=200))
+        stats = runner.get_stats()
+        self.assertGreaterEqual(stats['decisions'], 200)
+        self.assertGreater(stats['decisions_per_second'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import dataclasses
+import tempfile
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import numpy as np
+
+from core_game.bot_runner import BotRunner
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.cfr_solver import DECISION, CFRSolver, SolverConfig, SolverPolicy, build_tree, get_hand_class
+
+CONFIG = SolverConfig(stack=10, small_blind=1, raise_sizes=(1.0,), max_raises=1, buckets=(4, 3, 3, 3), deals=300, bucket_samples=8, batch_size=200)
+
+class TestCFRSolver(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.solver = CFRSolver(CONFIG)
+        cls.solver.train(30)
+
+    def test_hand_classes(self):
+        classes = {get_hand_class(card1, card2) for card1 in range(52) for card2 in range(card1 + 1, 52)}
+        self.assertEqual(classes, set(range(169)))
+
+    def test_tree_follows_the_engine(self):
+        tree = build_tree(CONFIG)
+        # the small blind folds, calls, raises the pot (4 after calling) or goes all in.
+        self.assertEqual(tree.get_actions(0), [('fold', 0, 0), ('call', 1, 0), ('raise', 1, 4), ('raise', 1, 8)])
+        for node in range(len(tree)):
+            if tree.kind[node] == DECISION:
+                self.assertGreaterEqual(tree.num_actions[node], 2)
+            else:
+                self.assertTrue(all(0 <= chips <= CONFIG.stack for chips in tree.invested[node]))
+        self.assertEqual(tree.size, sum(CONFIG.buckets[tree.street[n]] * tree.num_actions[n] for n in range(len(tree)) if tree.kind[n] == DECISION))
+
+    def test_stronger_hands_fold_less(self):
+        weakest, strongest = (self.solver.get_average_strategy(0, bucket) for bucket in (0, CONFIG.buckets[0] - 1))
+        self.assertGreater(weakest[0], strongest[0])
+        self.assertAlmostEqual(float(strongest.sum()), 1.0)
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as path:
+            solver = CFRSolver(CONFIG, path)
+            solver.train(3)
+            del solver
+            resumed = CFRSolver(CONFIG, path)
+            self.assertEqual(resumed.iterations, 3)
+            resumed.train(3)
+
+            straight = CFRSolver(CONFIG)
+            straight.train(6)
+            self.assertTrue(np.allclose(resumed.regrets, straight.regrets))
+            self.assertTrue(np.allclose(resumed.strategy_sums, straight.strategy_sums))
+            del resumed
+
+            self.assertRaises(ValueError, CFRSolver, dataclasses.replace(CONFIG, seed=1), path)
+
+    def test_iterations_after_a_checkpoint_are_not_saved(self):
+        with tempfile.TemporaryDirectory() as path:
+            solver = CFRSolver(CONFIG, path)
+            solver.train(2)
+            regrets = solver.regrets.copy()
+            for _ in range(2):
+                solver.iterate() # as if the process stopped before the next checkpoint
+            del solver
+            resumed = CFRSolver(CONFIG, path)
+            self.assertEqual(resumed.iterations, 2)
+            self.assertTrue(np.array_equal(resumed.regrets, regrets))
+
+    def test_bots_play_the_strategy(self):
+        runner = BotRunner(auto_start_rounds=True)
+        table = HoldemTable('table_1', HoldemTableConfig(1, 0, 10, 10, 2))
+        runner.add_table(table)
+        policy = SolverPolicy(self.solver, runner.tables, seed=0)
+        runner.seat_bot('table_1', 'bot_1', 1, 10, policy)
+        runner.seat_bot('table_1', 'bot_2', 2, 10, policy)
+        self.assertGreater(asyncio.run(runner.run_until_idle(max_decisions=40)), 0)
+        self.assertEqual(runner.get_stats()['fallbacks'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import CardDeck, HoldemRound, HoldemRoundConfig, HoldemRoundPlayer, HoldemRoundStage
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.chip_ledger import ChipLedger, LedgerError, ReconciliationError, pot_account, seat_account
+
+def sit_request(user_id, sit, chips, type='join'):
+    return {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': 'table_1', 'type': type, 'sit': sit, 'chips': chips}}
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+def play_to_the_end(table):
+    """ Checks or calls every move of table's round. """
+    round = table.round
+    while round.stage != HoldemRoundStage.ENDED:
+        allowed_moves = round.get_allowed_moves(round.to_move)
+        if 'check' in allowed_moves['moves']:
+            request = move_request(round.to_move.sit, 'check')
+        else:
+            request = move_request(round.to_move.sit, 'call', allowed_moves['call_amount'])
+        table.process_requests([request], advance_round=True)
+
+class TestRake(unittest.TestCase):
+    def make_round(self, rake_rate, rake_cap):
+        players = [HoldemRoundPlayer(sit, 100) for sit in (1, 2)]
+        deck = CardDeck(['Ah', 'Kh', 'Qs', 'Qc'] + [card for card in CardDeck.full_deck if card not in ('Ah', 'Kh', 'Qs', 'Qc')])
+        return HoldemRound(HoldemRoundConfig(5, 0, rake_rate, rake_cap), players, players[0], deck=deck)
+
+    def test_no_flop_no_rake(self):
+        round = self.make_round(0.05, 0)
+        round.start()
+        round.process_game_request(move_request(1, 'fold')['data'])
+        round.start_next_move()
+        round.finish()
+        self.assertEqual(round.rake, 0)
+        self.assertEqual(sum(p.chips for p in round.players), 200)
+
+    def test_rake_is_capped(self):
+        for rake_cap, rake in ((0, 10), (3, 3)):
+            round = self.make_round(0.05, rake_cap)
+            round.start()
+            while round.stage not in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+                allowed_moves = round.get_allowed_moves(round.to_move)
+                if 'raise' in allowed_moves['moves']:
+                    request = move_request(round.to_move.sit, 'raise', allowed_moves['call_amount'], allowed_moves['max_raise_amount'])
+                elif 'check' in allowed_moves['moves']:
+                    request = move_request(round.to_move.sit, 'check')
+                else:
+                    request = move_request(round.to_move.sit, 'call', allowed_moves['call_amount'])
+                self.assertTrue(round.process_game_request(request['data'])['success'])
+                round.start_next_move()
+            round.finish()
+            self.assertEqual(round.rake, rake)
+            self.assertEqual(sum(p.chips for p in round.players), 200 - rake)
+            self.assertEqual(sum(round.awards.values()), 200 - rake)
+
+    def test_uncalled_bet_is_not_raked(self):
+        players = [HoldemRoundPlayer(1, 1000), HoldemRoundPlayer(2, 100)]
+        round = HoldemRound(HoldemRoundConfig(5, 0, 0.1, 0), players, players[0])
+        round.start()
+        # limped and checked preflop, player 1 bets the rest of their stack on the flop and player 2 folds.
+        for request in (move_request(1, 'call', 5), move_request(2, 'check'), move_request(1, 'raise', 0, 990), move_request(2, 'fold')):
+            self.assertTrue(round.process_game_request(request['data'])['success'])
+            round.start_next_move()
+        round.finish()
+        self.assertEqual(round.rake, 2)
+        self.assertEqual(round.awards, {1: 1008})
+        self.assertEqual(players[0].chips, 1008)
+
+class TestChipLedger(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'ledger.db')
+        self.ledger = ChipLedger(self.path)
+        for user_id in ('user_1', 'user_2', 'user_3'):
+            self.ledger.deposit(user_id, 1000)
+        self.table = HoldemTable('table_1', HoldemTableConfig(5, 0, 100, 1000, 9, rake_rate=0.05, rake_cap=10), ledger=self.ledger)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def test_buy_in_needs_the_chips(self):
+        self.assertFalse(self.table.request_handler(sit_request('user_1', 1, 1500))['success'])
+        self.assertFalse(self.table.request_handler(sit_request('user_4', 1, 100))['success'])
+        self.assertTrue(self.table.request_handler(sit_request('user_1', 1, 400))['success'])
+        self.assertEqual(self.ledger.get_wallet('user_1'), 600)
+        self.assertEqual(self.ledger.get_balance(seat_account('table_1', 'user_1')), 400)
+
+    def test_rounds_reconcile_and_cash_out(self):
+        for sit, user_id in enumerate(('user_1', 'user_2', 'user_3'), 1):
+            self.table.request_handler(sit_request(user_id, sit, 500))
+        for _ in range(3):
+            self.table.start_new_round()
+            self.table.round.start()
+            play_to_the_end(self.table)
+        rake = self.table.round.rake
+        self.assertGreater(rake, 0)
+
+        response = self.table.request_handler(sit_request('user_2', 2, 0, 'leave'))
+        self.assertTrue(response['success'])
+        self.assertEqual(self.ledger.get_wallet('user_2'), 500 + response['data']['amount'])
+        self.assertEqual(self.ledger.get_balance(pot_account('table_1')), 0)
+        self.assertEqual(self.ledger.hands['table_1'], 3)
+        self.assertEqual(sum(self.ledger.balances.values()), 0)
+        self.assertLessEqual(self.ledger.get_balance('rake'), 30)
+        self.assertEqual(self.ledger.discrepancies, [])
+
+    def test_balances_are_restored(self):
+        self.table.request_handler(sit_request('user_1', 1, 300))
+        self.table.request_handler(sit_request('user_2', 2, 300))
+        self.table.start_new_round()
+        self.table.round.start()
+        play_to_the_end(self.table)
+        self.table.settle_round()
+        self.ledger.close()
+
+        ledger = ChipLedger(self.path)
+        self.assertEqual(ledger.balances, self.ledger.balances)
+        self.assertEqual(ledger.hands, {'table_1': 1})
+        kinds = [transfer.kind for transfer in ledger.get_transfers('table_1')]
+        self.assertEqual(kinds[:2], ['buy_in', 'buy_in'])
+        self.assertIn('award', kinds)
+        ledger.close()
+
+    def test_round_is_settled_when_it_ends(self):
+        self.table.request_handler(sit_request('user_1', 1, 300))
+        self.table.request_handler(sit_request('user_2', 2, 300))
+        self.table.start_new_round()
+        self.table.round.start()
+        play_to_the_end(self.table)
+        self.assertTrue(self.table.round_settled)
+        self.assertEqual(self.ledger.hands, {'table_1': 1})
+        self.assertEqual(self.ledger.get_balance(pot_account('table_1')), 0)
+
+    def test_failed_writes_are_kept(self):
+        self.ledger.retries = 1
+        self.ledger.flush()
+        connection = sqlite3.connect(self.path)
+        connection.execute("DROP TABLE transfers")
+        connection.close()
+
+        self.table.request_handler(sit_request('user_1', 1, 300))
+        self.assertRaises(sqlite3.OperationalError, self.ledger.flush)
+        self.assertEqual([transfer.kind for transfer in self.ledger.unwritten], ['buy_in'])
+        self.assertRaises(LedgerError, self.ledger.deposit, 'user_1', 100)
+        self.assertEqual(self.ledger.get_wallet('user_1'), 700)
+        self.assertRaises(sqlite3.OperationalError, self.ledger.close)
+        self.ledger = ChipLedger()
+
+    def test_discrepancy(self):
+        self.table.request_handler(sit_request('user_1', 1, 300))
+        self.table.request_handler(sit_request('user_2', 2, 300))
+        self.table.start_new_round()
+        round = self.table.round
+        round.start()
+        # played on the round directly, so the table settles it only when asked.
+        while round.stage not in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+            round.process_game_request(move_request(round.to_move.sit, 'fold')['data'])
+            round.start_next_move()
+        round.finish()
+        round.players[0].chips += 1
+        self.assertRaises(ReconciliationError, self.table.settle_round)
+        balances = dict(self.ledger.balances)
+        # the hand is recorded once, retrying doesn't post it again.
+        self.table.settle_round()
+        self.table.start_new_round()
+        self.assertEqual(self.ledger.balances, balances)
+        self.assertEqual(self.ledger.hands, {'table_1': 1})
+        self.assertEqual(self.table.round.stage, HoldemRoundStage.NOT_STARTED)
+
+        self.ledger.strict = False
+        self.ledger.report('checked')
+        self.assertEqual(len(self.ledger.discrepancies), 2)
+
+    def test_withdraw(self):
+        self.ledger.withdraw('user_1', 400)
+        self.assertEqual(self.ledger.get_wallet('user_1'), 600)
+        self.assertRaises(LedgerError, self.ledger.withdraw, 'user_1', 601)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+import subprocess
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game import hand_evaluator
+
+class TestLazyImport(unittest.TestCase):
+    def test_import_does_not_load_evaluator(self):
+        code = 'import sys, core_game.holdem_round; print(any("deuces" in m for m in sys.modules))'
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+        output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), 'False')
+
+class TestLookupTableFile(unittest.TestCase):
+    def test_build_and_load(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'lookup_table.bin')
+            built = hand_evaluator.build_lookup_table_file(path)
+            loaded = hand_evaluator.load_lookup_table(path)
+        self.assertEqual(dict(loaded.flush_lookup.items()), built.flush_lookup)
+        self.assertEqual(dict(loaded.unsuited_lookup.items()), built.unsuited_lookup)
+        self.assertNotIn(7, loaded.flush_lookup)
+        self.assertRaises(KeyError, loaded.flush_lookup.__getitem__, 7)
+
+    def test_default_path_is_outside_the_package(self):
+        package_dir = os.path.dirname(os.path.abspath(hand_evaluator.__file__))
+        self.assertFalse(os.path.abspath(hand_evaluator.LOOKUP_TABLE_PATH).startswith(package_dir))
+
+    def test_corrupt_file_raises(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'lookup_table.bin')
+            with open(path, 'wb') as f:
+                f.write(b'\0' * 25)
+            self.assertRaises(ValueError, hand_evaluator.load_lookup_table, path)
+
+class TestEvaluate(unittest.TestCase):
+    def test_evaluate(self):
+        royal_flush = hand_evaluator.evaluate(['Ah', 'Kh'], ['Qh', 'Jh', 'Th', '2c', '3d'])
+        pair = hand_evaluator.evaluate(['Ah', 'Ad'], ['Qh', 'Jc', '8h', '2c', '3d'])
+        self.assertEqual(royal_flush, 1)
+        self.assertLess(royal_flush, pair)
+        self.assertEqual(hand_evaluator.get_hand_rank_name(pair), 'Pair')
+        self.assertIs(hand_evaluator.get_evaluator(), hand_evaluator.get_evaluator())
+
+if __name__ == '__main__':
+    unittest.main()
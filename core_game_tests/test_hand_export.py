@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import (
+    HoldemRoundPlayer,
+    HoldemRound,
+    HoldemRoundConfig,
+)
+from core_game.hand_export import (
+    ACTION_CODES,
+    STAGE_CODES,
+    HandHistoryColumnWriter,
+    cards_mask,
+    load_columns,
+)
+from core_game_tests.helpers import play_checked_down_hand
+
+class TestCardsMask(unittest.TestCase):
+    def test_cards_mask(self):
+        self.assertEqual(cards_mask([]), 0)
+        self.assertEqual(cards_mask(['2h']), 1)
+        self.assertEqual(cards_mask(['As']), 1 << 51)
+        self.assertEqual(bin(cards_mask(['As','Kd','2c'])).count('1'), 3)
+
+class TestColumnWriter(unittest.TestCase):
+    def test_write_and_load_chunks(self):
+        games = [play_checked_down_hand() for _ in range(5)]
+        with tempfile.TemporaryDirectory() as d:
+            with HandHistoryColumnWriter(d, chunk_size=2) as writer:
+                for game in games:
+                    writer.add_round(game)
+            self.assertEqual(len([f for f in os.listdir(d) if f.startswith('hands_')]), 3)
+            hands = load_columns(d, 'hands')
+            actions = load_columns(d, 'actions')
+
+        self.assertEqual(list(hands['hand_id']), [0,1,2,3,4])
+        self.assertTrue(all(hands['pot'] == 20))
+        self.assertTrue(all(hands['showdown'] == 1))
+        self.assertEqual(len(actions['hand_id']), 5 * len(games[0].log))
+
+        first_hand = actions['hand_id'] == 0
+        self.assertEqual(list(actions['action'][first_hand][:3]), [ACTION_CODES['sb'], ACTION_CODES['bb'], ACTION_CODES['call']])
+        self.assertEqual(list(actions['pot'][first_hand][:3]), [5, 15, 20])
+        river = first_hand & (actions['stage'] == STAGE_CODES['river'])
+        self.assertTrue(all(actions['board_mask'][river] == cards_mask(games[0].community_cards)))
+        preflop = first_hand & (actions['stage'] == STAGE_CODES['preflop'])
+        self.assertTrue(all(actions['board_mask'][preflop] == 0))
+
+    def test_rejects_unfinished_round(self):
+        p1 = HoldemRoundPlayer(1,1000,[])
+        p2 = HoldemRoundPlayer(2,500,[])
+        game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2],p1)
+        game.start()
+        with tempfile.TemporaryDirectory() as d:
+            writer = HandHistoryColumnWriter(d)
+            self.assertRaises(AssertionError, writer.add_round, game)
+
+if __name__ == '__main__':
+    unittest.main()
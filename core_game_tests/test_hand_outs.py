@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game import hand_evaluator
+from core_game.holdem_round import HoldemRound, HoldemRoundConfig, HoldemRoundPlayer
+from core_game.hand_outs import OutsTracker, get_draws, get_outs
+
+def make_round(hands, community_cards):
+    players = [HoldemRoundPlayer(sit, 100) for sit in range(1, len(hands) + 1)]
+    round = HoldemRound(HoldemRoundConfig(5,0), players, players[0])
+    round.start()
+    for player, cards in zip(players, hands):
+        player.cards = cards
+    round.community_cards = list(community_cards)
+    return round
+
+class TestDraws(unittest.TestCase):
+    def test_draws(self):
+        self.assertEqual(get_draws(['9h','8h'], ['7h','6c','2h']), ['flush_draw', 'open_ended'])
+        self.assertEqual(get_draws(['9h','8c'], ['7h','5c','2d']), ['gutshot'])
+        self.assertEqual(get_draws(['Ah','2c'], ['3h','4c','Kd']), ['gutshot'])
+        self.assertEqual(get_draws(['5s','6s'], ['7d','8c','9h']), []) # straight made
+        self.assertEqual(get_draws(['2c','3d'], ['9h','Th','Jh','Qs']), []) # the board's draw
+
+class TestOuts(unittest.TestCase):
+    def test_flush_draw_outs(self):
+        round = make_round([['Ah','Kh'], ['Qs','Qc']], ['Qh','7h','2c','3d'])
+        outs = get_outs(round)
+        self.assertEqual(outs.leaders, (2,))
+        # 2h and 3h make a flush, but also a full house for player 2.
+        self.assertEqual(outs.outs[1], ['4h', '5h', '6h', '8h', '9h', 'Th', 'Jh'])
+        self.assertEqual(outs.outs[2], [])
+        self.assertEqual(outs.draws[1], ['flush_draw'])
+
+    def test_next_ranks_match_evaluator(self):
+        round = make_round([['Ah','Kd'], ['9c','9s'], ['8h','7h']], ['9h','6h','2c'])
+        outs = get_outs(round)
+        for player in round.players:
+            for card, rank in outs.next_ranks[player.sit].items():
+                self.assertEqual(rank, hand_evaluator.evaluate(player.cards, round.community_cards + [card]))
+        self.assertNotIn('Ah', outs.next_ranks[2])
+
+    def test_incremental_turn_equals_from_scratch(self):
+        round = make_round([['Ah','Kd'], ['9c','9s'], ['8h','7h']], ['9h','6h','2c'])
+        tracker = OutsTracker()
+        tracker.update(round)
+        round.community_cards.append('5d')
+        self.assertEqual(tracker.update(round), get_outs(round))
+
+    def test_reused_round_starts_over(self):
+        round = make_round([['Ah','Kd'], ['9c','9s']], ['9h','6h','2c'])
+        tracker = OutsTracker()
+        tracker.update(round)
+        # the next hand in the same round object, with the same flop.
+        round.players[0].cards, round.players[1].cards = ['8h','7h'], ['Ac','Ad']
+        round.community_cards = ['9h','6h','2c','5d']
+        self.assertEqual(tracker.update(round), get_outs(round))
+        self.assertEqual(tracker.results, {})
+
+    def test_results_are_bounded(self):
+        tracker = OutsTracker(max_rounds=2)
+        rounds = [make_round([['Ah','Kd'], ['9c','9s']], ['9h','6h','2c']) for _ in range(3)]
+        for round in rounds:
+            tracker.update(round)
+        self.assertEqual(list(tracker.results), [id(rounds[1]), id(rounds[2])])
+
+    def test_split_outs(self):
+        round = make_round([['Ac','Kd'], ['Ad','Qc']], ['As','9h','4c','2s'])
+        outs = get_outs(round)
+        self.assertEqual(outs.leaders, (1,))
+        self.assertEqual(sorted(outs.outs[2]), ['Qd', 'Qh', 'Qs'])
+        self.assertEqual(outs.split_outs[2], [])
+
+    def test_only_on_flop_and_turn(self):
+        round = make_round([['Ac','Kd'], ['Ad','Qc']], ['As','9h','4c','2s','3s'])
+        self.assertRaises(ValueError, get_outs, round)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+import json
+import queue
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import HoldemRoundStage
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.holdem_replay import apply_action, validate_hand_record
+from core_game.hand_retention import HandRetention, JsonLinesSink, QueueSink
+
+def make_table(retention, reuse_round=False):
+    table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9,reuse_round), retention)
+    table.add_player('p1', 1, 200)
+    table.add_player('p2', 2, 300)
+    return table
+
+def play_hand(table):
+    table.start_new_round()
+    round = table.round
+    round.start()
+    apply_action(round, {'sit':round.to_move.sit, 'action':'fold', 'call_amount':0, 'raise_amount':0})
+    while round.stage != HoldemRoundStage.ENDED:
+        apply_action(round, {'sit':round.to_move.sit, 'action':'check', 'call_amount':0, 'raise_amount':0})
+
+def sit_request(user_id, sit, chips, type='join'):
+    return {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': 'table_1', 'type': type, 'sit': sit, 'chips': chips}}
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+class TestHandRetention(unittest.TestCase):
+    def test_ring_buffer_is_bounded(self):
+        retention = HandRetention(max_hands=3)
+        table = make_table(retention)
+        for _ in range(10):
+            play_hand(table)
+        table.archive_round()
+        table.archive_round()
+        hands = retention.get_recent_hands('table_1')
+        self.assertEqual([h.hand_number for h in hands], [8, 9, 10])
+        self.assertEqual(hands[-1].player_ids, ((1, 'p1'), (2, 'p2')))
+        self.assertEqual(hands[-1].pot, 15)
+        self.assertFalse(hands[-1].showdown)
+        self.assertIsNone(table.round.deck)
+
+    def test_reused_round_keeps_its_deck(self):
+        table = make_table(HandRetention(max_hands=3), reuse_round=True)
+        play_hand(table)
+        table.archive_round()
+        self.assertIsNotNone(table.round.deck)
+        play_hand(table)
+
+    def test_unfinished_round_is_not_archived(self):
+        retention = HandRetention()
+        table = make_table(retention)
+        table.start_new_round()
+        table.round.start()
+        table.archive_round()
+        self.assertEqual(retention.get_recent_hands('table_1'), [])
+
+    def test_round_is_archived_when_it_ends(self):
+        retention = HandRetention()
+        table = make_table(retention)
+        table.start_new_round()
+        table.round.start()
+        table.process_requests([move_request(table.round.to_move.sit, 'fold')], advance_round=True)
+        self.assertEqual(table.round.stage, HoldemRoundStage.ENDED)
+        self.assertEqual(len(retention.get_recent_hands('table_1')), 1)
+        self.assertIsNone(table.round.deck)
+
+    def test_hand_keeps_the_players_it_was_played_by(self):
+        retention = HandRetention()
+        table = make_table(retention)
+        play_hand(table)
+        self.assertTrue(table.request_handler(sit_request('p1', 1, 0, 'leave'))['success'])
+        self.assertTrue(table.request_handler(sit_request('mallory', 1, 100))['success'])
+        table.start_new_round()
+        self.assertEqual(retention.get_recent_hands('table_1')[0].player_ids, ((1, 'p1'), (2, 'p2')))
+
+    def test_sinks(self):
+        records = queue.Queue(maxsize=2)
+        retention = HandRetention(max_hands=1, sink=QueueSink(records))
+        table = make_table(retention)
+        for _ in range(4):
+            play_hand(table)
+        table.archive_round()
+        self.assertEqual(records.qsize(), 2)
+        self.assertEqual(retention.sink.dropped, 2)
+        validate_hand_record(records.get())
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'hands.jsonl')
+            sink = JsonLinesSink(path)
+            table = make_table(HandRetention(sink=sink))
+            play_hand(table)
+            play_hand(table)
+            sink.close()
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual([r['hand_number'] for r in lines], [1])
+        self.assertEqual(lines[0]['table_id'], 'table_1')
+
+if __name__ == '__main__':
+    unittest.main()
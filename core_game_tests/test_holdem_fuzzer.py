@@ -0,0 +1,40 @@
+import unittest
+import sys
+import os
+import subprocess
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_fuzzer import fuzz, fuzz_seed, minimize_ops, run_ops
+
+HEADS_UP = [('join', 'u1', 1, 200), ('join', 'u2', 2, 300), ('start',)]
+
+class TestFuzzer(unittest.TestCase):
+    def test_seeds_pass(self):
+        for seed in range(20):
+            self.assertIsNone(fuzz_seed(seed, 300))
+
+    def test_fuzz_in_processes(self):
+        self.assertEqual(fuzz(range(4), 100, max_workers=2), [])
+
+    def test_illegal_moves_are_rejected(self):
+        ops = HEADS_UP + [('bad_move', 2, 'check', 0, 0), ('bad_move', 1, 'raise', 5, 1), ('bad_move', 7, 'fold', 0, 0), ('move', 0.5, 0.5)]
+        self.assertIsNone(run_ops((5, False), ops))
+
+    def test_engine_exception_is_a_failure(self):
+        step, invariant, message = run_ops((5, False), HEADS_UP + [('shuffle',)])
+        self.assertEqual((step, invariant), (3, 'exception ValueError'))
+
+    def test_minimize(self):
+        ops = [('move', 0.1, 0.1)] * 10 + HEADS_UP + [('move', 0.9, 0.9)] * 10 + [('shuffle',)] + [('start',)] * 5
+        minimized = minimize_ops((5, False), ops, 'exception ValueError')
+        self.assertEqual(minimized, [('shuffle',)])
+
+    def test_command_line(self):
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+        command = [sys.executable, '-m', 'core_game.holdem_fuzzer', '-n', '2', '--steps', '50', '-w', '1']
+        output = subprocess.run(command, cwd=root, capture_output=True, text=True, timeout=120)
+        self.assertEqual(output.returncode, 0, output.stderr)
+        self.assertIn('2 seeds, 100 operations, 0 failures', output.stdout)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import (
+    CardDeck,
+    HoldemRoundPlayer,
+    HoldemRound,
+    HoldemRoundConfig,
+    HoldemRoundStage,
+)
+from core_game.holdem_replay import (
+    HoldemRoundReplayer,
+    ReplayError,
+    make_hand_record,
+    validate_hand_record,
+    validate_history_file,
+)
+from core_game_tests.helpers import play_checked_down_hand
+
+class TestHandRecord(unittest.TestCase):
+    def test_record_is_json_serializable(self):
+        game = play_checked_down_hand()
+        record = json.loads(json.dumps(make_hand_record(game)))
+        self.assertEqual(len(record['actions']), 8)
+        self.assertEqual(len(record['deck']), 52)
+        self.assertEqual(sum(record['final_chips'].values()), 1500)
+
+    def test_preset_deck_is_dealt_in_order(self):
+        deck = CardDeck()
+        order = list(deck)
+        p1 = HoldemRoundPlayer(1,1000,[])
+        p2 = HoldemRoundPlayer(2,500,[])
+        game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2],p1,deck=deck)
+        game.start()
+        self.assertEqual(game.deck_order, order)
+        self.assertEqual(p1.cards, [order[-1], order[-2]])
+
+class TestReplayer(unittest.TestCase):
+    def test_replay_reproduces_round(self):
+        game = play_checked_down_hand()
+        replayed = HoldemRoundReplayer(make_hand_record(game), checkpoint_interval=3).replay()
+        self.assertEqual(replayed.stage, HoldemRoundStage.ENDED)
+        self.assertEqual(replayed.log, game.log)
+        self.assertEqual(replayed.community_cards, game.community_cards)
+        self.assertEqual([p.chips for p in replayed.players], [p.chips for p in game.players])
+
+    def test_seek(self):
+        game = play_checked_down_hand()
+        replayer = HoldemRoundReplayer(make_hand_record(game), checkpoint_interval=3)
+        self.assertEqual(replayer.seek(0).stage, HoldemRoundStage.PREFLOP)
+        self.assertEqual(replayer.seek(4).stage, HoldemRoundStage.TURN)
+        self.assertEqual(sorted(replayer.checkpoints), [0, 3])
+        self.assertEqual(replayer.seek(2).stage, HoldemRoundStage.FLOP)
+        self.assertEqual(len(replayer.seek(2).community_cards), 3)
+        self.assertRaises(IndexError, replayer.seek, 9)
+
+    def test_seek_does_not_change_checkpoints(self):
+        game = play_checked_down_hand()
+        replayer = HoldemRoundReplayer(make_hand_record(game), checkpoint_interval=3)
+        replayer.replay()
+        self.assertEqual(replayer.seek(3).stage, HoldemRoundStage.FLOP)
+
+class TestValidation(unittest.TestCase):
+    def test_tampered_record_raises(self):
+        record = make_hand_record(play_checked_down_hand())
+        validate_hand_record(record)
+        record['final_chips'][1] += 1
+        self.assertRaises(ReplayError, validate_hand_record, record)
+        record = make_hand_record(play_checked_down_hand())
+        record['actions'][0]['call_amount'] = 3
+        self.assertRaises(ReplayError, validate_hand_record, record)
+
+    def test_validate_history_file(self):
+        good = make_hand_record(play_checked_down_hand())
+        bad = make_hand_record(play_checked_down_hand())
+        bad['final_chips'][2] = 0
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'history.jsonl')
+            with open(path, 'w') as f:
+                f.write(json.dumps(good) + '\n' + json.dumps(bad) + '\n')
+            result = validate_history_file(path)
+        self.assertEqual(result['hands'], 2)
+        self.assertEqual([e[0] for e in result['errors']], [2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ from core_game.holdem_round import (
     HoldemRound,
     HoldemRoundConfig,
     HoldemRoundStage,
+    Bet,
 )
 
 class TestValidateSetup(unittest.TestCase):
@@ -52,9 +53,105 @@ class TestStartRound(unittest.TestCase):
         game.stage = HoldemRoundStage.PREFLOP
         self.assertRaises(Exception, game.start_round)
 
+class TestReset(unittest.TestCase):
+    def test_reset_round_in_place(self):
+        p1 = HoldemRoundPlayer(1,1000,[])
+        p2 = HoldemRoundPlayer(2,500,[])
+        game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2],p1)
+        game.start()
+        game.process_game_request({'sit':1, 'action':'fold', 'call_amount':0, 'raise_amount':0})
+        log, deck, queue = game.log, game.deck, game.move_queue
+
+        p1.reset(995)
+        p2.reset(505)
+        game.reset([p2,p1],p2)
+        self.assertEqual(game.stage, HoldemRoundStage.NOT_STARTED)
+        self.assertEqual((game.log, game.community_cards, game.winners), ([], [], {}))
+        self.assertEqual(len(game.deck), 52)
+        self.assertEqual(p1.cards, [])
+        self.assertFalse(p1.folded)
+        game.start()
+        self.assertIs(game.log, log)
+        self.assertIs(game.deck, deck)
+        self.assertIs(game.move_queue, queue)
+        self.assertEqual(game.to_move, p2)
+        self.assertEqual(p1.chips, 985) # big blind
+
+    def test_players_are_slotted(self):
+        p1 = HoldemRoundPlayer(1,1000,[])
+        self.assertRaises(AttributeError, setattr, p1, 'chip', 10)
+
 class TestValidateRequests(unittest.TestCase):
     pass
 
+class TestPots(unittest.TestCase):
+    def make_round(self, chips):
+        players = [HoldemRoundPlayer(sit, c) for sit, c in enumerate(chips, 1)]
+        game = HoldemRound(HoldemRoundConfig(5,0), players, players[0])
+        game.start()
+        return game, players
+
+    def test_side_pots_of_all_ins(self):
+        game, (p1, p2, p3) = self.make_round([50, 100, 300])
+        game.bets['preflop'] = [Bet(1, 'raise', 0, 50), Bet(2, 'raise', 50, 50), Bet(3, 'call', 100, 0)]
+        game.make_pots()
+        self.assertEqual({rank: pot['pot'] for rank, pot in game.pots.items()}, {50: 150, 100: 100})
+        self.assertEqual([p.sit for p in game.pots[50]['players']], [1, 2, 3])
+        self.assertEqual([p.sit for p in game.pots[100]['players']], [2, 3])
+
+    def test_folded_bets_stay_in_the_pots(self):
+        game, (p1, p2, p3) = self.make_round([500, 500, 500])
+        game.bets['preflop'] = [Bet(1, 'raise', 0, 200), Bet(2, 'call', 200, 0), Bet(3, 'raise', 0, 20)]
+        p1.folded = True
+        p3.folded = True
+        game.make_pots()
+        self.assertEqual({rank: pot['pot'] for rank, pot in game.pots.items()}, {200: 420})
+        self.assertEqual([p.sit for p in game.pots[200]['players']], [2])
+
+    def test_split_pot_odd_chip(self):
+        game, (p1, p2, p3) = self.make_round([500, 500, 500])
+        game.stage = HoldemRoundStage.SHOWDOWN
+        game.pots = {10: {'pot': 31, 'players': [p1, p2, p3]}}
+        game.winners = {10: [3, 1]}
+        chips = p1.chips, p3.chips
+        game.distribute_pots()
+        self.assertEqual((p1.chips - chips[0], p3.chips - chips[1]), (16, 15))
+
+class TestBlinds(unittest.TestCase):
+    def test_short_stacked_big_blind(self):
+        p1 = HoldemRoundPlayer(1,1000)
+        p2 = HoldemRoundPlayer(2,7)
+        game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2],p1)
+        game.start()
+        self.assertEqual(p2.chips, 0)
+        self.assertEqual(game.get_player_total_bet(p2), 7)
+
+class TestBettingOpen(unittest.TestCase):
+    def test_short_all_in_raise_does_not_reopen_betting(self):
+        p1 = HoldemRoundPlayer(1,1000)
+        p2 = HoldemRoundPlayer(2,1000)
+        p3 = HoldemRoundPlayer(3,45)
+        game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2,p3],p1)
+        game.start()
+        # p1 raises 30, p2 calls, p3 (big blind) goes all in raising only 5.
+        for request in ({'sit':1, 'action':'raise', 'call_amount':10, 'raise_amount':30}, {'sit':2, 'action':'call', 'call_amount':35, 'raise_amount':0}):
+            self.assertTrue(game.process_game_request(request)['success'])
+            game.start_next_move()
+        self.assertEqual(game.get_allowed_moves(p3)['max_raise_amount'], 5)
+        self.assertTrue(game.process_game_request({'sit':3, 'action':'raise', 'call_amount':30, 'raise_amount':5})['success'])
+        game.start_next_move()
+        self.assertFalse(game.is_betting_open(p1))
+        self.assertEqual(game.get_allowed_moves(p1)['moves'], ['fold', 'call'])
+
+    def test_fold_to_one_player_ends_betting(self):
+        p1 = HoldemRoundPlayer(1,1000)
+        p2 = HoldemRoundPlayer(2,1000)
+        game = HoldemRound(HoldemRoundConfig(5,0),[p1,p2],p1)
+        game.start()
+        game.process_game_request({'sit':1, 'action':'fold', 'call_amount':0, 'raise_amount':0})
+        game.start_next_move()
+        self.assertEqual(game.stage, HoldemRoundStage.NO_SHOWDOWN)
+
 class TestPlayerQueue(unittest.TestCase):
     pass
 
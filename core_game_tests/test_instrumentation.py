@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import HoldemRound
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game import instrumentation
+from core_game.instrumentation import LatencyHistogram, metrics
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+def make_table():
+    table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9))
+    table.add_player('p1', 1, 200)
+    table.add_player('p2', 2, 300)
+    table.start_new_round()
+    table.round.start()
+    return table
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_record(self):
+        histogram = LatencyHistogram((10, 100))
+        for duration in (5, 10, 50, 1000):
+            histogram.record(duration)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.percentile(0.5), 10 / 1e9)
+        self.assertEqual(histogram.percentile(1), float('inf'))
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_disabled_by_default(self):
+        original = HoldemRound.__dict__['process_game_request']
+        instrumentation.enable()
+        self.assertIsNot(HoldemRound.__dict__['process_game_request'], original)
+        instrumentation.disable()
+        self.assertIs(HoldemRound.__dict__['process_game_request'], original)
+        make_table().request_handler(move_request(1, 'check'))
+        self.assertEqual(metrics.snapshot()['rejected_moves'], {})
+
+    def test_latency_and_rejections(self):
+        instrumentation.enable()
+        table = make_table()
+        table.request_handler(move_request(2, 'check'))
+        table.request_handler(move_request(1, 'check'))
+        table.request_handler(move_request(1, 'call', 4))
+        table.request_handler(move_request(7, 'fold'))
+        table.request_handler(move_request(1, 'call', 5))
+        table.request_handler({'type': 'table_view_request', 'data': {'user_id': 'p1'}})
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['rejected_moves'], {'not_to_move': 1, 'action_not_allowed': 1, 'invalid_amount': 1, 'unknown_sit': 1})
+        self.assertEqual(snapshot['latency']['HoldemTable.request_handler']['count'], 6)
+        self.assertEqual(snapshot['latency']['HoldemRound.process_game_request']['count'], 5)
+        self.assertEqual(snapshot['latency']['HoldemTable.get_table_view']['count'], 1)
+
+    def test_wrapper_keeps_the_signature(self):
+        instrumentation.enable()
+        table = make_table()
+        player = table.round.get_player_by_sit(2)
+        self.assertFalse(table.round.process_game_request(move_request(2, 'check')['data'], player)['success'])
+        self.assertFalse(table.round.process_game_request(request=move_request(2, 'check')['data'])['success'])
+        self.assertEqual(metrics.snapshot()['rejected_moves'], {'not_to_move': 2})
+
+    def test_prometheus_output(self):
+        instrumentation.enable()
+        make_table().request_handler(move_request(2, 'check'))
+        text = metrics.to_prometheus()
+        self.assertIn('holdem_call_duration_seconds_count{function="HoldemTable.request_handler"} 1', text)
+        self.assertIn('holdem_rejected_moves_total{reason="not_to_move"} 1', text)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'holdem.prom')
+            instrumentation.write_prometheus(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), text)
+
+if __name__ == '__main__':
+    unittest.main()
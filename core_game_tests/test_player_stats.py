@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import numpy as np
+
+from core_game.holdem_replay import apply_action
+from core_game.player_stats import PlayerStatsAggregator
+from core_game_tests.helpers import play_checked_down_hand, start_hand
+
+def play_three_bet_hand():
+    game = start_hand()
+    apply_action(game, {'sit':1, 'action':'raise', 'call_amount':5, 'raise_amount':10})
+    apply_action(game, {'sit':2, 'action':'raise', 'call_amount':10, 'raise_amount':20})
+    apply_action(game, {'sit':1, 'action':'fold', 'call_amount':0, 'raise_amount':0})
+    return game
+
+class TestPlayerStats(unittest.TestCase):
+    def test_preflop_stats(self):
+        stats = PlayerStatsAggregator()
+        stats.add_round(play_three_bet_hand(), {1:'alice', 2:'bob'})
+        stats.add_round(play_checked_down_hand(), {1:'alice', 2:'bob'})
+
+        alice = stats.get_counters('alice')
+        bob = stats.get_counters('bob')
+        self.assertEqual(alice['hands'], 2)
+        self.assertEqual(alice['vpip'], 2)
+        self.assertEqual(alice['pfr'], 1)
+        self.assertEqual(alice['three_bets'], 0)
+        self.assertEqual(bob['vpip'], 1)
+        self.assertEqual(bob['three_bet_opportunities'], 1)
+        self.assertEqual(bob['three_bets'], 1)
+        self.assertEqual(stats.get_stats('bob')['three_bet'], 1.0)
+
+    def test_no_showdown_winner(self):
+        stats = PlayerStatsAggregator()
+        stats.add_round(play_three_bet_hand())
+        self.assertEqual(stats.get_counters(2)['won'], 1)
+        self.assertEqual(stats.get_counters(2)['went_to_showdown'], 0)
+        self.assertEqual(stats.get_counters(1)['won'], 0)
+
+    def test_showdown_stats(self):
+        stats = PlayerStatsAggregator()
+        stats.add_round(play_checked_down_hand())
+        for sit in (1, 2):
+            counters = stats.get_counters(sit)
+            self.assertEqual(counters['saw_flop'], 1)
+            self.assertEqual(counters['went_to_showdown'], 1)
+        self.assertGreaterEqual(stats.get_counters(1)['won'] + stats.get_counters(2)['won'], 1)
+        self.assertIsNone(stats.get_stats(1)['aggression_factor'])
+        self.assertIsNone(stats.get_stats('nobody')['vpip'])
+
+    def test_storage_grows(self):
+        stats = PlayerStatsAggregator(capacity=1)
+        stats.add_round(play_checked_down_hand(), {1:'alice', 2:'bob'})
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(stats.get_counters('bob')['hands'], 1)
+
+    def test_save_and_load(self):
+        stats = PlayerStatsAggregator()
+        stats.add_round(play_three_bet_hand(), {1:'alice', 2:'bob'})
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'stats.npz')
+            stats.save(path)
+            loaded = PlayerStatsAggregator.load(path)
+        self.assertEqual(loaded.get_counters('bob'), stats.get_counters('bob'))
+        self.assertIn('alice', loaded)
+
+    def test_save_does_not_pickle(self):
+        stats = PlayerStatsAggregator()
+        stats.add_round(play_checked_down_hand())
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'stats.npz')
+            stats.save(path)
+            self.assertNotEqual(np.load(path)['player_ids'].dtype, object)
+            loaded = PlayerStatsAggregator.load(path)
+        self.assertEqual(loaded.get_counters(1), stats.get_counters(1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import random
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game import hand_evaluator
+from core_game.holdem_round import CardDeck
+from core_game.range_equity import CARD_INDEX, EquityCalculator, HandRange, compute_equity, evaluate_many, parse_range
+
+class TestParseRange(unittest.TestCase):
+    def test_combo_counts(self):
+        counts = {
+            'AA': 6, 'QQ+': 18, '22-55': 24, 'AKs': 4, 'AKo': 12, 'AK': 16, 'ATs+': 16,
+            'KJo+': 24, 'A2s-A5s': 16, '76s-54s': 12, 'AhKh': 1, 'QQ+, AKs, 76s-54s': 34,
+        }
+        for text, count in counts.items():
+            self.assertEqual(len(parse_range(text)), count, text)
+
+    def test_weights(self):
+        hand_range = parse_range('AK, AKs:0.5')
+        self.assertEqual(sorted(weight for _, _, weight in hand_range.combos()), [0.5] * 4 + [1.0] * 12)
+
+    def test_same_range_same_key(self):
+        self.assertEqual(parse_range('KK+').key(), parse_range('AA, KK').key())
+        self.assertEqual(parse_range('AhKh').key(), HandRange.from_cards(['Kh', 'Ah']).key())
+
+    def test_invalid_ranges(self):
+        for text in ('AKx', 'AAs', '22-A5', 'AK:2', 'AhAh'):
+            self.assertRaises(ValueError, parse_range, text)
+
+class TestEquity(unittest.TestCase):
+    def test_evaluate_many_matches_evaluator(self):
+        rng = random.Random(0)
+        hands = [rng.sample(CardDeck.full_deck, 7) for _ in range(500)]
+        ranks = evaluate_many([[CARD_INDEX[card] for card in hand] for hand in hands])
+        self.assertEqual(list(ranks), [hand_evaluator.evaluate(hand[:2], hand[2:]) for hand in hands])
+
+    def test_river_equity_is_exact(self):
+        board = ['2c', '3d', '9h', 'Td', 'Jd']
+        hand_range = parse_range('QQ, AKs, 87o')
+        won = total = 0
+        hero_rank = hand_evaluator.evaluate(['Qh', 'Kh'], board)
+        for card1, card2, _ in hand_range.combos():
+            if {card1, card2} & set(board + ['Qh', 'Kh']):
+                continue
+            rank = hand_evaluator.evaluate([card1, card2], board)
+            won += (hero_rank < rank) + 0.5 * (hero_rank == rank)
+            total += 1
+        equity = compute_equity(HandRange.from_cards(['Qh', 'Kh']).weights, hand_range.weights, tuple(board))
+        self.assertAlmostEqual(equity, won / total)
+
+    def test_range_versus_range_removes_shared_cards(self):
+        board = ['2c', '3d', '9h', 'Td', 'Jd']
+        range_a, range_b = parse_range('QQ+, AKs, 87o:0.5, KdQd'), parse_range('QQ, KK:0.25, AK, T9s, 22')
+        won = total = 0
+        for a1, a2, weight_a in range_a.combos():
+            for b1, b2, weight_b in range_b.combos():
+                if len({a1, a2, b1, b2} | set(board)) < 9:
+                    continue
+                rank_a, rank_b = hand_evaluator.evaluate([a1, a2], board), hand_evaluator.evaluate([b1, b2], board)
+                won += weight_a * weight_b * ((rank_a < rank_b) + 0.5 * (rank_a == rank_b))
+                total += weight_a * weight_b
+        self.assertAlmostEqual(compute_equity(range_a.weights, range_b.weights, tuple(board)), won / total)
+
+    def test_preflop_equity(self):
+        calculator = EquityCalculator(samples=500)
+        self.assertAlmostEqual(calculator.equity('AA', 'KK'), 0.82, delta=0.03)
+        self.assertAlmostEqual(calculator.hand_equity(['Ah', 'Ad'], '72o'), 0.88, delta=0.03)
+
+    def test_memoized_per_range_pair_and_board(self):
+        calculator = EquityCalculator(samples=200)
+        equity = calculator.equity('QQ+', 'AKs', ['Ah', '7c', '2d'])
+        self.assertEqual(calculator.equity('AA, KK, QQ', 'AKs', ['2d', '7c', 'Ah']), equity)
+        self.assertAlmostEqual(calculator.equity('AKs', 'QQ+', ['Ah', '7c', '2d']), 1 - equity)
+        self.assertEqual((calculator.hits, calculator.misses), (2, 1))
+
+    def test_equities_in_processes(self):
+        queries = [('AA', 'KK', []), ('QQ', 'AKs', ['2c', '7d', '9h', 'Ts']), ('KK', 'AA', [])]
+        with EquityCalculator(max_workers=2, samples=200) as calculator:
+            equities = calculator.equities(queries)
+        self.assertAlmostEqual(equities[0], 1 - equities[2])
+        self.assertEqual(equities[1], EquityCalculator(samples=200).equity(*queries[1]))
+
+    def test_batch_larger_than_the_cache(self):
+        board = ['Ah', '7c', '2d', '9s', 'Td']
+        calculator = EquityCalculator(max_workers=1, samples=50, cache_size=1)
+        cached = calculator.equity('QQ', 'KK', board)
+        equities = calculator.equities([('QQ', 'KK', board), ('JJ', 'KK', board), ('KK', 'QQ', board), ('88', 'KK', board)])
+        self.assertEqual(equities[0], cached)
+        self.assertAlmostEqual(equities[2], 1 - cached)
+        self.assertEqual(len(calculator.cache), 1)
+
+    def test_no_combos_left(self):
+        self.assertRaises(ValueError, EquityCalculator().equity, 'AhAd', 'AA', ['Ac', 'As', '2d'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.request_codec import (
+    RequestError,
+    decode_request,
+    encode_json_request,
+    encode_request,
+    is_valid_request,
+    validate_request,
+)
+
+MOVE = {'type': 'move_request', 'data': {'sit': 2, 'action': 'raise', 'call_amount': 5, 'raise_amount': 20, 'table_id': 'table_1'}}
+SIT = {'type': 'sit_request', 'data': {'user_id': 'user_1', 'table_id': 'table_1', 'type': 'join', 'sit': 1, 'chips': 500}}
+VIEW = {'type': 'table_view_request', 'data': {'user_id': 'user_1', 'table_id': 'table_1'}}
+
+class TestRequestCodec(unittest.TestCase):
+    def test_round_trip(self):
+        for request in (MOVE, SIT, VIEW):
+            self.assertEqual(decode_request(encode_request(request)), request)
+            self.assertEqual(decode_request(encode_json_request(request)), request)
+            self.assertEqual(decode_request(json.dumps(request)), request)
+
+    def test_binary_is_compact(self):
+        self.assertEqual(len(encode_request(MOVE)), 13 + 1 + len('table_1'))
+        self.assertLess(len(encode_request(SIT)), len(encode_json_request(SIT)) // 3)
+
+    def test_move_without_table_id(self):
+        request = {'type': 'move_request', 'data': {'sit': 1, 'action': 'check', 'call_amount': 0, 'raise_amount': 0}}
+        self.assertEqual(decode_request(encode_request(request)), request)
+
+    def test_only_known_fields_are_kept(self):
+        request = {'type': 'table_view_request', 'user_id': 'user_1', 'data': {'user_id': 'user_1', 'admin': True}}
+        self.assertEqual(validate_request(request), {'type': 'table_view_request', 'data': {'user_id': 'user_1'}})
+
+    def test_malformed_requests(self):
+        malformed = [
+            None, [], {'type': 'move_request'}, {'type': 'shuffle', 'data': {}}, {'type': 1, 'data': {}},
+            {'type': 'move_request', 'data': dict(MOVE['data'], action='bet')},
+            {'type': 'move_request', 'data': dict(MOVE['data'], sit=True)},
+            {'type': 'move_request', 'data': dict(MOVE['data'], sit=10)},
+            {'type': 'move_request', 'data': dict(MOVE['data'], raise_amount=-5)},
+            {'type': 'move_request', 'data': dict(MOVE['data'], call_amount=2.5)},
+            {'type': 'sit_request', 'data': dict(SIT['data'], user_id='')},
+            {'type': 'sit_request', 'data': dict(SIT['data'], user_id='x' * 256)},
+            {'type': 'sit_request', 'data': {k: v for k, v in SIT['data'].items() if k != 'chips'}},
+        ]
+        for request in malformed:
+            self.assertFalse(is_valid_request(request), request)
+            self.assertRaises(RequestError, decode_request, json.dumps(request))
+
+    def test_malformed_payloads(self):
+        payload = encode_request(SIT)
+        for bad in (b'', b'{', b'\xb7', payload[:-1], payload + b'\x00', payload[:2] + b'\x09' + payload[3:], b'\xb7\x02' + payload[2:]):
+            self.assertRaises(RequestError, decode_request, bad)
+        move = bytearray(encode_request(MOVE))
+        move[4] = 9 # action code
+        self.assertRaises(RequestError, decode_request, bytes(move))
+        move[4], move[3] = 3, 0 # sit
+        self.assertRaises(RequestError, decode_request, bytes(move))
+        self.assertRaises(RequestError, decode_request, payload[:-7] + b'\xff' * 7) # invalid utf-8 table_id
+
+    def test_decoded_requests_reach_the_table(self):
+        table = HoldemTable('table_1', HoldemTableConfig(5, 0, 100, 1000, 9))
+        self.assertTrue(table.request_handler(decode_request(encode_request(SIT)))['success'])
+        view = table.request_handler(decode_request(encode_request(VIEW)))
+        self.assertEqual(view['data']['shared_data']['players'][0]['user_id'], 'user_1')
+
+if __name__ == '__main__':
+    unittest.main()
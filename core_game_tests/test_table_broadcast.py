@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.table_broadcast import TableBroadcaster
+
+def sit_request(user_id, sit, chips):
+    return {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': 'table_1', 'type': 'join', 'sit': sit, 'chips': chips}}
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+def make_started_table():
+    table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9))
+    table.process_requests([sit_request('p1', 1, 200), sit_request('p2', 2, 300)])
+    table.start_new_round()
+    table.round.start()
+    return table
+
+class TestTableBroadcaster(unittest.TestCase):
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_changes_in_one_tick_are_coalesced(self):
+        sent = []
+        async def send(recipient_id, view):
+            sent.append((recipient_id, view))
+
+        async def main():
+            table = make_started_table()
+            broadcaster = TableBroadcaster(table, send)
+            broadcaster.add_recipient('p1')
+            broadcaster.add_recipient('p2')
+            broadcaster.add_recipient('spectator', spectator=True)
+            await broadcaster.drain()
+            sent.clear()
+
+            broadcaster.handle_request(move_request(1, 'call', 5))
+            table.round.start_next_move()
+            broadcaster.handle_request(move_request(2, 'check'))
+            table.round.start_next_move()
+            broadcaster.mark_changed()
+            await broadcaster.drain()
+            return table, broadcaster
+
+        table, broadcaster = self.run_async(main())
+        self.assertEqual(sorted(recipient for recipient, _ in sent), ['p1', 'p2', 'spectator'])
+        views = dict(sent)
+        self.assertEqual(views['p1']['data']['shared_data']['stage'], 'flop')
+        self.assertEqual(views['p1']['data']['personal_data']['cards'], table.round.players[0].cards)
+        self.assertEqual(views['spectator']['data']['personal_data'], {})
+        self.assertEqual(views['p2'], table.get_table_view(table.get_player_by_id('p2')))
+        self.assertEqual(broadcaster.get_stats()['flushes'], 2)
+
+    def test_rejected_request_does_not_broadcast(self):
+        sent = []
+        async def send(recipient_id, view):
+            sent.append(recipient_id)
+
+        async def main():
+            broadcaster = TableBroadcaster(make_started_table(), send)
+            broadcaster.add_recipient('p1')
+            await broadcaster.drain()
+            response = broadcaster.handle_request(move_request(2, 'check'))
+            await asyncio.sleep(0)
+            return response, broadcaster
+
+        response, broadcaster = self.run_async(main())
+        self.assertFalse(response['success'])
+        self.assertEqual(sent, ['p1'])
+        self.assertEqual(broadcaster.get_stats()['flushes'], 1)
+
+    def test_slow_recipient_gets_only_latest_view(self):
+        sent = {'fast': [], 'slow': []}
+        async def send(recipient_id, view):
+            if recipient_id == 'slow':
+                await slow_done.wait()
+            sent[recipient_id].append(view['data']['shared_data']['players'])
+
+        async def main():
+            table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9))
+            broadcaster = TableBroadcaster(table, send)
+            broadcaster.add_recipient('fast', spectator=True)
+            broadcaster.add_recipient('slow', spectator=True)
+            broadcaster.flush()
+            await asyncio.sleep(0) # the fast recipient is sent the view, the slow one is still sending it
+            for sit in range(1, 5):
+                broadcaster.handle_request(sit_request(f'p{sit}', sit, 200))
+                broadcaster.flush()
+                await asyncio.sleep(0)
+            slow_done.set()
+            await broadcaster.drain()
+            return broadcaster
+
+        slow_done = asyncio.Event()
+        broadcaster = self.run_async(main())
+        self.assertEqual(len(sent['fast']), 5)
+        self.assertEqual(len(sent['slow']), 2)
+        self.assertEqual(sent['slow'][-1], sent['fast'][-1])
+        self.assertEqual(len(sent['slow'][-1]), 4)
+        self.assertEqual(broadcaster.recipients['slow'].dropped, 3)
+
+    def test_window(self):
+        sent = []
+        async def send(recipient_id, view):
+            sent.append(recipient_id)
+
+        async def main():
+            table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9))
+            # a window that never ends during the test, the broadcast is flushed by drain.
+            broadcaster = TableBroadcaster(table, send, window=60)
+            broadcaster.add_recipient('spectator', spectator=True)
+            scheduled = broadcaster.scheduled
+            for sit in range(1, 4):
+                broadcaster.handle_request(sit_request(f'p{sit}', sit, 200))
+                await asyncio.sleep(0)
+            self.assertIs(broadcaster.scheduled, scheduled)
+            self.assertEqual(sent, [])
+            await broadcaster.drain()
+            return broadcaster
+
+        broadcaster = self.run_async(main())
+        self.assertEqual(sent, ['spectator'])
+        self.assertEqual(broadcaster.get_stats()['flushes'], 1)
+
+class TestTableView(unittest.TestCase):
+    def test_view_after_round_ended(self):
+        table = make_started_table()
+        table.round.to_move = None
+        view = table.get_table_view(table.get_player_by_id('p1'))
+        self.assertIsNone(view['data']['shared_data']['to_move'])
+
+if __name__ == '__main__':
+    unittest.main()
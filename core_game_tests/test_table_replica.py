@@ -0,0 +1,136 @@
+import multiprocessing
+import unittest
+import uuid
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import HoldemRoundStage
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.table_replica import MAX_BETS, SEQUENCE, ReplicaPublisher, ReplicaReader
+
+def sit_request(user_id, sit, chips):
+    return {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': 'table_1', 'type': 'join', 'sit': sit, 'chips': chips}}
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+def read_in_process(prefix, table_id, queue):
+    reader = ReplicaReader(prefix)
+    queue.put(reader.get_shared_view_data(table_id))
+    reader.close()
+
+class TestTableReplica(unittest.TestCase):
+    def setUp(self):
+        self.prefix = f'test_{uuid.uuid4().hex[:8]}'
+        self.publisher = ReplicaPublisher(self.prefix)
+        self.reader = ReplicaReader(self.prefix)
+        self.table = HoldemTable('table_1', HoldemTableConfig(5, 0, 100, 1000, 9))
+
+    def tearDown(self):
+        self.reader.close()
+        self.publisher.close()
+
+    def handle(self, request):
+        return self.publisher.handle_request(self.table, request)
+
+    def assertReplicated(self):
+        self.assertEqual(self.reader.get_shared_view_data('table_1'), self.table.get_shared_view_data())
+
+    def test_replica_follows_the_table(self):
+        self.assertIsNone(self.reader.get_table_view('table_1'))
+        self.handle(sit_request('p1', 1, 200))
+        self.handle(sit_request('p2', 2, 300))
+        self.assertReplicated()
+
+        self.table.start_new_round()
+        self.table.round.start()
+        self.publisher.publish(self.table)
+        self.assertReplicated()
+        for request in (move_request(1, 'raise', 5, 20), move_request(2, 'call', 20)):
+            self.assertTrue(self.handle(request)['success'])
+            self.assertReplicated()
+        while self.table.round.stage != HoldemRoundStage.ENDED:
+            self.assertTrue(self.handle(move_request(self.table.round.to_move.sit, 'check'))['success'])
+            self.assertReplicated()
+
+        self.assertEqual(self.reader.get_shared_view_data('table_1')['stage'], HoldemRoundStage.ENDED.value)
+        view = self.reader.get_table_view('table_1')
+        self.assertEqual(view['data']['personal_data'], {})
+        self.assertEqual(view['data']['shared_data']['community_cards'], self.table.round.community_cards)
+
+    def test_shown_hands(self):
+        self.handle(sit_request('p1', 1, 200))
+        self.handle(sit_request('p2', 2, 300))
+        self.table.start_new_round()
+        self.table.round.start()
+        # moved without advance_round, which would finish the round past the showdown.
+        requests = [move_request(1, 'raise', 5, 20), move_request(2, 'call', 20)]
+        while self.table.round.stage != HoldemRoundStage.SHOWDOWN:
+            request = requests.pop(0) if requests else move_request(self.table.round.to_move.sit, 'check')
+            self.assertTrue(self.table.request_handler(request)['success'])
+            self.table.round.start_next_move()
+        self.publisher.publish(self.table)
+        self.assertReplicated()
+        self.assertEqual(len(self.reader.get_shared_view_data('table_1')['show_cards']), 2)
+
+    def test_batch_is_published_once_after_the_round_moved_on(self):
+        self.handle(sit_request('p1', 1, 200))
+        self.handle(sit_request('p2', 2, 300))
+        self.table.start_new_round()
+        self.table.round.start()
+        version = self.publisher.publish(self.table)
+        responses = self.publisher.handle_requests(self.table, [move_request(1, 'call', 5), move_request(2, 'check')])
+        self.assertTrue(all(response['success'] for response in responses))
+        self.assertEqual(self.reader.read('table_1')[0], version + 1)
+        self.assertEqual(self.table.round.stage, HoldemRoundStage.FLOP)
+        self.assertReplicated()
+
+    def test_new_owner_goes_on_from_the_published_version(self):
+        self.handle(sit_request('p1', 1, 200))
+        self.handle(sit_request('p2', 2, 300))
+        version = self.reader.read('table_1')[0]
+        publisher = ReplicaPublisher(self.prefix) # the segment wasn't unlinked, e.g. the old owner crashed
+        self.assertEqual(publisher.publish(self.table), version + 1)
+        self.assertEqual(self.reader.read('table_1')[0], version + 1)
+        publisher.segments.pop('table_1').close()
+
+    def test_rejected_request_is_not_published(self):
+        self.handle(sit_request('p1', 1, 200))
+        version = self.reader.read('table_1')[0]
+        self.handle(sit_request('p2', 1, 300))
+        self.assertEqual(self.reader.read('table_1')[0], version)
+
+    def test_reader_in_another_process(self):
+        self.handle(sit_request('p1', 1, 200))
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=read_in_process, args=(self.prefix, 'table_1', queue))
+        process.start()
+        shared_data = queue.get(timeout=10)
+        process.join()
+        self.assertEqual(shared_data, self.table.get_shared_view_data())
+
+    def test_write_in_progress_is_not_read(self):
+        self.handle(sit_request('p1', 1, 200))
+        buffer = self.publisher.segments['table_1'].buf
+        sequence = SEQUENCE.unpack_from(buffer, 0)[0]
+        SEQUENCE.pack_into(buffer, 0, sequence + 1)
+        reader = ReplicaReader(self.prefix, max_retries=10)
+        self.assertIsNone(reader.read('table_1'))
+        self.assertEqual(reader.retries, 10)
+        SEQUENCE.pack_into(buffer, 0, sequence + 2)
+        self.assertReplicated()
+        reader.close()
+
+    def test_state_too_large_falls_back(self):
+        self.handle(sit_request('p1', 1, 200))
+        self.handle(sit_request('p2', 2, 300))
+        self.table.start_new_round()
+        self.table.round.start()
+        self.table.round.bets['preflop'].extend(self.table.round.bets['preflop'][:1] * MAX_BETS)
+        self.publisher.publish(self.table)
+        self.assertIsNotNone(self.reader.read('table_1'))
+        self.assertIsNone(self.reader.get_table_view('table_1'))
+
+if __name__ == '__main__':
+    unittest.main()
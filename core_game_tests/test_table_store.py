@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import HoldemRoundStage
+from core_game.holdem_table import HoldemTable, HoldemTableConfig
+from core_game.holdem_replay import apply_action
+from core_game.table_store import TableStore, TableStoreError, table_from_dict, table_to_dict
+
+def sit_request(user_id, sit, chips):
+    return {'type': 'sit_request', 'data': {'user_id': user_id, 'table_id': 'table_1', 'type': 'join', 'sit': sit, 'chips': chips}}
+
+def move_request(sit, action, call_amount=0, raise_amount=0):
+    return {'type': 'move_request', 'data': {'sit': sit, 'action': action, 'call_amount': call_amount, 'raise_amount': raise_amount}}
+
+class StoredTable:
+    """ Drives a table like a server would, recording everything in store. """
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+
+    def request(self, request):
+        response = self.table.request_handler(request)
+        if request['type'] == 'move_request' and response['success']:
+            round = self.table.round
+            round.start_next_move()
+            if round.stage in (HoldemRoundStage.SHOWDOWN, HoldemRoundStage.NO_SHOWDOWN):
+                round.finish()
+        self.store.record_request(self.table, request, response)
+        return response
+
+    def start_round(self):
+        self.table.start_new_round()
+        self.table.round.start()
+        self.store.record_round_start(self.table)
+
+class TestSerialization(unittest.TestCase):
+    def test_round_trip_mid_hand(self):
+        table = HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9))
+        table.add_player('p1', 1, 200)
+        table.add_player('p2', 2, 300)
+        table.start_new_round()
+        table.round.start()
+        apply_action(table.round, move_request(1, 'raise', 5, 10)['data'])
+        restored = table_from_dict(table_to_dict(table))
+        self.assertEqual(table_to_dict(restored), table_to_dict(table))
+        self.assertIs(restored.players[0].round_player, restored.round.players[0])
+        self.assertEqual(restored.round.to_move.sit, 2)
+
+class TestTableStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tables.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play(self, checkpoint_interval):
+        store = TableStore(self.path, checkpoint_interval=checkpoint_interval)
+        stored = StoredTable(store, HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9)))
+        stored.request(sit_request('p1', 1, 200))
+        stored.request(sit_request('p2', 2, 300))
+        stored.start_round()
+        stored.request(move_request(1, 'call', 5))
+        while stored.table.round.stage != HoldemRoundStage.ENDED:
+            stored.request(move_request(stored.table.round.to_move.sit, 'check'))
+        stored.start_round()
+        stored.request(move_request(2, 'raise', 5, 10))
+        stored.request(move_request(1, 'call', 10))
+        stored.request(move_request(1, 'check')) # rejected, not journaled
+        return store, stored.table
+
+    def test_restore_from_journal_and_checkpoints(self):
+        for checkpoint_interval in (1, 3, 1000):
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            store, table = self.play(checkpoint_interval)
+            store.close()
+
+            store = TableStore(self.path)
+            restored = store.restore_tables()
+            store.close()
+            self.assertEqual(list(restored), ['table_1'])
+            self.assertEqual(table_to_dict(restored['table_1']), table_to_dict(table))
+
+    def test_sequences_continue_after_reopen(self):
+        store, table = self.play(4)
+        store.close()
+        store = TableStore(self.path, checkpoint_interval=4)
+        table = store.restore_tables()['table_1']
+        stored = StoredTable(store, table)
+        stored.request(move_request(table.round.to_move.sit, 'check'))
+        store.close()
+        store = TableStore(self.path)
+        restored = store.restore_tables()['table_1']
+        store.close()
+        self.assertEqual(table_to_dict(restored), table_to_dict(table))
+
+    def test_failed_writes_are_kept(self):
+        store = TableStore(self.path, checkpoint_interval=1000, retries=1)
+        stored = StoredTable(store, HoldemTable('table_1', HoldemTableConfig(5,0,100,1000,9)))
+        stored.request(sit_request('p1', 1, 200))
+        store.flush()
+        connection = sqlite3.connect(self.path)
+        connection.execute("DROP TABLE journal")
+        connection.close()
+
+        stored.request(sit_request('p2', 2, 300))
+        self.assertRaises(sqlite3.OperationalError, store.flush)
+        self.assertEqual([item[:3] for item in store.unwritten], [('journal', 'table_1', 2)])
+        self.assertRaises(TableStoreError, stored.request, sit_request('p3', 3, 300))
+        self.assertRaises(sqlite3.OperationalError, store.close)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import random
+import unittest
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from core_game.holdem_round import HoldemRoundStage
+from core_game.tournament import BlindLevel, Tournament, TournamentConfig, TournamentError
+
+LEVELS = [BlindLevel(10, 0, 60), BlindLevel(25, 5, 60), BlindLevel(50, 10, 60)]
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_tournament(num_entrants, table_size, clock=None):
+    tournament = Tournament('t1', TournamentConfig(1000, table_size, LEVELS, seed=1), clock=clock or Clock())
+    for index in range(num_entrants):
+        tournament.register(f'user_{index}')
+    tournament.start()
+    return tournament
+
+def play_hand(table, rng):
+    """ Plays table's round to the end with random raises, calls and folds. """
+    round = table.round
+    round.start()
+    while round.stage != HoldemRoundStage.ENDED:
+        allowed_moves = round.get_allowed_moves(round.to_move)
+        request = {'sit': round.to_move.sit, 'action': 'fold', 'call_amount': 0, 'raise_amount': 0}
+        r = rng.random()
+        if 'raise' in allowed_moves['moves'] and r < 0.5:
+            request.update(action='raise', call_amount=allowed_moves['call_amount'], raise_amount=allowed_moves['max_raise_amount'])
+        elif 'check' in allowed_moves['moves']:
+            request['action'] = 'check'
+        elif r < 0.8:
+            request.update(action='call', call_amount=allowed_moves['call_amount'])
+        table.process_requests([{'type': 'move_request', 'data': request}], advance_round=True)
+
+def get_table_sizes(tournament):
+    return sorted(len(table.players) for table in tournament.tables.values())
+
+class TestTournament(unittest.TestCase):
+    def test_seating(self):
+        tournament = make_tournament(1000, 9)
+        sizes = get_table_sizes(tournament)
+        self.assertEqual(len(sizes), 112)
+        self.assertLessEqual(sizes[-1] - sizes[0], 1)
+        self.assertEqual(sum(sizes), 1000)
+        self.assertRaises(TournamentError, tournament.register, 'late')
+
+    def test_blind_levels(self):
+        clock = Clock()
+        tournament = make_tournament(4, 9, clock)
+        table_id = next(iter(tournament.tables))
+        tournament.start_hand(table_id)
+        self.assertEqual(tournament.tables[table_id].round.config.small_blind, 10)
+
+        clock.now = 130
+        play_hand(tournament.tables[table_id], random.Random(0))
+        tournament.end_hand(table_id)
+        tournament.start_hand(table_id)
+        self.assertEqual((tournament.tables[table_id].round.config.small_blind, tournament.tables[table_id].round.config.ante), (50, 10))
+        clock.now = 10_000
+        self.assertEqual(tournament.get_level(), LEVELS[-1])
+
+    def test_elimination_places(self):
+        tournament = make_tournament(3, 9)
+        table = next(iter(tournament.tables.values()))
+        tournament.start_hand(table.table_id)
+        table.round.start()
+        table.round.stage = HoldemRoundStage.ENDED
+        rich, poor, other = table.round.players
+        rich.chips, poor.chips, other.chips = 0, 0, 3000
+        table.round.starting_chips = {rich.sit: 2000, poor.sit: 500, other.sit: 500}
+        user_ids = {sit: table.get_player_by_sit(sit).id for sit in (rich.sit, poor.sit, other.sit)}
+        tournament.end_hand(table.table_id)
+        self.assertTrue(tournament.is_finished())
+        # busted in the same hand, the player who started it with more chips finishes higher.
+        self.assertEqual({user_ids[sit]: place for sit, place in ((other.sit, 1), (rich.sit, 2), (poor.sit, 3))}, tournament.places)
+        self.assertEqual(tournament.get_standings(), [(user_ids[other.sit], 3000), (user_ids[rich.sit], 2), (user_ids[poor.sit], 3)])
+
+    def test_breaking_and_balancing(self):
+        tournament = make_tournament(12, 6)
+        table_ids = list(tournament.tables)
+        # three players of the first table bust, the 3 left fit at the other table after 3 more bust there.
+        for table_id in table_ids:
+            tournament.start_hand(table_id)
+            tournament.tables[table_id].round.start()
+        first, second = (tournament.tables[table_id] for table_id in table_ids)
+        for round_player in first.round.players[:3]:
+            round_player.chips = 0
+        first.round.players[3].chips += 3000
+        first.round.stage = HoldemRoundStage.ENDED
+        moves = tournament.end_hand(first.table_id)
+        # 9 players on 2 tables of 3 and 6, the longer table is in a hand, so no one moves yet.
+        self.assertEqual(moves, [])
+        for round_player in second.round.players[:3]:
+            round_player.chips = 0
+        second.round.players[3].chips += 3000
+        second.round.stage = HoldemRoundStage.ENDED
+        moves = tournament.end_hand(second.table_id)
+        self.assertEqual(tournament.remaining, 6)
+        self.assertEqual(len(tournament.tables), 1)
+        self.assertEqual(len(moves), 3)
+        self.assertEqual(get_table_sizes(tournament), [6])
+
+    def test_play_to_the_end(self):
+        rng = random.Random(0)
+        clock = Clock()
+        tournament = make_tournament(60, 6, clock)
+        while not tournament.is_finished():
+            ended = []
+            for table_id in list(tournament.tables):
+                if tournament.start_hand(table_id):
+                    play_hand(tournament.tables[table_id], rng)
+                    ended.append(table_id)
+                clock.now += 1
+            self.assertTrue(ended)
+            for index in range(0, len(ended), 3):
+                tournament.end_hands(ended[index:index + 3])
+            self.assertEqual(sum(p.chips for table in tournament.tables.values() for p in table.players), 60_000)
+            self.assertEqual(sum(get_table_sizes(tournament)), tournament.remaining)
+            for table_id, table in tournament.tables.items():
+                self.assertEqual(tournament.counts[table_id], len(table.players))
+        self.assertEqual(sorted(tournament.places.values()), list(range(1, 61)))
+        self.assertGreater(tournament.get_stats()['moves'], 0)
+
+if __name__ == '__main__':
+    unittest.main()